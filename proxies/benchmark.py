@@ -0,0 +1,1220 @@
+# V 1.0
+'''
+基准测试(全程不访问外网)
+
+validate: 在本地启动一组模拟HTTP代理(每个代理监听一个独立端口,带可配置的延迟,部分代理为"黑洞":接受连接但永不响应),
+          分别用线程池引擎(check_proxies_batch)和异步引擎(check_proxies_batch_async)验证同一批代理,比较每秒验证的代理数.
+scrape:   在本地启动一个代理列表网页服务,比较每页新建连接的 requests.get 与 ProxyScraper(共享Session,keep-alive)的单页耗时.
+api:      用临时代理池(合成数据)启动API服务,多个keep-alive客户端线程持续请求 GET /proxy 和 POST /report,统计吞吐和延迟.
+history:  为大量合成代理各记录 HISTORY_SIZE 次检查,统计检查历史的内存占用和记录速度.
+pool:     比较两个字典(分数,类型)与列式 ProxyPool 存放同一批合成代理的内存占用(tracemalloc),以及按类型和分数筛选的耗时.
+stats:    在合成的列式代理池上计算 pool_stats (类型数量,分数分布,响应时间分位数,时间分布),与修改前的分组统计比较耗时.
+journal:  用异步引擎验证模拟代理组,比较不写验证日志、按批写入验证日志、每批fsync三种情况的吞吐,以及单条日志的追加耗时.
+window:   从生成器输入大量代理(循环使用模拟代理),比较修改前一次提交全部Future的线程池验证与 iter_check_results 的内存增量和耗时.
+farm:     在独立进程中启动模拟代理组(HTTP/SOCKS4/SOCKS5,可配置延迟、随机失败、黑洞、不转发请求直接返回自己页面)和本地 /ip 回显目标,
+          模拟代理真正把请求转发到回显目标;每个引擎在单独子进程中验证同一批代理,统计代理/秒、响应时间p50/p95、CPU时间、峰值内存和判定准确率.
+          HTTP代理轮流为透明(加 X-Forwarded-For 转发客户端IP)、普匿(加 Via)、高匿(不加头),回显目标返回来源IP和请求头,
+          匿名级别判断错误时以非0状态结束. --targets 时有效代理再检查回显目标上的两个验证目标(/ip 应通过,
+          /login 返回2xx但不含expect文本,应不通过),不符合时同样以非0状态结束.
+          固定随机种子,同样参数的结果可跨版本比较(--output 追加一行JSON记录).
+parse:    为11个代理来源各生成(或从 --corpus 目录读取)一组页面,比较修改前的解析方式(.*? 解析式按下标配对/按行分割)
+          与 parse_proxies 锚定解析式的解析吞吐(MB/s),并逐个来源核对两者解析出的代理是否一致.
+cache:    本地服务一个纯文本代理列表(支持ETag/If-None-Match),依次爬取: 首次、未变化、新增1%的行、服务器不支持条件请求,
+          比较不使用缓存、使用 FetchCache、FetchCache+只取新增三种方式的响应字节数和交给验证的代理数.
+shutdown: 子进程用两种引擎验证含大量黑洞代理的模拟代理组,验证进行中发送SIGINT/SIGTERM,测量验证函数返回和进程退出的耗时,
+          进程退出超过 SHUTDOWN_DEADLINE 时以非0状态结束(超时设得比期限长才能检验期限与TIMEOUT无关).
+selector: 对 ProxySelector 随机执行大量分数推送(含先推0分再推正分、类型变化、keep_higher),
+          与按同样规则维护的字典逐类型核对权重,统计更新和抽取速度,以及索引占用的下标数(已移除的代理超过比例时压缩).
+
+用法(在proxies目录下运行):
+    python benchmark.py --proxies 2000 --latency 0.2 --dead-ratio 0.3 --timeout 2
+    python benchmark.py --mode scrape --pages 500
+    python benchmark.py --mode api --clients 16 --duration 10
+    python benchmark.py --mode history --pool-size 100000
+    python benchmark.py --mode pool --pool-size 100000
+    python benchmark.py --mode stats --pool-size 1000000
+    python benchmark.py --mode journal --proxies 2000
+    python benchmark.py --mode shutdown --proxies 2000 --dead-ratio 0.5 --timeout 30
+    python benchmark.py --mode window --proxies 200 --latency 0 --dead-ratio 0 --checks 20000
+    python benchmark.py --mode parse --corpus parse_corpus
+    python benchmark.py --mode cache --lines 3000
+    python benchmark.py --mode selector --pool-size 100000
+    python benchmark.py --mode farm --proxies 1000 --latency 0.1 --dead-ratio 0.1 --output farm_results.jsonl
+'''
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import http.client
+import http.server
+import io
+import json
+import multiprocessing
+import platform
+import random
+import re
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import requests
+
+import proxies_pool
+
+
+class StandinProxyFarm:
+    """
+    本地模拟代理组
+
+    :param count: 代理数量(每个代理一个端口)
+    :param latency: 正常代理的响应延迟(秒)
+    :param dead_ratio: 黑洞代理比例
+    :param seed: 随机种子,保证每次运行的代理分布一致
+    """
+    def __init__(self, count, latency=0.2, dead_ratio=0.3, seed=1):
+        self.count = count
+        self.latency = latency
+        self.dead_ratio = dead_ratio
+        self.random = random.Random(seed)
+        self.proxies = []  # [ip:port]
+        self._servers = []
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    async def _handle(self, reader, writer, dead):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            if dead:
+                await reader.read()  # 黑洞: 一直等到客户端超时断开
+                return
+            await asyncio.sleep(self.latency)
+            body = json.dumps({"origin": "127.0.0.1"}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _start(self):
+        for _ in range(self.count):
+            dead = self.random.random() < self.dead_ratio
+            server = await asyncio.start_server(
+                lambda r, w, dead=dead: self._handle(r, w, dead), "127.0.0.1", 0, backlog=512
+            )
+            self._servers.append(server)
+            self.proxies.append(f"127.0.0.1:{server.sockets[0].getsockname()[1]}")
+
+    def __enter__(self):
+        proxies_pool._raise_nofile_limit(self.count * 3)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def __exit__(self, *exc):
+        async def close_all():
+            for server in self._servers:
+                server.close()
+        asyncio.run_coroutine_threadsafe(close_all(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+MOCK_WRONG_ORIGIN_PAGE = b"<html><body>Please log in to continue</body></html>"
+
+MOCK_LEVELS = ("transparent", "anonymous", "elite")
+
+
+def loopback_alias():
+    """模拟代理监听和出站用的回环地址: 与验证进程的本机IP(127.0.0.1)不同才能判断匿名级别,系统不支持时退回 127.0.0.1"""
+    try:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.2", 0))
+        return "127.0.0.2"
+    except OSError:
+        return "127.0.0.1"
+
+
+class MockProxyFarm:
+    """
+    本地模拟代理组 + /ip 回显目标,在独立进程中运行(不占用被测进程的CPU和内存)
+
+    每个代理一个端口,协议按 protocols 轮流分配,其余属性由随机种子固定:
+    正常代理把请求转发到回显目标(HTTP代理转发完整URL请求,SOCKS4/SOCKS5代理建立隧道后双向转发),
+    黑洞代理接受连接后永不回复,"错误来源"代理不转发请求、直接返回自己的登录页面;
+    正常代理的每次请求还会以 fail_ratio 的概率被直接断开.
+    代理监听在 127.0.0.2 并从该地址连接回显目标,HTTP代理按下标轮流为透明/普匿/高匿(SOCKS隧道不改请求,都是高匿);
+    回显目标像httpbin一样返回来源IP(X-Forwarded-For链加对端地址)和请求头, /login 路径返回登录页面(用作不通过的验证目标).
+
+    :param count: 代理数量
+    :param protocols: 协议列表
+    :param latency: 平均附加延迟(秒),每个代理固定为 latency 的 0.5~1.5 倍
+    :param fail_ratio: 每次请求随机断开的概率
+    :param blackhole_ratio: 黑洞代理比例
+    :param wrong_origin_ratio: 错误来源代理比例
+    :param seed: 随机种子
+    """
+    def __init__(self, count, protocols=("http", "socks4", "socks5"), latency=0.1, fail_ratio=0.05,
+                 blackhole_ratio=0.1, wrong_origin_ratio=0.05, seed=1):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.latency = latency
+        self.fail_ratio = fail_ratio
+        self.host = loopback_alias()
+        self.specs = []  # [(协议, 类别 ok/blackhole/wrong_origin, 延迟)]
+        self.levels = []  # 与specs一一对应的匿名级别,监听地址与本机IP相同时无法判断,为None
+        for index in range(count):
+            roll = rng.random()
+            kind = ("blackhole" if roll < blackhole_ratio else
+                    "wrong_origin" if roll < blackhole_ratio + wrong_origin_ratio else "ok")
+            protocol = protocols[index % len(protocols)]
+            self.specs.append((protocol, kind, latency * rng.uniform(0.5, 1.5)))
+            level = MOCK_LEVELS[index // len(protocols) % len(MOCK_LEVELS)] if protocol == "http" else "elite"
+            self.levels.append(level if self.host != "127.0.0.1" else None)
+        self.proxies = []  # [ip:port],与specs一一对应
+        self.test_url = None
+        self._process = None
+        self._conn = None
+
+    def __enter__(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=self._serve_process, args=(child_conn,), daemon=True)
+        self._process.start()
+        self.proxies, self.test_url = parent_conn.recv()
+        self._conn = parent_conn
+        base = self.test_url.rsplit("/", 1)[0]
+        self.targets = {"echo": {"url": f"{base}/ip", "expect": "origin"},
+                        "login": {"url": f"{base}/login", "expect": "origin"}}  # 2xx但不含expect文本
+        return self
+
+    def __exit__(self, *exc):
+        self._conn.send("stop")
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+
+    def _serve_process(self, conn):
+        proxies_pool._raise_nofile_limit(len(self.specs) * 4)
+        asyncio.run(self._serve(conn))
+
+    async def _serve(self, conn):
+        loop = asyncio.get_running_loop()
+        echo = await asyncio.start_server(self._handle_echo, "127.0.0.1", 0, backlog=1024)
+        self.target = echo.sockets[0].getsockname()
+        servers = [echo]
+        proxies = []
+        for index, ((protocol, kind, latency), level) in enumerate(zip(self.specs, self.levels)):
+            rng = random.Random(self.seed * 1000003 + index)  # 每个代理独立的失败序列,与请求到达的先后无关
+            handler = getattr(self, f"_handle_{protocol}")
+            server = await asyncio.start_server(
+                lambda r, w, h=handler, k=kind, d=latency, g=rng, v=level: self._guard(h(r, w, k, d, g, v), w),
+                self.host, 0, backlog=1024
+            )
+            servers.append(server)
+            proxies.append(f"{self.host}:{server.sockets[0].getsockname()[1]}")
+        conn.send((proxies, f"http://127.0.0.1:{self.target[1]}/ip"))
+        await loop.run_in_executor(None, conn.recv)  # 等待停止
+        for server in servers:
+            server.close()
+
+    @staticmethod
+    async def _guard(handler, writer):
+        try:
+            await handler
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_echo(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            if head.split(b" ", 2)[1] == b"/login":
+                await self._reply_wrong_origin(writer)
+                return
+            headers = dict(line.split(": ", 1) for line in head.decode("latin-1").split("\r\n")[1:] if ": " in line)
+            forwarded = [ip.strip() for ip in headers.get("X-Forwarded-For", "").split(",") if ip.strip()]
+            origin = ", ".join(forwarded + [writer.get_extra_info("peername")[0]])
+            body = json.dumps({"origin": origin, "headers": headers}).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: "
+                         + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _misbehave(self, reader, writer, kind, latency, rng):
+        """
+        黑洞/随机断开/错误来源的共同处理
+
+        :return: True 表示已处理完毕(不再转发)
+        """
+        if kind == "blackhole":
+            await reader.read()  # 一直等到客户端超时断开
+            return True
+        if rng.random() < self.fail_ratio:
+            return True  # 直接断开
+        await asyncio.sleep(latency)
+        return False
+
+    @staticmethod
+    async def _reply_wrong_origin(writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nContent-Length: "
+                     + str(len(MOCK_WRONG_ORIGIN_PAGE)).encode() + b"\r\nConnection: close\r\n\r\n"
+                     + MOCK_WRONG_ORIGIN_PAGE)
+        await writer.drain()
+
+    @staticmethod
+    async def _relay(reader, writer):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _tunnel(self, reader, writer, kind):
+        """隧道建立后: 错误来源代理自己回复,正常代理连接回显目标双向转发"""
+        if kind == "wrong_origin":
+            await reader.readuntil(b"\r\n\r\n")
+            await self._reply_wrong_origin(writer)
+            return
+        target_reader, target_writer = await asyncio.open_connection(*self.target, local_addr=(self.host, 0))
+        await asyncio.gather(self._relay(reader, target_writer), self._relay(target_reader, writer))
+
+    async def _handle_http(self, reader, writer, kind, latency, rng, level):
+        head = await reader.readuntil(b"\r\n\r\n")
+        if await self._misbehave(reader, writer, kind, latency, rng):
+            return
+        if kind == "wrong_origin":
+            await self._reply_wrong_origin(writer)
+            return
+        # 转发完整URL请求: GET http://host:port/path HTTP/1.1
+        method, url, _ = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ", 2)
+        _, host, port, path = proxies_pool._split_url(url)
+        target_reader, target_writer = await asyncio.open_connection(host, port, local_addr=(self.host, 0))
+        added = {"transparent": f"X-Forwarded-For: {writer.get_extra_info('peername')[0]}\r\nVia: 1.1 farm\r\n",
+                 "anonymous": "Via: 1.1 farm\r\n"}.get(level, "")
+        target_writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\n{added}Connection: close\r\n\r\n".encode())
+        await target_writer.drain()
+        await self._relay(target_reader, writer)
+        target_writer.close()
+
+    async def _handle_socks5(self, reader, writer, kind, latency, rng, level):
+        _, method_count = await reader.readexactly(2)
+        await reader.readexactly(method_count)
+        writer.write(b"\x05\x00")  # 无认证
+        await writer.drain()
+        _, command, _, address_type = await reader.readexactly(4)
+        if address_type == 0x01:
+            await reader.readexactly(4)
+        elif address_type == 0x04:
+            await reader.readexactly(16)
+        else:
+            await reader.readexactly((await reader.readexactly(1))[0])
+        await reader.readexactly(2)  # 端口,统一转发到回显目标
+        if await self._misbehave(reader, writer, kind, latency, rng):
+            return
+        writer.write(b"\x05\x00\x00\x01\x00\x00\x00\x00\x00\x00")
+        await writer.drain()
+        await self._tunnel(reader, writer, kind)
+
+    async def _handle_socks4(self, reader, writer, kind, latency, rng, level):
+        version = (await reader.readexactly(1))[0]
+        if version != 0x04:
+            writer.write(b"\x00\x5b")  # 拒绝其他版本(如SOCKS5问候)
+            await writer.drain()
+            return
+        await reader.readexactly(7)  # 命令, 端口, IPv4地址
+        await reader.readuntil(b"\x00")  # 用户名
+        if await self._misbehave(reader, writer, kind, latency, rng):
+            return
+        writer.write(b"\x00\x5a\x00\x00\x00\x00\x00\x00")
+        await writer.drain()
+        await self._tunnel(reader, writer, kind)
+
+
+FARM_CHILD = """
+import contextlib, io, json, resource, sys, time
+import proxies_pool
+config = json.loads(sys.stdin.readline())
+proxies = {proxy: 90 for proxy in config["proxies"]}
+latencies = {}
+anonymity = {}
+target_results = {}
+if config["engine"] == "async":
+    func, options = proxies_pool.check_proxies_batch_async, {"concurrency": config["size"]}
+else:
+    func, options = proxies_pool.check_proxies_batch, {"max_workers": config["size"]}
+before = resource.getrusage(resource.RUSAGE_SELF)
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    updated_proxies, updated_types = func(proxies, config["types"], config["test_url"], config["timeout"],
+                                          check_type="existing", latencies=latencies, anonymity=anonymity,
+                                          targets=config["targets"], target_results=target_results, **options)
+elapsed = time.perf_counter() - start
+after = resource.getrusage(resource.RUSAGE_SELF)
+print(json.dumps({
+    "elapsed": elapsed,
+    "cpu": after.ru_utime - before.ru_utime + after.ru_stime - before.ru_stime,
+    "rss": after.ru_maxrss * 1024,
+    "valid": {proxy: updated_types[proxy] for proxy, score in updated_proxies.items() if score > 90},
+    "latencies": sorted(latencies.values()),
+    "anonymity": anonymity,
+    "target_results": target_results,
+}))
+"""
+
+
+def run_farm_engine(farm, engine, size, timeout, detect=False, targets=False):
+    """在子进程中用一个引擎验证模拟代理组,返回该次运行的统计字典(targets为True时有效代理再检查farm.targets)"""
+    types = {proxy: "auto" if detect else spec[0] for proxy, spec in zip(farm.proxies, farm.specs)}
+    config = {"engine": engine, "size": size, "timeout": timeout, "test_url": farm.test_url,
+              "proxies": farm.proxies, "types": types, "targets": farm.targets if targets else None}
+    child = subprocess.run([sys.executable, "-c", FARM_CHILD], input=json.dumps(config) + "\n",
+                           capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    output = json.loads(child.stdout.splitlines()[-1])
+    truth = dict(zip(farm.proxies, farm.specs))
+    levels = dict(zip(farm.proxies, farm.levels))
+    latencies = output["latencies"]
+    return {
+        "elapsed": round(output["elapsed"], 3),
+        "rate": round(len(farm.proxies) / output["elapsed"], 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if len(latencies) >= 20 else None,
+        "cpu_s": round(output["cpu"], 2),
+        "rss_mb": round(output["rss"] / 1e6, 1),
+        "valid": len(output["valid"]),
+        "expected_ok": sum(1 for _, kind, _ in farm.specs if kind == "ok"),
+        "false_valid": sum(1 for proxy in output["valid"] if truth[proxy][1] != "ok"),
+        "wrong_type": sum(1 for proxy, proxy_type in output["valid"].items() if truth[proxy][0] != proxy_type),
+        "wrong_anonymity": sum(1 for proxy in output["valid"]
+                               if truth[proxy][1] == "ok" and output["anonymity"].get(proxy) != levels[proxy]),
+        "target_passed": {name: sum(1 for proxy in output["valid"]
+                                    if output["target_results"].get(proxy, {}).get(name) is not None)
+                          for name in (farm.targets if targets else ())},
+    }
+
+
+def benchmark_farm(args):
+    """
+    :return: 参数字典, [(引擎, 统计字典)] (每个引擎重复 --repeat 次,取耗时居中的一次)
+    """
+    params = {"proxies": args.proxies, "protocols": args.protocols, "latency": args.latency,
+              "fail_ratio": args.fail_ratio, "blackhole_ratio": args.dead_ratio,
+              "wrong_origin_ratio": args.wrong_origin_ratio, "timeout": args.timeout, "seed": args.seed,
+              "detect": args.detect, "targets": args.targets, "workers": args.workers, "concurrency": args.concurrency}
+    engines = [("async", args.concurrency)] + ([] if args.skip_thread else [("thread", args.workers)])
+    results = []
+    with MockProxyFarm(args.proxies, args.protocols.split(","), args.latency, args.fail_ratio,
+                       args.dead_ratio, args.wrong_origin_ratio, args.seed) as farm:
+        for engine, size in engines:
+            runs = sorted((run_farm_engine(farm, engine, size, args.timeout, args.detect, args.targets)
+                           for _ in range(args.repeat)), key=lambda run: run["elapsed"])
+            results.append((engine, runs[len(runs) // 2]))
+    return params, results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_engine(name, func, proxies, proxy_types, **kwargs):
+    """运行一个验证引擎并返回 (名称, 耗时, 每秒代理数, 有效数)"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # 屏蔽逐个代理的输出
+        updated_proxies, _ = func(proxies, proxy_types, check_type="existing", **kwargs)
+    elapsed = time.perf_counter() - start
+    valid = sum(1 for proxy, score in updated_proxies.items() if score > proxies[proxy])
+    return name, elapsed, len(proxies) / elapsed, valid
+
+
+class ProxyListPageHandler(http.server.BaseHTTPRequestHandler):
+    """模拟代理列表网页(表格格式,与89ip/ip3366等来源一致),支持HTTP/1.1 keep-alive"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # 响应头和响应体分两次写出,不关闭Nagle时keep-alive连接会被延迟确认拖慢约40ms
+    rows = "".join(f"<tr>\n<td>10.{i // 250}.{i % 250}.1</td>\n<td>{8000 + i}</td>\n<td>高匿</td>\n</tr>\n"
+                   for i in range(100))
+    body = f"<html><body><table>{rows}</table></body></html>".encode()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def benchmark_scrape(pages):
+    """比较每页新建连接与共享Session的单页耗时,返回 [(名称, 平均毫秒, p95毫秒)]"""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ProxyListPageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    pattern = "<tr>.*?<td>(?P<ip>.*?)</td>.*?<td>(?P<port>.*?)</td>.*?</tr>"
+    headers = {'user-agent': proxies_pool.USER_AGENT}
+
+    def bare_request(page):
+        # 修改前的做法: 每页一个裸 requests.get,每次都重新编译解析式
+        response = requests.get(f"{base_url}/index_{page}.html", headers=headers, timeout=proxies_pool.TIMEOUT)
+        regex = re.compile(pattern, re.S)
+        return [f"{m.group('ip')}:{m.group('port')}" for m in regex.finditer(response.text)]
+
+    def shared_session(page):
+        return proxies_pool.ProxyScraper(f"{base_url}/index_{page}.html", pattern, ["ip", "port"]).scrape_proxies()
+
+    results = []
+    try:
+        for name, fetch in (("requests.get", bare_request), ("ProxyScraper", shared_session)):
+            latencies = []
+            for page in range(pages):
+                start = time.perf_counter()
+                fetch(page)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            results.append((name, statistics.mean(latencies), latencies[int(len(latencies) * 0.95) - 1]))
+    finally:
+        server.shutdown()
+    return results
+
+
+# 修改前各来源的解析式(表格/JSON来源);纯文本来源修改前按行分割
+LEGACY_TABLE_PATTERN = "<tr>.*?<td>(?P<ip>.*?)</td>.*?<td>(?P<port>.*?)</td>.*?</tr>"
+LEGACY_PATTERNS = {
+    "proxy5.net": "<tr>.*?<td><strong>(?P<ip>.*?)</strong></td>.*?<td>(?P<port>.*?)</td>.*?</tr>",
+    "89ip.cn": LEGACY_TABLE_PATTERN,
+    "freevpnnode.com": '<tr>.*?<td>(?P<ip>.*?)</td>.*?<td>(?P<port>.*?)</td>.*?<td><span>.*?</span> <img src=".*?" '
+                       'width="20" height="20" .*? class="js_openeyes"></td>.*?</td>',
+    "kuaidaili.com": '{"ip": "(?P<ip>.*?)", "last_check_time": ".*?", "port": "(?P<port>.*?)", "speed": .*?, '
+                     '"location": ".*?"}',
+    "ip3366.net": LEGACY_TABLE_PATTERN,
+    "proxyhub.me": r"<tr>\s*<td>(?P<ip>\d+\.\d+\.\d+\.\d+)</td>\s*<td>(?P<port>\d+)</td>",
+}
+
+
+def synthetic_source_pages(name, rng):
+    """
+    按来源的页面格式生成一组合成页面(表格前后带脚本和导航,接近真实页面大小)
+
+    :return: [页面文本]
+    """
+    def ip():
+        return ".".join(str(rng.randint(1, 254)) for _ in range(4))
+
+    def port():
+        return rng.choice(["80", "8080", "3128", "1080", str(rng.randint(1, 65535))])
+
+    filler = ("<script>" + "function t(e){return e&&e.length>0?e.split(',').map(Number):[]}\n" * 300 + "</script>\n"
+              + "<ul class=\"nav\">" + "<li><a href=\"/free/\">免费代理</a></li>\n" * 200 + "</ul>\n")
+
+    def table_page(rows, header="<tr><th>IP</th><th>端口</th><th>类型</th><th>位置</th></tr>"):
+        return (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\">{filler}</head><body><table><thead>{header}</thead>"
+                f"<tbody>{''.join(rows)}</tbody></table>{filler}</body></html>")
+
+    if name == "proxy5.net":
+        return [table_page([f"<tr>\n<td><strong>{ip()}</strong></td>\n<td>{port()}</td>\n<td>HTTP</td>\n<td>中国</td>\n</tr>\n"
+                            for _ in range(100)])]
+    if name in ("89ip.cn", "ip3366.net"):
+        pages = 6 if name == "89ip.cn" else 7
+        return [table_page([f"<tr>\n\t\t<td>\n\t\t\t{ip()}\t\t</td>\n\t\t<td>\n\t\t\t{port()}\t\t</td>\n"
+                            f"\t\t<td>\n\t\t\t广东省深圳市\t\t</td>\n\t\t<td>\n\t\t\t电信\t\t</td>\n"
+                            f"\t\t<td>\n\t\t\t2025/06/01 12:00:00\t\t</td>\n\t</tr>\n" for _ in range(40)])
+                for _ in range(pages)]
+    if name == "freevpnnode.com":
+        return [table_page([f"<tr><td>{ip()}</td><td>{port()}</td><td><span>HTTP</span> <img src=\"/flags/cn.png\" "
+                            f"width=\"20\" height=\"20\" alt=\"CN\" class=\"js_openeyes\"></td><td>高匿</td></tr>\n"
+                            for _ in range(30)])]
+    if name == "kuaidaili.com":
+        return [f"<html><head>{filler}</head><body><script>const fpsList = [" + ", ".join(
+            f'{{"ip": "{ip()}", "last_check_time": "2025-06-01 12:00:00", "port": "{port()}", '
+            f'"speed": {rng.randint(1, 5000)}, "location": "广东省深圳市 电信"}}' for _ in range(12)
+        ) + f"];</script>{filler}</body></html>" for _ in range(10)]
+    if name == "proxyhub.me":
+        return [table_page([f"<tr>\n  <td>{ip()}</td>\n  <td>{port()}</td>\n  <td>HTTP</td>\n</tr>\n" for _ in range(20)])]
+    if name == "proxypool.scrape.center":
+        return [f"{ip()}:{port()}" for _ in range(200)]  # 每次请求返回一个代理
+    lines = {"proxy.scdn.io": 12000, "github-http": 3000, "github-socks5": 2000, "github-https": 3000}[name]
+    return ["".join(f"{ip()}:{port()}\n" for _ in range(lines))]
+
+
+def load_parse_corpus(corpus_dir=None, seed=1):
+    """
+    每个来源的页面语料: corpus_dir 中有 <来源>_<序号>.html 时读取(可放入真实保存的页面),
+    否则生成合成页面并保存到 corpus_dir
+
+    :return: [(来源, 新解析式, [页面文本])]
+    """
+    sources = [(source["name"], source["pattern"]) for source in proxies_pool.SOURCE_REGISTRY]
+    corpus = []
+    for index, (name, pattern) in enumerate(sources):
+        rng = random.Random(seed * 100 + index)
+        pages = []
+        if corpus_dir:
+            page_index = 0
+            while os.path.exists(path := os.path.join(corpus_dir, f"{name}_{page_index}.html")):
+                with open(path, encoding="utf-8") as file:
+                    pages.append(file.read())
+                page_index += 1
+        if not pages:
+            pages = synthetic_source_pages(name, rng)
+            if corpus_dir:
+                os.makedirs(corpus_dir, exist_ok=True)
+                for page_index, page in enumerate(pages):
+                    with open(os.path.join(corpus_dir, f"{name}_{page_index}.html"), "w", encoding="utf-8") as file:
+                        file.write(page)
+        corpus.append((name, pattern, pages))
+    return corpus
+
+
+def legacy_parse(name, page):
+    """修改前的解析: 按下标配对所有捕获组 / 按行分割 / 整个响应即一个代理"""
+    pattern = LEGACY_PATTERNS.get(name)
+    if pattern is None:
+        if name == "proxypool.scrape.center":
+            return [page.strip()]
+        return [line.strip() for line in page.split("\n")]
+    extracted_data = []
+    for match in re.compile(pattern, re.S).finditer(page):
+        for group_name in ("ip", "port"):
+            extracted_data.append(f"{match.group(group_name)}")
+    return [f"{extracted_data[i].strip()}:{extracted_data[i + 1].strip()}" for i in range(0, len(extracted_data), 2)]
+
+
+LEGACY_PROXY_PATTERN = re.compile(r'^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3}):(\d{1,5})$')
+
+
+def legacy_normalize(proxy):
+    """修改前的 normalize_proxy (没有规范形式的快速路径)"""
+    if not isinstance(proxy, str):
+        return None
+    proxy = "".join(proxy.split())
+    if '://' in proxy:
+        proxy = proxy.split('://', 1)[1]
+    match = LEGACY_PROXY_PATTERN.match(proxy)
+    if not match:
+        return None
+    octets = [int(octet) for octet in match.groups()[:4]]
+    port = int(match.group(5))
+    if max(octets) > 255 or not 0 < port < 65536:
+        return None
+    return f"{octets[0]}.{octets[1]}.{octets[2]}.{octets[3]}:{port}"
+
+
+def benchmark_parse(corpus_dir=None, min_time=0.3):
+    """
+    修改前按行分割的来源不校验格式(空行等无效条目由后续规范化丢弃),所以同时给出解析加规范化的吞吐
+
+    :return: [(来源, 语料字节数, [修改前MB/s, 修改后MB/s], [含规范化的修改前MB/s, 修改后MB/s],
+              修改前有效代理数, 修改后代理数, 是否一致)]
+    """
+    results = []
+    for name, pattern, pages in load_parse_corpus(corpus_dir):
+        regex = proxies_pool.ProxyScraper.compile_pattern(pattern)
+        proxies_pool.ProxyScraper.compile_pattern(LEGACY_PATTERNS.get(name, pattern))  # 两边都不计编译时间
+        size = sum(len(page.encode()) for page in pages)
+
+        def legacy():
+            return [proxy for page in pages for proxy in legacy_parse(name, page)]
+
+        def current():
+            return [proxy for page in pages for proxy in proxies_pool.extract_proxies(page, regex)]
+
+        def normalized(func, normalize):
+            return lambda: [proxy for proxy in map(normalize, func()) if proxy]
+
+        rates = []
+        for func in (legacy, current, normalized(legacy, legacy_normalize),
+                     normalized(current, proxies_pool.normalize_proxy)):
+            runs = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < min_time:
+                func()
+                runs += 1
+            rates.append(size * runs / (time.perf_counter() - start) / 1e6)
+        old, new = normalized(legacy, legacy_normalize)(), normalized(current, proxies_pool.normalize_proxy)()
+        results.append((name, size, rates[:2], rates[2:], len(old), len(new), old == new))
+    return results
+
+
+class ProxyListFileHandler(http.server.BaseHTTPRequestHandler):
+    """模拟GitHub上的纯文本代理列表,带ETag时支持条件请求"""
+    protocol_version = "HTTP/1.1"
+    body = b""
+    etag = True
+    sent_bytes = 0
+
+    def do_GET(self):
+        tag = '"' + hashlib.md5(self.body).hexdigest() + '"'
+        cls = type(self)
+        if cls.etag and self.headers.get("If-None-Match") == tag:
+            self.send_response(304)
+            self.send_header("ETag", tag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(self.body)))
+        if cls.etag:
+            self.send_header("ETag", tag)
+        self.end_headers()
+        self.wfile.write(self.body)
+        cls.sent_bytes += len(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def benchmark_cache(lines, seed=1):
+    """
+    :return: [(步骤, [(方式, 响应体字节数, 交给验证的代理数)])]
+    """
+    rng = random.Random(seed)
+
+    def random_lines(count):
+        return [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}:"
+                f"{rng.randint(1, 65535)}" for _ in range(count)]
+
+    entries = random_lines(lines)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), ProxyListFileHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/http.txt"
+    cache_dir = tempfile.mkdtemp()
+    caches = {"不使用缓存": None,
+              "FetchCache": proxies_pool.FetchCache(os.path.join(cache_dir, "full"), diff=False),
+              "FetchCache+只取新增": proxies_pool.FetchCache(os.path.join(cache_dir, "diff"), diff=True)}
+    steps = [("首次爬取", 0, True), ("未变化", 0, True), (f"新增{max(1, lines // 100)}行", max(1, lines // 100), True),
+             ("未变化(不支持ETag)", 0, False)]
+    results = []
+    try:
+        for step, added, etag in steps:
+            entries += random_lines(added)
+            ProxyListFileHandler.body = ("\n".join(entries) + "\n").encode()
+            ProxyListFileHandler.etag = etag
+            row = []
+            for name, cache in caches.items():
+                ProxyListFileHandler.sent_bytes = 0
+                proxies = proxies_pool.ProxyScraper(url, proxies_pool.TEXT_LIST_PATTERN, ["ip", "port"],
+                                                    cache=cache).scrape_proxies()
+                if cache is not None:
+                    cache.release(url)  # 视为新代理已交给验证并保存
+                    cache.commit()
+                row.append((name, ProxyListFileHandler.sent_bytes, len(proxies)))
+            results.append((step, row))
+    finally:
+        server.shutdown()
+    return results
+
+
+def benchmark_api(clients, duration, pool_size, report_ratio=0.1):
+    """
+    API服务压测
+
+    :return: 总请求数, 每秒请求数, p50毫秒, p95毫秒, 错误数
+    """
+    rng = random.Random(1)
+    rows = [(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{1000 + i % 50000}",
+             rng.choice(["http", "socks4", "socks5"]), rng.randint(1, 100)) for i in range(pool_size)]
+    store = proxies_pool.SqlitePoolStore(os.path.join(tempfile.mkdtemp(), "api_bench.db"))
+    store.upsert_many(rows)
+    ready = threading.Event()
+    with contextlib.redirect_stdout(io.StringIO()):
+        service = proxies_pool.PoolService(store)
+    threading.Thread(target=proxies_pool.run_api_server, args=("127.0.0.1", 0, service, ready),
+                     kwargs={"revalidate": False}, daemon=True).start()
+    ready.wait()
+    port = ready.server.server_address[1]
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(seed):
+        client_rng = random.Random(seed)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        local = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                if client_rng.random() < report_ratio:
+                    body = json.dumps({"proxy": client_rng.choice(rows)[0], "success": client_rng.random() < 0.7})
+                    conn.request("POST", "/report", body, {"Content-Type": "application/json"})
+                else:
+                    conn.request("GET", f"/proxy?type={client_rng.choice(['http', 'socks5', 'all'])}&n=10")
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise http.client.HTTPException(response.status)
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ready.server.shutdown()
+    latencies.sort()
+    return (len(latencies), len(latencies) / duration, latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.95) - 1], errors[0])
+
+
+def benchmark_history(pool_size):
+    """
+    检查历史的内存占用和记录速度
+
+    :return: 数组字节数, 字典字节数, 每秒记录次数
+    """
+    rng = random.Random(1)
+    proxies = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{1000 + i % 50000}" for i in range(pool_size)]
+    history = proxies_pool.CheckHistory()
+    start = time.perf_counter()
+    for _ in range(history.size):
+        for proxy in proxies:
+            history.record(proxy, rng.random() < 0.7, rng.random() * 3)
+    elapsed = time.perf_counter() - start
+    array_bytes, dict_bytes = history.memory_usage()
+    return array_bytes, dict_bytes, pool_size * history.size / elapsed
+
+
+def synthetic_pool_rows(pool_size, seed=1):
+    """合成代理池数据 [(proxy, type, score, 加入时间, 上次检查时间, 响应时间EWMA)], 逐行生成"""
+    rng = random.Random(seed)
+    now = time.time()
+    for i in range(pool_size):
+        yield (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{1000 + i % 50000}",
+               rng.choice(proxies_pool.PROXY_TYPES), rng.randint(1, 100), now - rng.random() * 86400 * 30,
+               now - rng.random() * 3600, rng.random() * 5 if rng.random() < 0.8 else None)
+
+
+def benchmark_pool(pool_size):
+    """
+    字典与列式代理池的内存和筛选耗时
+
+    :return: [(名称, 内存字节数, 筛选毫秒)]
+    """
+    results = []
+
+    tracemalloc.start()
+    proxies, proxy_types = {}, {}
+    for proxy, proxy_type, score, _, _, _ in synthetic_pool_rows(pool_size):
+        proxies[proxy] = score
+        proxy_types[proxy] = proxy_type
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    selected = [proxy for proxy, score in proxies.items() if score >= 60 and proxy_types[proxy] == "socks5"]
+    results.append(("dict", dict_bytes, (time.perf_counter() - start) * 1000, len(selected)))
+    del proxies, proxy_types
+
+    tracemalloc.start()
+    pool = proxies_pool.ProxyPool.from_rows(synthetic_pool_rows(pool_size))
+    pool_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    selected = pool.filter("socks5", min_score=60)
+    results.append(("ProxyPool", pool_bytes, (time.perf_counter() - start) * 1000, len(selected)))
+    return results
+
+
+def benchmark_selector(pool_size, updates=1000000, seed=1):
+    """
+    加权抽取器的分数推送和抽取
+
+    :return: 每秒更新次数, 每秒抽取次数(n=10), 权重是否与字典一致, 索引下标数, 有效代理数
+    """
+    rng = random.Random(seed)
+    proxies = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{1000 + i % 50000}" for i in range(pool_size)]
+    selector = proxies_pool.ProxySelector(seed=seed)
+    expected = {}  # proxy -> (类型, 权重)
+    pushes = []
+    for _ in range(updates):
+        proxy = rng.choice(proxies)
+        score = 0 if rng.random() < 0.3 else rng.randint(1, 100)  # 0分: 失效代理被移除
+        pushes.append((proxy, rng.choice(proxies_pool.PROXY_TYPES), score, rng.random() < 0.5))
+    # 从未加入过的代理先收到0分再收到正分(调度器写回失效代理后又重新验证有效)
+    for i, proxy_type in enumerate(proxies_pool.PROXY_TYPES):
+        pushes += [(f"192.0.2.{i}:80", proxy_type, 0, False), (f"192.0.2.{i}:80", proxy_type, 98, True)]
+
+    start = time.perf_counter()
+    for proxy, proxy_type, score, keep_higher in pushes:
+        selector.update(proxy, proxy_type, score, keep_higher)
+    update_rate = len(pushes) / (time.perf_counter() - start)
+    for proxy, proxy_type, score, keep_higher in pushes:
+        old = expected.get(proxy)
+        if not (keep_higher and old is not None and old[1] >= score):
+            expected[proxy] = (proxy_type, score)
+
+    live = {}
+    for proxy_type, index in selector.indexes.items():
+        for proxy, weight in zip(index.proxies, index.weights):
+            if weight:
+                live[proxy] = (proxy_type, weight)
+        if (index.total != sum(index.weights) or index.tree.prefix_sum(index.tree.size) != index.total
+                or index.zeros != index.weights.count(0)):
+            return update_rate, 0, False, 0, len(live)
+    consistent = live == {proxy: item for proxy, item in expected.items() if item[1] > 0}
+    slots = sum(len(index.proxies) for index in selector.indexes.values())
+
+    draws = 20000
+    start = time.perf_counter()
+    for _ in range(draws):
+        selector.sample(rng.choice(("http", "socks5", "all")), 10)
+    return update_rate, draws / (time.perf_counter() - start), consistent, slots, len(live)
+
+
+def benchmark_stats(pool_size, repeat=5):
+    """
+    代理池统计耗时
+
+    :return: [(名称, 最短毫秒)]
+    """
+    pool = proxies_pool.ProxyPool.from_rows(synthetic_pool_rows(pool_size))
+    proxies = {pool.proxy_at(row): pool.scores[row] for row in range(len(pool))}
+    proxy_types = {proxy: proxies_pool.PROXY_TYPES[pool.types[row]] for row, proxy in enumerate(proxies)}
+
+    def grouped():
+        # 修改前 show_proxy_pool_status 的做法: 按类型分组为元组列表,再逐类型用字典统计分数
+        type_groups = {}
+        for proxy, score in proxies.items():
+            type_groups.setdefault(proxy_types.get(proxy, "http"), []).append((proxy, score))
+        for proxy_list in type_groups.values():
+            score_count = {}
+            for _, score in proxy_list:
+                score_count[score] = score_count.get(score, 0) + 1
+            sorted(score_count.items(), key=lambda x: x[0], reverse=True)
+
+    def best_of(func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
+
+    results = [("分组统计(仅分数)", best_of(grouped))]
+    numpy_module = proxies_pool.numpy
+    if numpy_module is not None:
+        results.append(("pool_stats numpy", best_of(lambda: proxies_pool.pool_stats(pool))))
+    proxies_pool.numpy = None
+    try:
+        results.append(("pool_stats 逐行", best_of(lambda: proxies_pool.pool_stats(pool))))
+    finally:
+        proxies_pool.numpy = numpy_module
+    return results
+
+
+def benchmark_journal(farm, timeout, concurrency, appends=200000):
+    """
+    :return: [(名称, 耗时, 每秒代理数)], 单条日志追加耗时(微秒)
+    """
+    proxies = {proxy: 90 for proxy in farm.proxies}
+    proxy_types = {proxy: "http" for proxy in farm.proxies}
+    test_url = "http://benchmark.invalid/ip"
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, options in (("无日志", None), ("验证日志", {}), ("日志+fsync", {"fsync": True})):
+            journal = None
+            if options is not None:
+                journal = proxies_pool.ValidationJournal(os.path.join(temp_dir, f"{len(results)}.journal"), **options)
+            name, elapsed, rate, _ = run_engine(name, proxies_pool.check_proxies_batch_async, proxies, proxy_types,
+                                                test_url=test_url, timeout=timeout, concurrency=concurrency,
+                                                journal=journal)
+            if journal is not None:
+                journal.close()
+            results.append((name, elapsed, rate))
+
+        journal = proxies_pool.ValidationJournal(os.path.join(temp_dir, "append.journal"))
+        start = time.perf_counter()
+        for i in range(appends):
+            journal.append(f"10.0.{i >> 8 & 255}.{i & 255}:8080", "http", 98, 0.25)
+        journal.close()
+        append_us = (time.perf_counter() - start) / appends * 1e6
+    return results, append_us
+
+
+WINDOW_CHILD = """
+import concurrent.futures, contextlib, io, itertools, json, resource, sys, time
+import proxies_pool
+variant, checks, timeout, size = sys.argv[1], int(sys.argv[2]), float(sys.argv[3]), int(sys.argv[4])
+farm_proxies = json.loads(sys.stdin.readline())
+test_url = "http://benchmark.invalid/ip"
+# 循环使用模拟代理,输入是生成器
+proxy_stream = itertools.islice(itertools.cycle(farm_proxies), checks)
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+completed = 0
+with contextlib.redirect_stdout(io.StringIO()):
+    if variant == "submit_all":
+        # 修改前的线程池验证: 先为每个代理提交一个Future,再按完成顺序取结果并计分
+        with concurrent.futures.ThreadPoolExecutor(max_workers=size) as executor:
+            future_to_proxy = {executor.submit(proxies_pool.check_proxy, proxy, test_url, timeout, 1, "http"): proxy
+                               for proxy in proxy_stream}
+            for future in concurrent.futures.as_completed(future_to_proxy):
+                proxy = future_to_proxy[future]
+                proxies_pool.score_check_result(proxy, future.result(), {}, {}, timeout)
+                completed += 1
+    else:
+        proxy_types = {proxy: "http" for proxy in farm_proxies}
+        for _ in proxies_pool.iter_check_results(proxy_stream, proxy_types, test_url, timeout, engine=variant,
+                                                 concurrency=size):
+            completed += 1
+elapsed = time.perf_counter() - start
+print(json.dumps([(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base) * 1024, elapsed, completed]))
+"""
+
+
+def benchmark_window(farm, checks, timeout, workers, concurrency):
+    """
+    每种方式在单独的子进程中运行,用最大常驻内存(ru_maxrss)相对开始验证时的增量衡量内存占用
+
+    :param checks: 检查次数(循环使用模拟代理)
+    :return: [(名称, 内存增量字节, 耗时, 完成数)]
+    """
+    results = []
+    for name, variant, size in (("一次提交全部", "submit_all", workers), ("流式thread", "thread", workers),
+                                ("流式async", "async", concurrency)):
+        child = subprocess.run([sys.executable, "-c", WINDOW_CHILD, variant, str(checks), str(timeout), str(size)],
+                               input=json.dumps(farm.proxies) + "\n", capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+        results.append((name, *json.loads(child.stdout.splitlines()[-1])))
+    return results
+
+
+SHUTDOWN_CHILD = """
+import json, sys, time
+import proxies_pool
+engine, timeout, workers = sys.argv[1], float(sys.argv[2]), int(sys.argv[3])
+proxies = json.loads(sys.stdin.readline())
+proxies_pool.setup_interrupt_handler()
+func = proxies_pool.check_proxies_batch_async if engine == "async" else proxies_pool.check_proxies_batch
+options = {"concurrency": workers} if engine == "async" else {"max_workers": workers}
+print("ready", flush=True)
+func({proxy: 90 for proxy in proxies}, {proxy: "http" for proxy in proxies},
+     test_url="http://benchmark.invalid/ip", timeout=timeout, check_type="existing", **options)
+print("returned", flush=True)
+proxies_pool.restore_interrupt_handler()  # 与菜单流程相同: 收尾完成后取消退出期限,之后进程正常退出
+"""
+
+
+def benchmark_shutdown(farm, timeout, workers, concurrency, warmup=1.5):
+    """
+    :return: [(引擎, 信号, 验证函数返回耗时, 进程退出耗时)], 耗时均从发送信号开始计算(秒)
+    """
+    results = []
+    for engine, size in (("thread", workers), ("async", concurrency)):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            child = subprocess.Popen([sys.executable, "-c", SHUTDOWN_CHILD, engine, str(timeout), str(size)],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                                     cwd=os.path.dirname(os.path.abspath(__file__)))
+            child.stdin.write(json.dumps(farm.proxies) + "\n")
+            child.stdin.flush()
+            child.stdout.readline()  # ready
+            time.sleep(warmup)  # 此时在途检查已占满并发,其中黑洞代理要等到超时才会结束
+            child.send_signal(signum)
+            start = time.perf_counter()
+            returned = None
+            for line in child.stdout:
+                if line.strip() == "returned":
+                    returned = time.perf_counter() - start
+            child.wait()
+            results.append((engine, signal.Signals(signum).name, returned, time.perf_counter() - start))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基准测试")
+    parser.add_argument("--mode", choices=["validate", "scrape", "api", "history", "pool", "stats", "journal",
+                                           "shutdown", "window", "farm", "parse", "cache", "selector"],
+                        default="validate",
+                        help="validate: 验证引擎; scrape: 爬虫单页耗时; api: API服务压测; "
+                             "history: 检查历史内存占用; pool: 列式代理池内存占用; stats: 代理池统计耗时; "
+                             "journal: 验证日志开销; shutdown: 中断后的退出耗时; window: 流式验证内存占用; "
+                             "farm: 多协议模拟代理组端到端验证; parse: 各来源页面解析吞吐和正确性; "
+                             "cache: 纯文本列表的条件请求缓存; selector: 加权抽取器分数推送")
+    parser.add_argument("--pages", type=int, default=500, help="scrape模式爬取的页数")
+    parser.add_argument("--clients", type=int, default=16, help="api模式并发客户端数")
+    parser.add_argument("--duration", type=float, default=10, help="api模式压测时长(秒)")
+    parser.add_argument("--pool-size", type=int, default=100000, help="api/history/pool/stats/selector模式合成代理池大小")
+    parser.add_argument("--proxies", type=int, default=2000, help="模拟代理数量")
+    parser.add_argument("--lines", type=int, default=3000, help="cache模式代理列表行数")
+    parser.add_argument("--checks", type=int, default=20000, help="window模式检查次数(循环使用模拟代理)")
+    parser.add_argument("--latency", type=float, default=0.2, help="正常代理响应延迟(秒)")
+    parser.add_argument("--dead-ratio", type=float, default=0.3, help="黑洞代理比例")
+    parser.add_argument("--timeout", type=float, default=2, help="验证超时(秒)")
+    parser.add_argument("--workers", type=int, default=proxies_pool.MAX_WORKERS, help="线程池引擎线程数")
+    parser.add_argument("--concurrency", type=int, default=proxies_pool.ASYNC_CONCURRENCY, help="异步引擎并发数")
+    parser.add_argument("--skip-thread", action="store_true", help="跳过线程池引擎(代理数很大时较慢)")
+    parser.add_argument("--protocols", default="http,socks4,socks5", help="farm模式模拟代理协议(轮流分配)")
+    parser.add_argument("--fail-ratio", type=float, default=0.05, help="farm模式每次请求随机断开的概率")
+    parser.add_argument("--wrong-origin-ratio", type=float, default=0.05, help="farm模式不转发请求直接返回自己页面的代理比例")
+    parser.add_argument("--seed", type=int, default=1, help="farm模式随机种子")
+    parser.add_argument("--detect", action="store_true", help="farm模式不告诉引擎代理类型,测试自动检测")
+    parser.add_argument("--targets", action="store_true",
+                        help="farm模式有效代理再检查回显目标上的两个验证目标(/ip 应通过, /login 不含expect文本应不通过)")
+    parser.add_argument("--repeat", type=int, default=3, help="farm模式每个引擎重复次数(取耗时居中的一次)")
+    parser.add_argument("--corpus", help="parse模式语料目录(<来源>_<序号>.html,不存在时生成合成页面并保存到该目录)")
+    parser.add_argument("--output", help="farm模式把参数和结果追加为一行JSON到该文件,便于跨版本比较")
+    args = parser.parse_args()
+
+    if args.mode == "scrape":
+        print(f"页数: {args.pages} (本地HTTP,不含TLS握手;真实https站点每页省下的握手时间更多)")
+        for name, mean, p95 in benchmark_scrape(args.pages):
+            print(f"{name:>13}: 平均 {mean:6.2f}ms/页 | p95 {p95:6.2f}ms")
+        return
+
+    if args.mode == "cache":
+        print(f"列表行数: {args.lines}  (响应体字节数 / 交给去重和验证的代理数)")
+        for step, row in benchmark_cache(args.lines):
+            print(f"{step:>14}: " + " | ".join(f"{name} {sent / 1e3:6.1f}KB {count:5d}个" for name, sent, count in row))
+        return
+
+    if args.mode == "parse":
+        total_size = 0
+        total_times = [0] * 4
+        print("吞吐为 修改前 -> 修改后 (MB/s)")
+        for name, size, parse_rates, normalized_rates, old_count, new_count, same in benchmark_parse(args.corpus):
+            rates = parse_rates + normalized_rates
+            print(f"{name:>23}: {size / 1e3:7.1f}KB | 解析 {rates[0]:6.1f} -> {rates[1]:6.1f} | "
+                  f"解析+规范化 {rates[2]:6.1f} -> {rates[3]:6.1f} | 代理 {old_count} -> {new_count} "
+                  f"{'一致' if same else '不一致'}")
+            total_size += size
+            total_times = [total + size / rate for total, rate in zip(total_times, rates)]
+        rates = [total_size / total for total in total_times]
+        print(f"{'全部':>22}: {total_size / 1e3:7.1f}KB | 解析 {rates[0]:6.1f} -> {rates[1]:6.1f} | "
+              f"解析+规范化 {rates[2]:6.1f} -> {rates[3]:6.1f}")
+        return
+
+    if args.mode == "api":
+        total, rate, p50, p95, errors = benchmark_api(args.clients, args.duration, args.pool_size)
+        print(f"代理池: {args.pool_size}  客户端: {args.clients}  时长: {args.duration}s (GET /proxy n=10 : POST /report = 9 : 1)")
+        print(f"请求 {total} | {rate:8.1f} 请求/秒 | p50 {p50:.2f}ms | p95 {p95:.2f}ms | 错误 {errors}")
+        return
+
+    if args.mode == "history":
+        array_bytes, dict_bytes, rate = benchmark_history(args.pool_size)
+        print(f"代理数: {args.pool_size}  每个代理保留: {proxies_pool.HISTORY_SIZE} 次检查")
+        print(f"数组 {array_bytes / 1e6:.2f}MB | 槽位字典 {dict_bytes / 1e6:.2f}MB | 记录 {rate:,.0f} 次/秒")
+        return
+
+    if args.mode == "selector":
+        update_rate, sample_rate, consistent, slots, live = benchmark_selector(args.pool_size)
+        print(f"代理数: {args.pool_size}  压缩比例: {proxies_pool.SELECTOR_COMPACT_RATIO}")
+        print(f"更新 {update_rate:,.0f} 次/秒 | 抽取(n=10) {sample_rate:,.0f} 次/秒 | 权重{'一致' if consistent else '不一致'} | "
+              f"索引下标 {slots} 个 (有效 {live} 个)")
+        return
+
+    if args.mode == "stats":
+        print(f"代理数: {args.pool_size}")
+        for name, elapsed in benchmark_stats(args.pool_size):
+            print(f"{name:>16}: {elapsed:9.2f}ms")
+        return
+
+    if args.mode == "pool":
+        print(f"代理数: {args.pool_size}  numpy: {'是' if proxies_pool.numpy is not None else '否(逐行筛选)'}")
+        for name, size, elapsed, selected in benchmark_pool(args.pool_size):
+            print(f"{name:>9}: 内存 {size / 1e6:6.2f}MB ({size / args.pool_size:5.1f}字节/代理) | "
+                  f"筛选socks5且>=60分 {elapsed:7.2f}ms ({selected}个)")
+        return
+
+    if args.mode == "journal":
+        with StandinProxyFarm(args.proxies, args.latency, args.dead_ratio) as farm:
+            results, append_us = benchmark_journal(farm, args.timeout, args.concurrency)
+        print(f"代理数: {args.proxies}  延迟: {args.latency}s  黑洞比例: {args.dead_ratio}  "
+              f"每批 {proxies_pool.JOURNAL_FLUSH_SIZE} 条/最长 {proxies_pool.JOURNAL_FLUSH_INTERVAL}s 写入一次")
+        base_rate = results[0][2]
+        for name, elapsed, rate in results:
+            print(f"{name:>8}: 耗时 {elapsed:7.2f}s | {rate:8.1f} 代理/秒 | 相对无日志 {(rate / base_rate - 1) * 100:+.1f}%")
+        print(f"单条日志追加(含批量写入): {append_us:.2f}µs")
+        return
+
+    if args.mode == "farm":
+        params, results = benchmark_farm(args)
+        print("参数: " + ", ".join(f"{name}={value}" for name, value in params.items()))
+        for engine, run in results:
+            print(f"{engine:>6}: {run['rate']:8.1f} 代理/秒 | 耗时 {run['elapsed']:6.2f}s | "
+                  f"p50 {run['p50_ms']}ms p95 {run['p95_ms']}ms | CPU {run['cpu_s']:.2f}s | 峰值内存 {run['rss_mb']}MB | "
+                  f"有效 {run['valid']}/{run['expected_ok']} (误判 {run['false_valid']}, 类型错误 {run['wrong_type']}, "
+                  f"匿名级别错误 {run['wrong_anonymity']})"
+                  + "".join(f" | 目标{name}通过 {passed}/{run['valid']}" for name, passed in run["target_passed"].items()))
+        if args.output:
+            record = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "revision": git_revision(),
+                      "python": platform.python_version(), "params": params, "results": dict(results)}
+            with open(args.output, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            print(f"结果已追加到 {args.output}")
+        # echo目标对有效代理应大多通过(只有随机断开的失败), login目标响应不含expect文本, 一个都不应通过
+        if any(run["wrong_anonymity"] or run["target_passed"].get("login")
+               or run["target_passed"].get("echo") == 0 < run["valid"] for _, run in results):
+            sys.exit(1)
+        return
+
+    if args.mode == "window":
+        with StandinProxyFarm(args.proxies, args.latency, args.dead_ratio) as farm:
+            results = benchmark_window(farm, args.checks, args.timeout, args.workers, args.concurrency)
+        print(f"检查次数: {args.checks}  模拟代理: {args.proxies}  线程数: {args.workers}  异步并发: {args.concurrency}")
+        for name, peak, elapsed, completed in results:
+            print(f"{name:>8}: 内存增量 {peak / 1e6:7.2f}MB | 耗时 {elapsed:6.2f}s | 完成 {completed}")
+        return
+
+    if args.mode == "shutdown":
+        with StandinProxyFarm(args.proxies, args.latency, args.dead_ratio) as farm:
+            results = benchmark_shutdown(farm, args.timeout, args.workers, args.concurrency)
+        print(f"代理数: {args.proxies}  黑洞比例: {args.dead_ratio}  超时: {args.timeout}s  "
+              f"退出期限: {proxies_pool.SHUTDOWN_DEADLINE}s")
+        late = 0
+        for engine, name, returned, exited in results:
+            returned = "未返回" if returned is None else f"{returned:6.2f}s"
+            within = exited <= proxies_pool.SHUTDOWN_DEADLINE
+            late += not within
+            print(f"{engine:>6} {name:>7}: 验证函数返回 {returned} | 进程退出 {exited:6.2f}s {'✅' if within else '❌ 超出期限'}")
+        if late:
+            sys.exit(1)
+        return
+
+    with StandinProxyFarm(args.proxies, args.latency, args.dead_ratio) as farm:
+        proxies = {proxy: 90 for proxy in farm.proxies}
+        proxy_types = {proxy: "http" for proxy in farm.proxies}
+        test_url = "http://benchmark.invalid/ip"  # 模拟代理不会真正访问目标
+
+        results = []
+        if not args.skip_thread:
+            results.append(run_engine("thread", proxies_pool.check_proxies_batch, proxies, proxy_types,
+                                      test_url=test_url, timeout=args.timeout, max_workers=args.workers))
+        results.append(run_engine("async", proxies_pool.check_proxies_batch_async, proxies, proxy_types,
+                                  test_url=test_url, timeout=args.timeout, concurrency=args.concurrency))
+
+    print(f"代理数: {args.proxies}  延迟: {args.latency}s  黑洞比例: {args.dead_ratio}  超时: {args.timeout}s")
+    for name, elapsed, rate, valid in results:
+        print(f"{name:>6}: 耗时 {elapsed:7.2f}s | {rate:8.1f} 代理/秒 | 有效 {valid}")
+
+
+if __name__ == '__main__':
+    main()
@@ -20,44 +20,152 @@ Type,Proxy:Port,Score
 import re
 import requests
 import concurrent.futures
+import contextlib
+import asyncio
+import socket
+import ssl
 import time
 import os
+import random
 import sys
 import csv
+import hashlib
+import array
+import atexit
+import bisect
+import collections
+import heapq
+import http.server
+import json
+import math
 import signal
+import struct
+import sqlite3
+import threading
+import urllib.parse
+
+try:
+    import numpy  # 可选: 列式代理池的向量化筛选和统计
+except ImportError:
+    numpy = None
 
 # ============默认配置区 - Default Configuration
 OUTPUT_FILE = "../proxies/valid_proxies.csv"  # 输出有效代理文件（CSV格式）- Export valid proxy file (CSV format)
-TEST_URL = "http://httpbin.org/ip"  # 测试使用的URL - URL used for testing
+STORE_BACKEND = "sqlite"  # 代理池存储后端: "sqlite"(索引+单点更新) 或 "csv"(每次重写整个OUTPUT_FILE) - Pool storage backend
+POOL_DB_FILE = "../proxies/valid_proxies.db"  # sqlite代理池文件,首次使用时自动从OUTPUT_FILE导入 - SQLite pool file
+TEST_URL = "http://httpbin.org/get"  # 测试使用的URL,回显来源IP和请求头时同时判断匿名级别 - URL used for testing
 TIMEOUT = 6  # 超时时间(秒) - Timeout (s)
+PUBLIC_IP_RETRY = 60  # 查询本机IP(判断匿名级别用)失败后多久再试(秒),查到之前匿名级别记为未知 - Retry interval of the public IP lookup (s)
 MAX_WORKERS = 80  # 最大并发数 - Maximum concurrency
+VALIDATION_ENGINE = "async"  # 验证引擎: "async"(asyncio,单进程数千并发) 或 "thread"(线程池) - Validation engine
+ASYNC_CONCURRENCY = 1000  # 异步引擎最大并发数 - Maximum concurrency of the asyncio engine
+AUTO_DETECT_MODE = "parallel"  # 自动检测类型方式: "parallel"(预探测后并行尝试各协议) 或 "sequential"(依次尝试) - Auto type detection mode
+CONNECT_TIMEOUT = 2  # 预探测/预筛TCP连接超时(秒) - TCP connect timeout of the pre-probe and prefilter (s)
+TCP_PREFILTER = True  # 验证前先用TCP连接预筛,丢弃端口无法连接的代理 - Drop unreachable ip:port before full validation
+PREFILTER_CONCURRENCY = 2000  # TCP预筛最大并发连接数 - Maximum concurrent connects of the prefilter
+PIPELINE_QUEUE_SIZE = 1000  # 流式流水线各阶段之间队列的最大长度(背压) - Bounded queue size between pipeline stages
+PIPELINE_FLUSH_INTERVAL = 1  # 流式流水线结果写入代理池的最长间隔(秒) - Max interval between pool upserts (s)
 MAX_SCORE = 100  # 最大积分 - Maximum score
+LATENCY_WINDOW = 20  # 每个代理保留最近多少次成功检查的响应时间(计算p50/p95) - Rolling window of response times
+LATENCY_EWMA_ALPHA = 0.3  # 响应时间指数加权平均的平滑系数 - EWMA smoothing factor of response time
+LATENCY_REFERENCE = 1  # 综合质量中的参考延迟(秒): 延迟等于它时分数折半 - Latency that halves the quality metric (s)
+HISTORY_SIZE = 16  # 每个代理保留最近多少次检查结果(最多16) - Number of recent checks kept per proxy (<= 16)
+HISTORY_EVICT_STREAK = 8  # 连续失败达到该次数直接淘汰,不论分数 - Evict after this many consecutive failures
+HISTORY_MIN_PASS_RATE = 0.25  # 历史记满后通过率低于该值直接淘汰 - Evict when the pass rate of a full history is below this
+SCRAPER_POOL_SIZE = 10  # 爬虫每个域名保持的keep-alive连接数 - Keep-alive connections per scraped host
+FETCH_CACHE_DIR = "../proxies/fetch_cache"  # 爬取缓存目录(ETag/Last-Modified、内容哈希和上次内容) - Conditional GET cache directory
+FETCH_CACHE_DIFF = True  # 启用缓存的来源只把相比上次新增的代理交给去重和验证 - Pass only newly added entries to validation
+
+# 多目标验证相关配置
+# 代理通过TEST_URL验证后,同时检查以下目标,各目标是否通过和响应时间写入代理池,提取时可按目标筛选(空字典则不检查)
+# 名称: {"url": 目标URL, "expect": 响应中必须包含的文本(可省略)}; 2xx响应才算通过
+# 默认不检查(每个有效代理多一次请求),需要时按下面的示例添加
+VALIDATION_TARGETS = {
+    # "https": {"url": "https://httpbin.org/ip", "expect": "origin"},  # https目标(http代理经CONNECT隧道访问)
+}
+
+# API服务相关配置
+API_HOST = "127.0.0.1"  # API服务监听地址 - API server host
+API_PORT = 5010  # API服务端口 - API server port
+API_FLUSH_INTERVAL = 5  # API服务将分数变化写入代理池的间隔(秒) - Interval of persisting reported scores (s)
+API_REVALIDATE = True  # API服务运行时在后台持续验证代理池 - Run the revalidation scheduler inside the API server
+SELECTOR_COMPACT_RATIO = 0.5  # 加权抽取器某类型中已移除(权重0)的代理超过该比例时重建索引 - Rebuild a weighted index above this dead fraction
+
+# 后台持续验证相关配置
+RECHECK_CONCURRENCY = 50  # 同时在途的最大检查数(稳定的小并发,不再整池突发) - Steady number of in-flight checks
+RECHECK_MIN_INTERVAL = 60  # 最不稳定代理的检查间隔(秒) - Check interval of the flakiest proxies (s)
+RECHECK_MAX_INTERVAL = 6 * 3600  # 满分代理的检查间隔(秒) - Check interval of full-score proxies (s)
+RECHECK_FLUSH_INTERVAL = 10  # 检查结果批量写入代理池的间隔(秒) - Interval of persisting check results (s)
+RECHECK_SYNC_INTERVAL = 600  # 从代理池加载新加入代理的间隔(秒) - Interval of picking up newly added proxies (s)
+
+# 来源产出统计相关配置
+SOURCE_STATS_FILE = "../proxies/source_stats.json"  # 各来源产出统计(每次请求得到的有效新代理数) - Per-source yield stats
+SOURCE_STATS_DECAY = 0.7  # 每次并发爬取后旧统计保留的比例,越小越看重最近几次 - Weight kept by older runs
+SOURCE_MIN_YIELD = 0.1  # 每次请求平均有效新代理数低于该值的来源在并发爬取时自动跳过 - Skip sources yielding less per request
+SOURCE_MIN_RUNS = 3  # 来源至少被并发爬取过几次才判断产出 - Runs needed before a source can be skipped
+SOURCE_RETRY_AFTER = 7 * 24 * 3600  # 被跳过的来源距上次爬取超过该时间(秒)后重新爬取一次 - Retry skipped sources after (s)
+
+# 去重相关配置
+USE_SEEN_FILTER = False  # 使用持久化布隆过滤器记录验证过的代理,跨次运行直接拒绝已知失效代理 - Persistent Bloom filter of seen proxies
+SEEN_FILTER_FILE = "../proxies/seen_proxies.bloom"  # 布隆过滤器文件 - Bloom filter file
+SEEN_FILTER_CAPACITY = 1000000  # 布隆过滤器容量 - Expected number of proxies
+SEEN_FILTER_ERROR_RATE = 0.001  # 布隆过滤器误判率 - False positive rate
+
+# 失效代理缓存相关配置
+USE_NEGATIVE_CACHE = True  # 记录近期验证失效的代理,失效期内去重时直接跳过 - Skip recently dead proxies
+NEGATIVE_CACHE_FILE = "../proxies/dead_proxies.csv"  # 失效代理缓存文件 - Negative cache file
+NEGATIVE_CACHE_SIZE = 200000  # 最多记录的失效代理数,超出时淘汰最久未用的 - Max entries (LRU eviction)
+NEGATIVE_TTL = 3600  # 第一次失效后跳过多久(秒),之后每连续失效一次翻倍 - Base TTL, doubled per failure
+NEGATIVE_TTL_MAX = 7 * 24 * 3600  # 失效期上限(秒) - TTL cap
+NEGATIVE_CACHE_SAVE_INTERVAL = 30  # 失效代理缓存最短写入间隔(秒),退出时总会写入 - Min seconds between saves
 
 # 中断恢复相关配置
 INTERRUPT_DIR = "../proxies/interrupt"  # 中断文件目录
 INTERRUPT_FILE = os.path.join(INTERRUPT_DIR, "interrupted_proxies.csv")  # 爬取验证中断文件
 INTERRUPT_FILE_LOAD = os.path.join(INTERRUPT_DIR, "interrupted_load_proxies.csv")   # 本地文件加载中断文件
 INTERRUPT_FILE_EXISTING = os.path.join(INTERRUPT_DIR, "interrupted_existing_proxies.csv")   # 更新代理池中断文件
+JOURNAL_FLUSH_SIZE = 64  # 验证日志每攒够多少条结果写入一次文件 - Journal batch size
+JOURNAL_FLUSH_INTERVAL = 1  # 验证日志最长写入间隔(秒) - Max seconds between journal writes
+JOURNAL_FSYNC = False  # 每次写入验证日志后fsync(只防断电;进程崩溃或被杀时已写入系统缓存的内容不会丢) - fsync journal writes
+SHUTDOWN_DEADLINE = 10  # 收到中断信号后最多用多少秒取消在途检查并保存进度,超时强制退出(再次中断立即退出) - Graceful shutdown deadline
 
 # 全局变量用于中断处理
 current_validation_process = None
 interrupted = False
+_interrupt_generation = 0  # 每次设置/恢复中断处理器时加1,使上一次中断的退出期限失效
 
 def create_interrupt_dir():
     """创建中断目录"""
     os.makedirs(INTERRUPT_DIR, exist_ok=True)
 
 def save_interrupted_proxies(remaining_proxies, proxy_type, original_count, interrupt_file=INTERRUPT_FILE):
-    """保存中断时的代理列表"""
+    """
+    保存待验证的代理列表
+
+    调用时之前的验证结果都已写入代理池,所以同时清空对应的验证日志;先写临时文件再替换,写到一半崩溃不会损坏原文件
+
+    :param proxy_type: 验证类型; 各代理类型不同时(如并发爬取多个来源)传入 {代理: 类型},第一行类型记为"mixed",每行保存各自的类型
+    """
     create_interrupt_dir()
-    with open(interrupt_file, 'w', encoding="utf-8", newline='') as file:
+    temp_file = interrupt_file + ".tmp"
+    with open(temp_file, 'w', encoding="utf-8", newline='') as file:
         writer = csv.writer(file)
-        writer.writerow([proxy_type, original_count])  # 第一行保存类型和原始数量
-        for proxy in remaining_proxies:
-            writer.writerow([proxy])
+        if isinstance(proxy_type, dict):
+            writer.writerow(["mixed", original_count])
+            writer.writerows([proxy, proxy_type.get(proxy, "auto")] for proxy in remaining_proxies)
+        else:
+            writer.writerow([proxy_type, original_count])  # 第一行保存类型和原始数量
+            writer.writerows([proxy] for proxy in remaining_proxies)
+    os.replace(temp_file, interrupt_file)
+    delete_file(journal_path(interrupt_file))
 
-def load_interrupted_proxies(interrupt_file=INTERRUPT_FILE):
-    """加载中断的代理列表"""
+def load_interrupted_proxies(interrupt_file=INTERRUPT_FILE, recover=True):
+    """
+    加载中断的代理列表(先把验证日志中已完成的结果补写到代理池,返回的只是真正没验证过的代理)
+
+    :param recover: 为False时不读取验证日志(询问用户是否继续之前使用, 返回的代理包括日志中已完成的)
+    :return: 剩余代理, 类型(逐个保存类型时为 {代理: 类型}), 原始数量
+    """
     # 如果没有中断记录
     if not os.path.exists(interrupt_file):
         return None, None, None
@@ -72,64 +180,335 @@ def load_interrupted_proxies(interrupt_file=INTERRUPT_FILE):
             
             proxy_type = first_row[0]
             original_count = int(first_row[1])
-            remaining_proxies = [row[0] for row in reader if row]
-        # 有效并成功读取  
-        return remaining_proxies, proxy_type, original_count  # 剩余代理,类型,原始数量
+            rows = [row for row in reader if row]
+            remaining_proxies = [row[0] for row in rows]
+            if proxy_type == "mixed":
+                proxy_type = {row[0]: row[1] if len(row) > 1 else "auto" for row in rows}
     # 失败
     except:
         return None, None, None
 
+    if not recover:
+        return remaining_proxies, proxy_type, original_count
+    completed = recover_journal(interrupt_file, proxy_type)
+    if completed:
+        remaining_proxies = [proxy for proxy in remaining_proxies if proxy not in completed]
+        if not remaining_proxies:
+            delete_interrupt_file(interrupt_file)
+            return None, None, None
+        save_interrupted_proxies(remaining_proxies, proxy_type, original_count, interrupt_file)
+    return remaining_proxies, proxy_type, original_count  # 剩余代理,类型,原始数量
+
+def describe_proxy_type(proxy_type):
+    """中断记录中的验证类型说明(逐个保存类型时按类型计数)"""
+    if not isinstance(proxy_type, dict):
+        return proxy_type
+    counts = collections.Counter(proxy_type.values())
+    return "各代理分别记录(" + ", ".join(f"{name} {count}个" for name, count in counts.most_common()) + ")"
+
+def print_journal_pending(interrupt_file):
+    """询问是否继续之前显示验证日志中已完成但还没写入代理池的结果数"""
+    completed = len(ValidationJournal.replay(journal_path(interrupt_file))[0])
+    if completed:
+        print(f"   验证日志中已完成: {completed} 个 (继续时写入代理池, 删除记录时一并丢弃)")
+
+def delete_file(path):
+    """删除文件(不存在时忽略)"""
+    if os.path.exists(path):
+        os.remove(path)
+
 def delete_interrupt_file(interrupt_file=INTERRUPT_FILE):
-    """删除中断文件"""
-    if os.path.exists(interrupt_file):
-        os.remove(interrupt_file)
+    """删除中断文件及其验证日志"""
+    delete_file(interrupt_file)
+    delete_file(journal_path(interrupt_file))
+
+def journal_path(interrupt_file):
+    """中断文件对应的验证日志路径"""
+    return os.path.splitext(interrupt_file)[0] + ".journal"
+
+class ValidationJournal:
+    """
+    验证结果预写日志(write-ahead journal)
+
+    中断文件只在验证开始时写入一次完整的待验证列表;之后每个代理计分完成就在日志末尾追加一行
+    "代理,类型,分数,响应时间,匿名级别,各验证目标响应时间(JSON)",攒够 flush_size 条或超过 flush_interval 秒写入一次文件.
+    进程崩溃、被kill或断电后,load_interrupted_proxies 重放日志: 把已完成的结果补写到代理池,
+    并从待验证列表中去掉这些代理,下次只验证真正没完成的代理. 最多丢失最后一批未写入的结果.
+
+    只在计分所在的线程中调用(线程池引擎的主线程/异步引擎的事件循环),不加锁
+    """
+    def __init__(self, path, flush_size=JOURNAL_FLUSH_SIZE, flush_interval=JOURNAL_FLUSH_INTERVAL, fsync=JOURNAL_FSYNC):
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.buffer = []
+        self.written = 0
+        self.last_flush = time.monotonic()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._truncate_partial_line()
+        self.file = open(path, "a", encoding="utf-8")
+
+    def _truncate_partial_line(self):
+        """上次写到一半被杀时末尾会留下不完整的一行,截掉它,避免和新写入的行拼在一起"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as file:
+            data = file.read()
+            if data and not data.endswith(b"\n"):
+                file.truncate(data.rfind(b"\n") + 1)
+
+    def append(self, proxy, proxy_type, score, latency=None, anonymity=None, targets=None):
+        """
+        追加一个验证结果
+
+        :param anonymity: 匿名级别,未知为None
+        :param targets: 各验证目标的响应时间 {目标: 秒或None}
+        """
+        latency = "" if latency is None else f"{latency:.3f}"
+        targets = json.dumps(targets, separators=(",", ":"), ensure_ascii=False) if targets else ""
+        self.buffer.append(f"{proxy},{proxy_type},{score},{latency},{anonymity or ''},{targets}\n")
+        if len(self.buffer) >= self.flush_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """把缓冲的结果写入文件(一次write)"""
+        if self.buffer:
+            self.file.write("".join(self.buffer))
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.written += len(self.buffer)
+            self.buffer.clear()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def replay(path):
+        """
+        读取验证日志,同一代理出现多次时以最后一次为准(兼容旧版只有前4列的日志)
+
+        :return: 分数字典, 类型字典, 有效代理的响应时间字典, 匿名级别字典, 各验证目标响应时间字典
+        """
+        scores, types, latencies, anonymity, target_results = {}, {}, {}, {}, {}
+        if not os.path.exists(path):
+            return scores, types, latencies, anonymity, target_results
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.endswith("\n"):
+                    break  # 写到一半的最后一行
+                try:
+                    proxy, proxy_type, score, latency, *extra = line[:-1].split(",", 5)
+                    level, targets = extra if extra else ("", "")
+                    targets = json.loads(targets) if targets else None
+                    scores[proxy] = int(score)
+                except ValueError:
+                    continue
+                types[proxy] = proxy_type
+                for values, value in ((latencies, float(latency) if latency else None),
+                                      (anonymity, level or None), (target_results, targets)):
+                    if value is None:
+                        values.pop(proxy, None)
+                    else:
+                        values[proxy] = value
+        return scores, types, latencies, anonymity, target_results
+
+def recover_journal(interrupt_file, proxy_type):
+    """
+    把验证日志中已完成但还没写入代理池的结果补写到代理池(重复补写结果相同)
+
+    :param proxy_type: 中断文件记录的类型, "already_have" 表示验证的是代理池中已有的代理
+    :return: 日志中已完成验证的代理集合
+    """
+    scores, types, latencies, anonymity, target_results = ValidationJournal.replay(journal_path(interrupt_file))
+    if not scores:
+        return set()
+    if proxy_type == "already_have":
+        store = get_pool_store()
+        store.update_scores(scores)
+        store.record_latencies(latencies)
+        store.record_target_results(target_results)
+        store.record_anonymity(anonymity)
+        notify_score_updates((proxy, types[proxy], score) for proxy, score in scores.items())
+        remember_seen_proxies([proxy for proxy, score in scores.items() if score <= 0])
+        remember_dead_proxies(scores)
+        store.remove_dead()
+    else:
+        merge_new_proxies(scores, types, latencies, target_results, anonymity)
+    print(f"📒 已从验证日志恢复 {len(scores)} 个上次已完成的验证结果到代理池")
+    return set(scores)
 
 def signal_handler(signum, frame):
-    """信号处理函数，用于捕获Ctrl+C"""
+    """
+    信号处理函数，用于捕获Ctrl+C和SIGTERM
+
+    第一次中断只设置interrupted标志: 验证引擎停止提交新检查并取消在途检查,流程保存进度后返回.
+    收尾超过SHUTDOWN_DEADLINE秒或再次收到中断信号时强制退出(已完成的结果在验证日志中,下次仍可恢复)
+    """
     global interrupted
+    if interrupted:
+        print("\n⚠️ 再次收到中断信号，立即退出")
+        os._exit(130)
     interrupted = True
-    print("\n\n⚠️ 检测到中断信号，正在保存进度...")
+    print(f"\n\n⚠️ 检测到中断信号({signal.Signals(signum).name})，正在取消在途检查并保存进度"
+          f"(最多 {SHUTDOWN_DEADLINE}s，再次中断立即退出)...")
+    generation = _interrupt_generation
+
+    def force_exit():
+        if interrupted and generation == _interrupt_generation:
+            print(f"\n⏱️ {SHUTDOWN_DEADLINE}s 内未完成收尾，强制退出")
+            os._exit(130)
+
+    watchdog = threading.Timer(SHUTDOWN_DEADLINE, force_exit)
+    watchdog.daemon = True
+    watchdog.start()
+
+def raise_keyboard_interrupt(signum, frame):
+    """将信号转换为KeyboardInterrupt(守护模式下SIGTERM与Ctrl+C一样正常退出)"""
+    raise KeyboardInterrupt
 
 def setup_interrupt_handler():
-    """设置中断处理器"""
-    global interrupted
+    """设置中断处理器(SIGINT和SIGTERM相同处理)"""
+    global interrupted, _interrupt_generation
     interrupted = False
+    _interrupt_generation += 1
     signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+def restore_interrupt_handler():
+    """流程结束(含中断后收尾完成)时恢复默认信号处理,取消退出期限"""
+    global interrupted, _interrupt_generation
+    interrupted = False
+    _interrupt_generation += 1
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+# ============代理解析 - Proxy extraction
+# 解析式以固定的标签/键名开头(re先用子串查找定位开头,不必在每个位置尝试),IP和端口只匹配数字和点,
+# 匹配失败时在当前单元格内就结束,不会像 .*? 那样跨行回溯;只有ip和port两个捕获组时用findall直接得到元组.
+# 纯文本 ip:port 列表不用解析式,按空白分词(格式由后续的规范化校验)
+
+IP_GROUP = r"(?P<ip>\d{1,3}(?:\.\d{1,3}){3})"
+PORT_GROUP = r"(?P<port>\d{1,5})"
+TABLE_PATTERN = r"<td>\s*" + IP_GROUP + r"\s*</td>\s*<td>\s*" + PORT_GROUP + r"\s*</td>"  # 表格中相邻的IP、端口单元格
+STRONG_TABLE_PATTERN = r"<td><strong>\s*" + IP_GROUP + r"\s*</strong></td>\s*<td>\s*" + PORT_GROUP + r"\s*</td>"  # IP加粗的表格
+KUAIDAILI_PATTERN = r'"ip": "' + IP_GROUP + r'", "last_check_time": "[^"]*", "port": "' + PORT_GROUP + '"'  # 页面内嵌的JSON列表
+TEXT_LIST_PATTERN = None  # 纯文本 ip:port 列表
+
+def parse_proxies(text, regex, capture_groups=("ip", "port")):
+    """
+    从页面文本解析代理
+
+    :param regex: 编译后的解析式, None 表示纯文本 ip:port 列表
+    :param capture_groups: IP和端口对应的组名
+    :return: 生成器,产出 (ip, port)
+    """
+    if regex is None:
+        for token in text.split():
+            ip, separator, port = token.rpartition(":")
+            if separator:
+                yield ip, port
+    elif regex.groups == 2 and tuple(regex.groupindex) == tuple(capture_groups):
+        # 只有这两个捕获组: findall直接返回元组,不创建Match对象
+        for ip, port in regex.findall(text):
+            yield ip.strip(), port.strip()
+    else:
+        for match in regex.finditer(text):
+            ip, port = match.group(*capture_groups)
+            yield ip.strip(), port.strip()
+
+def extract_proxies(text, regex, capture_groups=("ip", "port")):
+    """
+    从页面文本提取代理
+
+    :return: [ip:port],纯文本列表直接返回分词结果(无效条目由后续规范化丢弃)
+    """
+    if regex is None:
+        return text.split()
+    return [f"{ip}:{port}" for ip, port in parse_proxies(text, regex, capture_groups)]
 
 class ProxyScraper:
     """
     get ip
 
+    同一域名的所有ProxyScraper共享一个requests.Session(连接池+keep-alive),翻页时不再重复TCP/TLS握手;
+    解析式编译后缓存,每种解析式只编译一次
+
     :param url: 请求地址
-    :param regex_pattern: re解析式，用于解析爬取结果
+    :param regex_pattern: re解析式，用于解析爬取结果; None 表示纯文本 ip:port 列表
     :param capture_groups: 要返回的re中的值，[IpName,Port]
+    :param headers: 额外的请求头(如Referer)
+    :param cache: FetchCache,指定时发送条件请求并按缓存返回结果
     :return: [proxy:port]
     """
-    def __init__(self, url: str, regex_pattern: str, capture_groups: list):
+    _sessions = {}  # 域名 -> requests.Session
+    _sessions_lock = threading.Lock()
+    _regex_cache = {}  # 解析式 -> 编译后的re对象
+
+    def __init__(self, url: str, regex_pattern: str, capture_groups: list, headers: dict = None, cache=None):
         self.url = url
         self.headers = {
             'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0'
         }
+        if headers:
+            self.headers.update(headers)
         self.encoding = "utf-8"
         self.regex_pattern = regex_pattern
+        self.regex = self.compile_pattern(regex_pattern)
         self.capture_groups = capture_groups
+        self.cache = cache
+
+    @classmethod
+    def compile_pattern(cls, regex_pattern):
+        """编译解析式(带缓存)"""
+        if regex_pattern is None:
+            return None
+        regex = cls._regex_cache.get(regex_pattern)
+        if regex is None:
+            regex = cls._regex_cache[regex_pattern] = re.compile(regex_pattern, re.S)
+        return regex
+
+    @classmethod
+    def get_session(cls, url):
+        """获取url所在域名共享的Session"""
+        host = urllib.parse.urlsplit(url).netloc
+        with cls._sessions_lock:
+            session = cls._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=SCRAPER_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                cls._sessions[host] = session
+        return session
 
     def scrape_proxies(self):
-        extracted_data = []
         try:
-            response = requests.get(url=self.url, headers=self.headers, timeout=TIMEOUT)
+            headers = self.headers
+            if self.cache is not None:
+                headers = {**headers, **self.cache.conditional_headers(self.url)}
+            response = self.get_session(self.url).get(url=self.url, headers=headers, timeout=TIMEOUT)
+            if self.cache is not None and response.status_code in (200, 304):
+                proxy_list = self.cache.extract(self.url, response, self.regex, self.capture_groups)
+                response.close()
+                return proxy_list
             if response.status_code == 200:  # 判断状态码
                 response.encoding = self.encoding  # 使用utf-8
-                regex = re.compile(self.regex_pattern, re.S)  # 创建一个re对象
-                matches = regex.finditer(response.text)  # 对获取的东西进行解析
-                for match in matches:
-                    for group_name in self.capture_groups:  # 依次输出参数capture_groups中的指定内容
-                        extracted_data.append(f"{match.group(group_name)}")
-                proxy_list = [f"{extracted_data[i].strip()}:{extracted_data[i + 1].strip()}" for i in
-                            range(0, len(extracted_data), 2)]  # 整合列表为[proxy:port]
+                proxy_list = extract_proxies(response.text, self.regex, self.capture_groups)  # [proxy:port]
                 response.close()
                 return proxy_list
             else:
+                response.close()
                 get_error = f"\n爬取失败，❌ 状态码{response.status_code}"   # 前面的\n防止与进度条混在一行
                 print(get_error)
                 return get_error
@@ -139,7 +518,350 @@ class ProxyScraper:
             print(get_error)
             return get_error
 
-def check_proxy(proxy, test_url="http://httpbin.org/ip", timeout=TIMEOUT, 
+class FetchCache:
+    """
+    爬取结果的磁盘缓存: 每个URL保存上次响应的ETag/Last-Modified、内容哈希和内容
+
+    再次爬取时发送条件请求(If-None-Match/If-Modified-Since),内容未变化时服务器只返回304;
+    diff 为True时只返回相比上次内容新增的代理,未变化的列表不再进入去重和验证
+
+    新内容先保存在内存中: 调用方取走页面后 release, 新代理写入代理池或中断文件后 commit 才写入磁盘,
+    否则进程在此之前退出时下次只会得到304或空的新增列表,这些代理就再也不会被验证
+
+    :param directory: 缓存目录
+    :param diff: 是否只返回新增的代理
+    """
+    def __init__(self, directory=FETCH_CACHE_DIR, diff=FETCH_CACHE_DIFF):
+        self.directory = directory
+        self.diff = diff
+        self.pending = {}  # url -> (缓存信息, 内容, 内容是否变化), 尚未被调用方取走
+        self.released = {}  # 同上, 已取走等待commit
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.blake2b(url.encode(), digest_size=10).hexdigest()
+        return os.path.join(self.directory, key + ".json"), os.path.join(self.directory, key + ".body")
+
+    def load(self, url):
+        """
+        :return: 缓存信息字典, 上次内容(包括尚未写入磁盘的); 没有缓存时返回 None, None
+        """
+        with self.lock:
+            entry = self.pending.get(url) or self.released.get(url)
+        if entry is not None:
+            return entry[0], entry[1]
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as file:
+                meta = json.load(file)
+            with open(body_path, encoding="utf-8", newline="") as file:
+                return meta, file.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def conditional_headers(self, url):
+        """条件请求头,没有缓存时为空"""
+        meta, _ = self.load(url)
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def _save(self, url, meta, text=None):
+        meta_path, body_path = self._paths(url)
+        if text is not None:
+            with open(body_path + ".tmp", "w", encoding="utf-8", newline="") as file:
+                file.write(text)
+            os.replace(body_path + ".tmp", body_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def release(self, url):
+        """调用方已取走该URL的结果(已记入去重/验证队列),commit时写入磁盘"""
+        with self.lock:
+            if url in self.pending:
+                self.released[url] = self.pending.pop(url)
+
+    def commit(self):
+        """把已取走的结果写入磁盘,在新代理写入代理池或中断文件之后调用"""
+        with self.lock:
+            entries, self.released = self.released, {}
+        for url, (meta, text, changed) in entries.items():
+            self._save(url, meta, text if changed else None)
+
+    def extract(self, url, response, regex, capture_groups=("ip", "port")):
+        """
+        按缓存处理状态码为200或304的响应并提取代理
+
+        :return: [ip:port],diff模式下只有新增的代理(内容未变化时为空列表)
+        """
+        meta, previous = self.load(url)
+        if response.status_code == 304:
+            if meta is None:
+                return []
+            text = previous
+        else:
+            response.encoding = "utf-8"
+            text = response.text
+            content_hash = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+            unchanged = meta is not None and meta["hash"] == content_hash  # 服务器不支持条件请求时按内容哈希判断
+            meta = {"url": url, "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"), "hash": content_hash}
+            if unchanged:
+                text = previous
+            with self.lock:
+                earlier = self.pending.get(url) or self.released.get(url)  # 上次内容还没写入磁盘时磁盘上的仍是旧内容
+                self.pending[url] = (meta, text, not unchanged or (earlier is not None and earlier[2]))
+        proxy_list = extract_proxies(text, regex, capture_groups)
+        if not self.diff or previous is None:
+            return proxy_list
+        if text is previous:
+            return []
+        known = set(extract_proxies(previous, regex, capture_groups))
+        return [proxy for proxy in proxy_list if proxy not in known]
+
+PROBE_GREETING = b"\x05\x01\x00"  # SOCKS5问候: 版本5, 1种认证方式, 无认证
+
+def classify_probe_reply(reply):
+    """
+    根据代理对SOCKS5问候的回复推断可能的协议
+
+    :param reply: 回复的字节, 对方一直不回复(超时)时为None
+    :return: 需要进一步验证的协议列表
+    """
+    if reply is None:
+        # 不理会非法请求: 可能是仍在等待完整请求头的http代理, 或socks4
+        return ["http", "socks4"]
+    if reply.startswith(b"\x05"):
+        return ["socks5"]
+    if reply.startswith(b"HTTP/"):
+        return ["http"]
+    if reply.startswith(b"\x00"):
+        return ["socks4"]  # socks4 的回复以0x00开头(拒绝了版本5)
+    # 直接断开或回复无法识别的内容,排除socks5
+    return ["http", "socks4"]
+
+def probe_proxy_protocols(proxy, timeout=CONNECT_TIMEOUT):
+    """
+    预探测: TCP连接后发送SOCKS5问候字节,在发出完整HTTP请求之前排除不可能的协议
+
+    :return: 可能的协议列表, 端口无法连接时返回空列表
+    """
+    host, port = proxy.rsplit(':', 1)
+    try:
+        sock = socket.create_connection((host, int(port)), timeout=timeout)
+    except (OSError, ValueError):
+        return []
+    with sock:
+        try:
+            sock.sendall(PROBE_GREETING)
+            reply = sock.recv(16)
+        except socket.timeout:
+            reply = None
+        except OSError:
+            reply = b""
+    return classify_probe_reply(reply)
+
+# ============匿名级别 - Anonymity classification
+# 验证请求本身的响应(httpbin /get 格式: {"origin": "来源IP[, ...]", "headers": {...}})即可判断匿名级别, 不需要额外请求:
+# 透明(transparent): 目标能看到本机IP; 普匿(anonymous): 看不到本机IP, 但能看出使用了代理; 高匿(elite): 都看不出
+
+ANONYMITY_LEVELS = ("transparent", "anonymous", "elite")  # 匿名级别, 从低到高
+ANONYMITY_NAMES = {"transparent": "透明", "anonymous": "普匿", "elite": "高匿"}
+# 代理转发请求时会添加的请求头(小写), 目标收到其中任何一个就能看出使用了代理
+PROXY_HEADERS = ("via", "x-forwarded-for", "forwarded", "forwarded-for", "x-forwarded", "x-real-ip", "client-ip",
+                 "x-client-ip", "x-originating-ip", "x-proxy-id", "proxy-connection", "proxy-agent")
+_IP_PATTERN = re.compile(r'(?<![\d.])\d{1,3}(?:\.\d{1,3}){3}(?![\d.])')
+_public_ip = None  # 本机直连测试地址时对方看到的IP, 未查到为None
+_public_ip_failed_at = float("-inf")  # 上次查询失败的时间(time.monotonic)
+_public_ip_lock = threading.Lock()  # 同一时间只有一个线程查询
+
+def _query_public_ip(test_url):
+    """查询本机IP(调用方持有_public_ip_lock), 失败时只记录时间, PUBLIC_IP_RETRY秒后可再次查询"""
+    global _public_ip, _public_ip_failed_at
+    if _public_ip is not None or time.monotonic() - _public_ip_failed_at < PUBLIC_IP_RETRY:
+        return
+    try:
+        origin = requests.get(test_url or TEST_URL, timeout=TIMEOUT).json().get("origin", "")
+        addresses = _IP_PATTERN.findall(str(origin))
+        if not addresses:
+            raise ValueError(f"测试地址没有返回来源IP: {origin!r}")
+        _public_ip = addresses[0]
+    except Exception:
+        _public_ip_failed_at = time.monotonic()
+
+def get_public_ip(test_url=None, wait=True):
+    """
+    本机直连测试地址时对方看到的IP, 用于识别透明代理(查到后进程内不再查询, 查询失败时稍后重试)
+
+    :param wait: 为False时不阻塞(事件循环中使用): 需要查询时在后台线程中查询, 本次返回None
+    :return: IP, 未知时返回None
+    """
+    if _public_ip is None and time.monotonic() - _public_ip_failed_at >= PUBLIC_IP_RETRY:
+        if wait:
+            with _public_ip_lock:
+                _query_public_ip(test_url)
+        elif _public_ip_lock.acquire(blocking=False):
+            def query():
+                try:
+                    _query_public_ip(test_url)
+                finally:
+                    _public_ip_lock.release()
+            threading.Thread(target=query, daemon=True).start()
+    return _public_ip
+
+def classify_anonymity(data, proxy, public_ip=None):
+    """
+    根据测试地址回显的来源IP和请求头判断代理的匿名级别
+
+    :param data: 测试地址返回的JSON对象(不是对象时抛出AttributeError, 调用方按验证失败处理)
+    :param public_ip: 本机IP
+    :return: "transparent" / "anonymous" / "elite"; 本机IP未知(或与代理IP相同)时无法判断是否泄露本机IP,
+             以及测试地址不回显请求头且不是透明代理时返回None
+    """
+    if public_ip is None or public_ip == proxy.rsplit(':', 1)[0]:
+        return None
+    origin = data.get("origin", "")
+    headers = data.get("headers")
+    headers = {str(name).lower(): str(value) for name, value in headers.items()} if isinstance(headers, dict) else None
+    addresses = set(_IP_PATTERN.findall(str(origin)))
+    # Host是测试地址本身, 不算转发的客户端IP
+    forwarded = (value for name, value in (headers or {}).items() if name != "host")
+    if public_ip in addresses or any(public_ip in _IP_PATTERN.findall(value) for value in forwarded):
+        return "transparent"
+    if headers is None:
+        return None
+    if len(addresses) > 1 or any(name in headers for name in PROXY_HEADERS):
+        return "anonymous"
+    return "elite"
+
+def _check_protocol(proxy, protocol, test_url, timeout, retries):
+    """
+    用指定协议验证代理
+
+    :return: 成功返回 (响应时间, 匿名级别), 失败返回None
+    """
+    proxies_config = {
+        "http": f"{protocol}://{proxy}",
+        "https": f"{protocol}://{proxy}"
+    }
+
+    for attempt in range(retries):
+        try:
+            start_time = time.time()
+            response = requests.get(
+                test_url,
+                proxies=proxies_config,
+                timeout=timeout,
+                allow_redirects=False
+            )
+            end_time = time.time()
+            response_time = end_time - start_time
+
+            if response_time > timeout:
+                return None
+
+            if response.status_code == 200:
+                return response_time, classify_anonymity(response.json(), proxy, get_public_ip(test_url, wait=False))
+
+        except Exception as e:
+            if attempt < retries - 1 and not interrupted:
+                time.sleep(0.5)
+                continue
+            return None
+
+    return None
+
+class DaemonThreadPool:
+    """
+    线程池引擎使用的线程池(submit/shutdown与ThreadPoolExecutor相同), 工作线程是守护线程
+
+    requests的同步请求无法打断, ThreadPoolExecutor在进程退出时仍要等在途请求超时结束;
+    中断后放弃的在途检查不再拖住进程退出, SHUTDOWN_DEADLINE与TIMEOUT无关
+
+    :param max_workers: 最大线程数(按需创建)
+    """
+    def __init__(self, max_workers):
+        import queue
+
+        self.max_workers = max_workers
+        self.tasks = queue.SimpleQueue()
+        self.threads = []
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        self.tasks.put((future, fn, args))
+        if len(self.threads) < self.max_workers:
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return future
+
+    def _work(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """取消未开始的任务(cancel_futures), 通知各线程结束; wait为False时不等待在途任务"""
+        if cancel_futures:
+            while not self.tasks.empty():
+                task = self.tasks.get()
+                if task is not None:
+                    task[0].cancel()
+        for _ in self.threads:
+            self.tasks.put(None)
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+def _race_protocols(proxy, protocols, test_url, timeout, retries):
+    """
+    同时用多个协议验证代理,采用第一个成功的结果
+
+    :return: 协议, (响应时间, 匿名级别); 全部失败时返回 None, None
+    """
+    if len(protocols) == 1:
+        outcome = _check_protocol(proxy, protocols[0], test_url, timeout, retries)
+        return (protocols[0], outcome) if outcome is not None else (None, None)
+
+    executor = DaemonThreadPool(len(protocols))
+    future_to_protocol = {
+        executor.submit(_check_protocol, proxy, protocol, test_url, timeout, retries): protocol
+        for protocol in protocols
+    }
+    try:
+        for future in concurrent.futures.as_completed(future_to_protocol):
+            outcome = future.result()
+            if outcome is not None:
+                return future_to_protocol[future], outcome
+    finally:
+        # 不等待落后的协议,直接返回
+        executor.shutdown(wait=False, cancel_futures=True)
+    return None, None
+
+def check_proxy(proxy, test_url=TEST_URL, timeout=TIMEOUT, 
                 retries=1, proxy_type="auto"):
     """
     检查单个代理IP的可用性（支持HTTP和SOCKS）
@@ -151,253 +873,1986 @@ def check_proxy(proxy, test_url="http://httpbin.org/ip", timeout=TIMEOUT,
     :param retries: 重试次数
     :return: 代理地址, 是否可用, 响应时间, 代理类型
     """
-    # 根据代理类型设置proxies字典
+    return check_proxy_detailed(proxy, test_url, timeout, retries, proxy_type)[:4]
+
+def check_proxy_detailed(proxy, test_url=TEST_URL, timeout=TIMEOUT, retries=1, proxy_type="auto"):
+    """
+    check_proxy, 另外返回匿名级别(验证引擎使用)
+
+    :return: 代理地址, 是否可用, 响应时间, 代理类型, 匿名级别(无法判断时为None, 见 classify_anonymity)
+    """
+    if proxy_type == "auto" and AUTO_DETECT_MODE == "parallel":
+        # 自动检测：先预探测排除不可能的协议，再并行尝试剩余协议，最坏耗时约为一次超时
+        protocols = probe_proxy_protocols(proxy)
+        if protocols:
+            detected_type, outcome = _race_protocols(proxy, protocols, test_url, timeout, retries)
+            if detected_type:
+                return proxy, True, outcome[0], detected_type, outcome[1]
+        return proxy, False, None, "unknown", None
+
+    # 根据代理类型设置要尝试的协议
     if proxy_type == "auto":
         # 自动检测：先尝试HTTP，再尝试SOCKS5，最后SOCKS4
         protocols_to_try = ["http", "socks5", "socks4"]
     else:
         # 指定类型时，只尝试该类型
         protocols_to_try = [proxy_type]
-    
+
+    for current_protocol in protocols_to_try:
+        if current_protocol not in ("http", "socks4", "socks5"):
+            continue
+        outcome = _check_protocol(proxy, current_protocol, test_url, timeout, retries)
+        if outcome is not None:
+            return proxy, True, outcome[0], current_protocol, outcome[1]
+        # 当前协议失败，如果是自动检测则尝试下一个协议
+
+    # 如果是指定类型验证失败，返回指定类型（即使失败）
     detected_type = proxy_type if proxy_type != "auto" else "unknown"
+    return proxy, False, None, detected_type, None
+
+def _check_target(proxy, protocol, target, timeout):
+    """
+    通过代理访问一个验证目标: 2xx响应且包含 target["expect"](设置时)才算通过
+
+    :return: 通过返回响应时间, 否则返回None
+    """
+    proxies_config = {
+        "http": f"{protocol}://{proxy}",
+        "https": f"{protocol}://{proxy}"
+    }
+    try:
+        start_time = time.time()
+        response = requests.get(target["url"], proxies=proxies_config, timeout=timeout, allow_redirects=False)
+        response_time = time.time() - start_time
+        if 200 <= response.status_code < 300 and response_time <= timeout and target.get("expect", "") in response.text:
+            return response_time
+    except Exception:
+        pass
+    return None
+
+def check_targets(proxy, protocol, targets=VALIDATION_TARGETS, timeout=TIMEOUT):
+    """
+    用已确定的协议同时检查多个验证目标
+
+    :param targets: {名称: {"url": ..., "expect": ...}}, 见 VALIDATION_TARGETS
+    :return: {名称: 响应时间, 未通过为None}
+    """
+    if not targets:
+        return {}
+    with DaemonThreadPool(len(targets)) as executor:
+        futures = {name: executor.submit(_check_target, proxy, protocol, target, timeout)
+                   for name, target in targets.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+def _check_proxy_and_targets(proxy, test_url, timeout, retries, proxy_type, targets):
+    """check_proxy_detailed, 有效时再同时检查各验证目标 -> (check_proxy_detailed返回值, {名称: 响应时间或None})"""
+    result = check_proxy_detailed(proxy, test_url, timeout, retries, proxy_type)
+    if targets and is_check_success(result, timeout):
+        return result, check_targets(proxy, result[3], targets, timeout)
+    return result, {}
+
+def score_check_result(proxy, result, proxies, proxy_types, timeout=TIMEOUT, check_type="existing", verbose=True,
+                       latencies=None, history=None, journal=None, anonymity=None, target_latencies=None):
+    """
+    根据单个代理的验证结果计算新分数和类型(线程池引擎与异步引擎共用同一套评分规则)
+
+    :param result: check_proxy/async_check_proxy(或带匿名级别的 *_detailed 版本)的返回值, 验证过程抛出异常时传入异常对象
+    :param proxies: 代理分数字典
+    :param proxy_types: 代理类型字典
+    :param verbose: 是否打印每个代理的结果
+    :param latencies: 传入字典时记录有效代理的响应时间 {proxy: 秒},用于代理池的延迟统计
+    :param history: 传入CheckHistory时记录本次检查,并用历史修正已有代理的分数(见 CheckHistory.adjust_score)
+    :param journal: 传入ValidationJournal时把最终分数追加到验证日志(中断恢复)
+    :param anonymity: 传入字典时记录有效代理的匿名级别 {proxy: 级别}(无法判断的不记录)
+    :param target_latencies: 本次各验证目标的响应时间 {目标: 秒或None},随结果写入验证日志
+    :return: 新分数, 代理类型
+    """
+    score, proxy_type = _base_score(proxy, result, proxies, proxy_types, timeout, check_type, verbose, latencies,
+                                    anonymity)
+    success = is_check_success(result, timeout)
+    if history is not None:
+        history.record(proxy, success, result[2] if success else None)
+        if check_type == "existing" and proxy in proxies:
+            adjusted = history.adjust_score(proxy, score)
+            if verbose and adjusted <= 0 < score:
+                print(f"🗑️ 历史表现差,淘汰: {proxy}")
+            score = adjusted
+        if score <= 0:
+            history.remove(proxy)
+    if journal is not None:
+        level = result[4] if success and len(result) > 4 else None
+        journal.append(proxy, proxy_type, score, result[2] if success else None, level, target_latencies)
+    return score, proxy_type
+
+def _base_score(proxy, result, proxies, proxy_types, timeout, check_type, verbose, latencies, anonymity):
+    """基本评分规则: 有效+1(新代理98分), 超时不变(新代理80分), 无效-1(新代理0分)"""
+    if isinstance(result, BaseException):
+        if verbose and not interrupted:  # 只有不是中断引起的异常才打印
+            print(f"❌ 错误代理: {proxy} - {str(result)}")
+        if check_type == "existing" and proxy in proxies:
+            return max(0, proxies[proxy] - 1), proxy_types.get(proxy, "http")
+        return 0, proxy_types.get(proxy, "http")
+
+    proxy_addr, is_valid, response_time, detected_type = result[:4]
+    level = result[4] if len(result) > 4 else None
+
+    if is_valid and response_time is not None and response_time <= timeout:
+        if verbose:
+            level_text = f" | {ANONYMITY_NAMES[level]}" if level else ""
+            print(f"✅ 有效代理({detected_type}): {proxy} | 响应时间: {response_time:.2f}s{level_text}")
+        if latencies is not None:
+            latencies[proxy] = response_time
+        if anonymity is not None and level is not None:
+            anonymity[proxy] = level
+        if check_type == "new":
+            return 98, detected_type
+        current_score = proxies.get(proxy, 0)
+        return min(current_score + 1, MAX_SCORE), detected_type
+
+    elif response_time is not None:
+        if verbose:
+            print(f"❎ 超时代理: {proxy} | 响应时间: {response_time:.2f}s")
+        # 即使超时，也保留指定的类型
+        if check_type == "existing" and proxy in proxies:
+            return proxies[proxy], proxy_types.get(proxy, detected_type)
+        return 80, proxy_types.get(proxy, detected_type)
+
+    if verbose:
+        print(f"❌ 无效代理: {proxy}")
+    if check_type == "existing" and proxy in proxies:
+        return max(0, proxies[proxy] - 1), proxy_types.get(proxy, "http")
+    return 0, proxy_types.get(proxy, "http")
+
+def check_proxies_batch(proxies, proxy_types, test_url=TEST_URL, 
+                       timeout=TIMEOUT, max_workers=MAX_WORKERS, check_type="existing", latencies=None,
+                       history=None, journal=None, targets=None, target_results=None, anonymity=None):
+    """
+    批量检查代理IP列表(线程池引擎),结果收集为字典;输入很大时用 iter_check_results 边验证边处理
     
+    :param proxy_types: 代理类型字典
+    :param latencies: 传入字典时记录有效代理的响应时间
+    :param history: 传入CheckHistory时记录检查历史并用历史修正分数
+    :param journal: 传入ValidationJournal时每个结果计分后追加到验证日志
+    :param targets: 有效代理还要检查的验证目标, 见 VALIDATION_TARGETS
+    :param target_results: 传入字典时记录有效代理各目标的响应时间 {proxy: {目标: 秒或None}}
+    :param anonymity: 传入字典时记录有效代理的匿名级别
+    :return: 更新后的分数字典, 更新后的类型字典
+    """
+    return _collect_results(iter_check_results(
+        proxies, proxy_types, test_url, timeout, check_type, "thread", max_workers, latencies, history, journal,
+        targets, target_results, anonymity
+    ))
+
+# ============异步验证引擎 - Asyncio validation engine
+# 使用 asyncio 原生流实现 HTTP/SOCKS4/SOCKS5 握手,不依赖第三方库,单进程即可同时维持数千个连接.
+# 返回值与 check_proxy 完全相同 (proxy, is_valid, response_time, detected_type),评分逻辑复用 score_check_result
+# 匿名级别使用已查询到的本机IP(get_public_ip, 由同步入口在开始验证前查询), 不在事件循环中发起阻塞请求(查询失败时在后台线程重试)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0'
+_ipv4_cache = {}  # socks4 需要本地解析目标域名,缓存解析结果避免每个代理都查询一次DNS
+
+def _split_url(url):
+    """拆分URL -> (scheme, host, port, path)"""
+    parsed = urllib.parse.urlsplit(url)
+    scheme = parsed.scheme.lower()
+    port = parsed.port or (443 if scheme == "https" else 80)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += f"?{parsed.query}"
+    return scheme, parsed.hostname, port, path
+
+async def _resolve_ipv4(host):
+    """解析目标域名的IPv4地址(带缓存)"""
+    if host not in _ipv4_cache:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, None, family=socket.AF_INET)
+        _ipv4_cache[host] = infos[0][4][0]
+    return _ipv4_cache[host]
+
+async def _open_proxy_tunnel(proxy, protocol, host, port, tls=False):
+    """
+    连接代理并建立到目标的隧道
+
+    :param protocol: "http", "socks4", "socks5"
+    :param tls: 目标是否为https(http代理此时使用CONNECT隧道)
+    :return: reader, writer
+    """
+    proxy_host, proxy_port = proxy.rsplit(':', 1)
+    reader, writer = await asyncio.open_connection(proxy_host, int(proxy_port))
+    try:
+        if protocol == "socks5":
+            writer.write(b"\x05\x01\x00")  # 版本5, 1种认证方式, 无认证
+            await writer.drain()
+            if await reader.readexactly(2) != b"\x05\x00":
+                raise ConnectionError("SOCKS5 握手失败")
+            host_bytes = host.encode("idna")
+            writer.write(b"\x05\x01\x00\x03" + bytes([len(host_bytes)]) + host_bytes + port.to_bytes(2, "big"))
+            await writer.drain()
+            reply = await reader.readexactly(4)
+            if reply[1] != 0x00:
+                raise ConnectionError(f"SOCKS5 连接失败, 错误码 {reply[1]}")
+            # 读掉绑定地址: IPv4/IPv6/域名 + 端口
+            if reply[3] == 0x01:
+                await reader.readexactly(4 + 2)
+            elif reply[3] == 0x04:
+                await reader.readexactly(16 + 2)
+            else:
+                await reader.readexactly((await reader.readexactly(1))[0] + 2)
+
+        elif protocol == "socks4":
+            ip = await _resolve_ipv4(host)
+            writer.write(b"\x04\x01" + port.to_bytes(2, "big") + socket.inet_aton(ip) + b"\x00")
+            await writer.drain()
+            reply = await reader.readexactly(8)
+            if reply[1] != 0x5A:
+                raise ConnectionError(f"SOCKS4 连接失败, 错误码 {reply[1]}")
+
+        elif tls:
+            # http代理访问https目标需要先CONNECT
+            writer.write(f"CONNECT {host}:{port} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode())
+            await writer.drain()
+            status_line = (await reader.readuntil(b"\r\n\r\n")).split(b"\r\n", 1)[0]
+            if len(status_line.split()) < 2 or status_line.split()[1] != b"200":
+                raise ConnectionError(f"CONNECT 失败: {status_line[:50]!r}")
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+async def _read_http_response(reader):
+    """读取HTTP响应 -> (状态码, 响应头字典, 响应体)"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status_code = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        body = b""
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0].strip(), 16)
+            if size == 0:
+                break
+            body += await reader.readexactly(size)
+            await reader.readexactly(2)  # 块后的\r\n
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+    return status_code, headers, body
+
+async def async_http_get(proxy, protocol, url):
+    """
+    通过代理发送一次GET请求(不含超时控制,由调用方用 asyncio.wait_for 包裹)
+
+    :return: 状态码, 响应头字典, 响应体
+    """
+    scheme, host, port, path = _split_url(url)
+    tls = scheme == "https"
+    host_header = host if port in (80, 443) else f"{host}:{port}"
+
+    if protocol == "http" and not tls:
+        # 普通http代理: 直接向代理发送带完整URL的请求
+        proxy_host, proxy_port = proxy.rsplit(':', 1)
+        reader, writer = await asyncio.open_connection(proxy_host, int(proxy_port))
+        target = url
+    else:
+        reader, writer = await _open_proxy_tunnel(proxy, protocol, host, port, tls)
+        target = path
+    try:
+        if tls:
+            # StreamWriter.start_tls 需要 Python 3.11+
+            await writer.start_tls(ssl.create_default_context(), server_hostname=host)
+        writer.write((f"GET {target} HTTP/1.1\r\nHost: {host_header}\r\nUser-Agent: {USER_AGENT}\r\n"
+                      f"Accept: */*\r\nConnection: close\r\n\r\n").encode())
+        await writer.drain()
+        return await _read_http_response(reader)
+    finally:
+        writer.close()
+
+async def async_probe_proxy_protocols(proxy, timeout=CONNECT_TIMEOUT):
+    """probe_proxy_protocols 的异步版本"""
+    host, port = proxy.rsplit(':', 1)
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout)
+    except (OSError, ValueError, asyncio.TimeoutError):
+        return []
+    try:
+        writer.write(PROBE_GREETING)
+        await writer.drain()
+        reply = await asyncio.wait_for(reader.read(16), timeout)
+    except asyncio.TimeoutError:
+        reply = None
+    except OSError:
+        reply = b""
+    finally:
+        writer.close()
+    return classify_probe_reply(reply)
+
+async def _async_check_protocol(proxy, protocol, test_url, timeout, retries):
+    """
+    用指定协议验证代理(异步)
+
+    :return: 成功返回 (响应时间, 匿名级别), 失败返回None
+    """
+    for attempt in range(retries):
+        try:
+            start_time = time.time()
+            status_code, _, body = await asyncio.wait_for(
+                async_http_get(proxy, protocol, test_url), timeout
+            )
+            response_time = time.time() - start_time
+
+            if response_time > timeout:
+                return None
+
+            if status_code == 200:
+                # 与线程池引擎一致: 代理自己返回的页面(不是JSON对象)不算成功
+                return response_time, classify_anonymity(json.loads(body), proxy, get_public_ip(test_url, wait=False))
+
+        except Exception:
+            if attempt < retries - 1 and not interrupted:
+                await asyncio.sleep(0.5)
+                continue
+            return None
+
+    return None
+
+async def _async_race_protocols(proxy, protocols, test_url, timeout, retries):
+    """
+    同时用多个协议验证代理,第一个成功后取消其余协议的检查
+
+    :return: 协议, (响应时间, 匿名级别); 全部失败时返回 None, None
+    """
+    task_to_protocol = {
+        asyncio.ensure_future(_async_check_protocol(proxy, protocol, test_url, timeout, retries)): protocol
+        for protocol in protocols
+    }
+    pending = set(task_to_protocol)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.result() is not None:
+                    return task_to_protocol[task], task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+    return None, None
+
+async def async_check_proxy(proxy, test_url=TEST_URL, timeout=TIMEOUT,
+                            retries=1, proxy_type="auto"):
+    """
+    check_proxy 的异步版本,参数与返回值相同
+
+    :return: 代理地址, 是否可用, 响应时间, 代理类型
+    """
+    return (await async_check_proxy_detailed(proxy, test_url, timeout, retries, proxy_type))[:4]
+
+async def async_check_proxy_detailed(proxy, test_url=TEST_URL, timeout=TIMEOUT, retries=1, proxy_type="auto"):
+    """
+    check_proxy_detailed 的异步版本
+
+    :return: 代理地址, 是否可用, 响应时间, 代理类型, 匿名级别
+    """
+    if proxy_type == "auto" and AUTO_DETECT_MODE == "parallel":
+        protocols = await async_probe_proxy_protocols(proxy)
+        if protocols:
+            detected_type, outcome = await _async_race_protocols(
+                proxy, protocols, test_url, timeout, retries
+            )
+            if detected_type:
+                return proxy, True, outcome[0], detected_type, outcome[1]
+        return proxy, False, None, "unknown", None
+
+    if proxy_type == "auto":
+        protocols_to_try = ["http", "socks5", "socks4"]
+    else:
+        protocols_to_try = [proxy_type]
+
     for current_protocol in protocols_to_try:
-        if current_protocol == "http":
-            proxies_config = {
-                "http": f"http://{proxy}",
-                "https": f"http://{proxy}"
-            }
-        elif current_protocol == "socks4":
-            proxies_config = {
-                "http": f"socks4://{proxy}",
-                "https": f"socks4://{proxy}"
-            }
-        elif current_protocol == "socks5":
-            proxies_config = {
-                "http": f"socks5://{proxy}",
-                "https": f"socks5://{proxy}"
-            }
+        if current_protocol not in ("http", "socks4", "socks5"):
+            continue
+        outcome = await _async_check_protocol(proxy, current_protocol, test_url, timeout, retries)
+        if outcome is not None:
+            return proxy, True, outcome[0], current_protocol, outcome[1]
+        # 当前协议失败，如果是自动检测则尝试下一个协议
+
+    detected_type = proxy_type if proxy_type != "auto" else "unknown"
+    return proxy, False, None, detected_type, None
+
+async def _async_check_target(proxy, protocol, target, timeout):
+    """_check_target 的异步版本"""
+    try:
+        start_time = time.time()
+        status_code, _, body = await asyncio.wait_for(async_http_get(proxy, protocol, target["url"]), timeout)
+        response_time = time.time() - start_time
+        if 200 <= status_code < 300 and target.get("expect", "").encode() in body:
+            return response_time
+    except Exception:
+        pass
+    return None
+
+async def async_check_targets(proxy, protocol, targets=VALIDATION_TARGETS, timeout=TIMEOUT):
+    """check_targets 的异步版本"""
+    latencies = await asyncio.gather(*(_async_check_target(proxy, protocol, target, timeout)
+                                       for target in targets.values()))
+    return dict(zip(targets, latencies))
+
+async def _async_check_proxy_and_targets(proxy, test_url, timeout, retries, proxy_type, targets):
+    """_check_proxy_and_targets 的异步版本"""
+    result = await async_check_proxy_detailed(proxy, test_url, timeout, retries, proxy_type)
+    if targets and is_check_success(result, timeout):
+        return result, await async_check_targets(proxy, result[3], targets, timeout)
+    return result, {}
+
+def _raise_nofile_limit(required):
+    """尽量提高进程可打开文件数上限,避免高并发时耗尽文件描述符(仅类Unix系统)"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = required + 256
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        new_soft = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+        except (ValueError, OSError):
+            pass
+
+async def _wait_or_cancel(tasks):
+    """等待全部任务完成;收到中断信号时立即取消所有在途任务(连接随之关闭),不必等待超时"""
+    while not all(task.done() for task in tasks):
+        if interrupted:
+            for task in tasks:
+                task.cancel()
+            break
+        await asyncio.wait(tasks, timeout=0.2)
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def check_proxies_batch_async(proxies, proxy_types, test_url=TEST_URL,
+                              timeout=TIMEOUT, concurrency=ASYNC_CONCURRENCY, check_type="existing", latencies=None,
+                              history=None, journal=None, targets=None, target_results=None, anonymity=None):
+    """
+    使用asyncio批量检查代理IP列表,参数和返回值与 check_proxies_batch 相同
+
+    :param concurrency: 同时在途的最大检查数
+    :return: 更新后的分数字典, 更新后的类型字典
+    """
+    return _collect_results(iter_check_results(
+        proxies, proxy_types, test_url, timeout, check_type, "async", concurrency, latencies, history, journal,
+        targets, target_results, anonymity
+    ))
+
+# ============流式批量验证 - Streaming batch validator
+# 两种引擎都只从输入迭代器中取出固定窗口数量的代理提交检查,完成一个补一个,结果按完成顺序产出;
+# 输入可以是列表、字典或逐行读取文件的生成器,内存占用与输入大小无关,中断后剩余代理不会再被提交
+
+def _iter_thread_results(proxy_iter, proxy_types, test_url, timeout, retries, max_workers, targets):
+    """线程池引擎: 在途检查不超过线程数的两倍,产出 (代理, check_proxy返回值或异常, 各目标响应时间)"""
+    import queue
+
+    executor = DaemonThreadPool(max_workers)
+    completed = queue.SimpleQueue()  # 完成的Future由回调放入,取结果不必每次扫描全部在途Future
+    pending = {}
+    try:
+        while True:
+            while not interrupted and len(pending) < max_workers * 2:
+                proxy = next(proxy_iter, None)
+                if proxy is None:
+                    break
+                future = executor.submit(_check_proxy_and_targets, proxy, test_url, timeout, retries,
+                                         proxy_types.get(proxy, "auto"), targets)
+                pending[future] = proxy
+                future.add_done_callback(completed.put)
+            if interrupted or not pending:
+                break
+            # 每0.2秒检查一次中断标志,不必等到某个在途检查超时
+            try:
+                future = completed.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            proxy = pending.pop(future)
+            try:
+                result, target_latencies = future.result()
+            except Exception as e:
+                result, target_latencies = e, {}
+            yield proxy, result, target_latencies
+    finally:
+        # 中断时不等待在途检查(线程中的同步请求无法打断,它们在超时内自行结束,结果丢弃;守护线程不影响进程退出),
+        # 未开始的检查直接取消
+        executor.shutdown(wait=not interrupted and not pending, cancel_futures=True)
+
+def _iter_async_results(proxy_iter, proxy_types, test_url, timeout, retries, concurrency, targets):
+    """
+    异步引擎: 在途检查不超过concurrency,产出 (代理, async_check_proxy返回值或异常, 各目标响应时间)
+
+    事件循环由本生成器驱动,调用方处理结果时在途检查暂停,不需要额外线程
+    """
+    _raise_nofile_limit(concurrency)
+    loop = asyncio.new_event_loop()
+    pending = {}
+    try:
+        while True:
+            while not interrupted and len(pending) < concurrency:
+                proxy = next(proxy_iter, None)
+                if proxy is None:
+                    break
+                task = loop.create_task(_async_check_proxy_and_targets(proxy, test_url, timeout, retries,
+                                                                       proxy_types.get(proxy, "auto"), targets))
+                pending[task] = proxy
+            if interrupted or not pending:
+                break
+            done, _ = loop.run_until_complete(asyncio.wait(pending, timeout=0.2,
+                                                           return_when=asyncio.FIRST_COMPLETED))
+            for task in done:
+                proxy = pending.pop(task)
+                if task.exception() is not None:
+                    yield proxy, task.exception(), {}
+                else:
+                    yield proxy, *task.result()
+    finally:
+        # 中断或调用方提前停止时取消所有在途检查(连接随之关闭),不必等待超时
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+
+def iter_check_results(proxies, proxy_types=None, test_url=TEST_URL, timeout=TIMEOUT,
+                       check_type="existing", engine=None, concurrency=None, latencies=None, history=None,
+                       journal=None, targets=None, target_results=None, anonymity=None):
+    """
+    流式批量验证: 边从输入取代理边验证,每完成一个就计分并产出
+
+    :param proxies: 任意可迭代的代理(列表、生成器等);传入 {proxy: 分数} 字典时已有代理按原分数加减分
+    :param proxy_types: 代理类型字典,不在字典中的代理自动检测类型
+    :param engine: "async" 或 "thread", 默认 VALIDATION_ENGINE
+    :param concurrency: 异步引擎的在途检查数/线程池引擎的线程数, 默认 ASYNC_CONCURRENCY/MAX_WORKERS
+    :param latencies: 传入字典时记录有效代理的响应时间
+    :param history: 传入CheckHistory时记录检查历史并用历史修正分数
+    :param journal: 传入ValidationJournal时每个结果计分后追加到验证日志
+    :param targets: 有效代理还要同时检查的验证目标, 见 VALIDATION_TARGETS
+    :param target_results: 传入字典时记录有效代理各目标的响应时间 {proxy: {目标: 秒或None}}
+    :param anonymity: 传入字典时记录有效代理的匿名级别
+    :return: 生成器,按完成顺序产出 (代理, 新分数, 代理类型)
+    """
+    scores = proxies if isinstance(proxies, dict) else {}
+    proxy_types = proxy_types or {}
+    engine = engine or VALIDATION_ENGINE
+    retries = 2 if check_type == "new" else 1  # 新代理验证两次，已有代理验证一次
+    get_public_ip(test_url)  # 判断透明代理需要本机IP, 在开始验证前查询一次
+    if engine == "async":
+        results = _iter_async_results(iter(proxies), proxy_types, test_url, timeout, retries,
+                                      max(1, concurrency or ASYNC_CONCURRENCY), targets)
+    else:
+        results = _iter_thread_results(iter(proxies), proxy_types, test_url, timeout, retries,
+                                       max(1, concurrency or MAX_WORKERS), targets)
+    with contextlib.closing(results):
+        for proxy, result, target_latencies in results:
+            score, proxy_type = score_check_result(proxy, result, scores, proxy_types, timeout, check_type,
+                                                   latencies=latencies, history=history, journal=journal,
+                                                   anonymity=anonymity, target_latencies=target_latencies)
+            if target_results is not None and target_latencies:
+                target_results[proxy] = target_latencies
+            yield proxy, score, proxy_type
+
+def _collect_results(results):
+    """把 iter_check_results 的结果收集为 分数字典, 类型字典"""
+    updated_proxies = {}
+    updated_types = {}
+    for proxy, score, proxy_type in results:
+        updated_proxies[proxy] = score
+        updated_types[proxy] = proxy_type
+    return updated_proxies, updated_types
+
+async def _tcp_connect_ok(proxy, timeout):
+    """能否在超时内与代理建立TCP连接"""
+    try:
+        host, port = proxy.rsplit(':', 1)
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout)
+    except (OSError, ValueError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+async def _tcp_prefilter(proxies, connect_timeout, concurrency):
+    reachable = set()
+    proxy_iter = iter(proxies)
+
+    async def worker():
+        for proxy in proxy_iter:
+            if interrupted:
+                break
+            if await _tcp_connect_ok(proxy, connect_timeout):
+                reachable.add(proxy)
+
+    await _wait_or_cancel([asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(proxies))))])
+    return reachable
+
+def tcp_prefilter(proxies, connect_timeout=CONNECT_TIMEOUT, concurrency=PREFILTER_CONCURRENCY):
+    """
+    TCP连接预筛: 大量并发非阻塞连接,只保留端口可以连接的代理
+
+    :param proxies: 代理列表(或以代理为键的字典)
+    :param connect_timeout: 连接超时(秒),比完整验证的TIMEOUT短得多
+    :return: 可连接的代理列表, 无法连接的代理列表(均保持原顺序)
+    """
+    proxies = list(proxies)
+    _raise_nofile_limit(concurrency)
+    reachable = asyncio.run(_tcp_prefilter(proxies, connect_timeout, concurrency))
+    return ([proxy for proxy in proxies if proxy in reachable],
+            [proxy for proxy in proxies if proxy not in reachable])
+
+def run_validation_batch(proxies, proxy_types, check_type="existing", latencies=None, history=None, journal=None,
+                         target_results=None, anonymity=None):
+    """
+    批量验证流水线: TCP预筛(TCP_PREFILTER) -> 按 VALIDATION_ENGINE 选择引擎进行协议验证(有效代理同时检查 VALIDATION_TARGETS)
+
+    预筛丢弃的代理按无效代理计分,返回值与 check_proxies_batch 相同
+
+    :param latencies: 传入字典时记录有效代理的响应时间
+    :param history: 传入CheckHistory时记录检查历史并用历史修正分数
+    :param journal: 传入ValidationJournal时每个结果计分后追加到验证日志
+    :param target_results: 传入字典时记录有效代理各验证目标的响应时间
+    :param anonymity: 传入字典时记录有效代理的匿名级别
+    """
+    updated_proxies = {}
+    updated_types = {}
+    to_validate = proxies
+
+    if TCP_PREFILTER:
+        start_time = time.time()
+        reachable, unreachable = tcp_prefilter(proxies)
+        prefilter_time = time.time() - start_time
+        if interrupted:
+            return updated_proxies, updated_types
+        for proxy in unreachable:
+            updated_proxies[proxy], updated_types[proxy] = score_check_result(
+                proxy, (proxy, False, None, proxy_types.get(proxy, "http")), proxies, proxy_types,
+                TIMEOUT, check_type, history=history, journal=journal
+            )
+        to_validate = {proxy: proxies[proxy] for proxy in reachable}
+        print(f"📊 阶段1 TCP预筛: 输入 {len(proxies)}, 可连接 {len(reachable)}, "
+              f"丢弃 {len(unreachable)} | 耗时 {prefilter_time:.2f}s")
+
+    start_time = time.time()
+    if not to_validate:
+        validated_proxies, validated_types = {}, {}
+    elif VALIDATION_ENGINE == "async":
+        validated_proxies, validated_types = check_proxies_batch_async(
+            to_validate, proxy_types, TEST_URL, TIMEOUT, ASYNC_CONCURRENCY, check_type, latencies, history, journal,
+            VALIDATION_TARGETS, target_results, anonymity
+        )
+    else:
+        validated_proxies, validated_types = check_proxies_batch(
+            to_validate, proxy_types, TEST_URL, TIMEOUT, MAX_WORKERS, check_type, latencies, history, journal,
+            VALIDATION_TARGETS, target_results, anonymity
+        )
+    validate_time = time.time() - start_time
+    updated_proxies.update(validated_proxies)
+    updated_types.update(validated_types)
+
+    if TCP_PREFILTER:
+        print(f"📊 阶段2 协议验证({VALIDATION_ENGINE}): 输入 {len(to_validate)}, "
+              f"完成 {len(validated_proxies)} | 耗时 {validate_time:.2f}s")
+        if to_validate and unreachable:
+            # 按实测的每个代理平均验证耗时估算被丢弃的代理本会占用的时间(预筛本身耗时更多时记为0)
+            saved_time = max(0.0, validate_time / len(to_validate) * len(unreachable) - prefilter_time)
+            print(f"📊 预筛估计节省验证时间: {saved_time:.2f}s")
+
+    return updated_proxies, updated_types
+
+def load_proxies_from_file(file_path):
+    """从CSV文件加载代理列表、类型和分数"""
+    proxies = {}
+    proxy_types = {}
+    
+    if not os.path.exists(file_path):
+        return proxies, proxy_types
+
+    with open(file_path, 'r', encoding="utf-8") as file:
+        reader = csv.reader(file)
+        for row in reader:
+            if len(row) >= 3:
+                # 新格式：类型,proxy:port,分数
+                proxy_type = row[0].strip().lower()
+                proxy = row[1].strip()
+                try:
+                    score = int(row[2])
+                    proxies[proxy] = score
+                    proxy_types[proxy] = proxy_type
+                except:
+                    # 如果解析失败，使用默认值
+                    proxies[proxy] = 70
+                    proxy_types[proxy] = "http"  # 默认HTTP
+            elif len(row) >= 2:
+                # 旧格式兼容：proxy:port,分数（默认HTTP类型）
+                proxy = row[0].strip()
+                try:
+                    score = int(row[1])
+                    proxies[proxy] = score
+                    proxy_types[proxy] = "http"  # 旧文件默认HTTP
+                except:
+                    proxies[proxy] = 70
+                    proxy_types[proxy] = "http"
+    
+    return proxies, proxy_types
+
+def save_valid_proxies(proxies, proxy_types, file_path):
+    """保存有效代理到CSV文件（带类型和分数）"""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    
+    with open(file_path, 'w', encoding="utf-8", newline='') as file:
+        writer = csv.writer(file)
+        for proxy, score in proxies.items():
+            if len(proxy) > 6 and score > 0:  # 基本验证
+                proxy_type = proxy_types.get(proxy, "http")  # 默认HTTP
+                writer.writerow([proxy_type, proxy, score])
+
+def update_proxy_scores(file_path):
+    """更新代理分数文件，移除0分代理"""
+    proxies, proxy_types = load_proxies_from_file(file_path)
+    valid_proxies = {k: v for k, v in proxies.items() if v > 0}
+    valid_types = {k: v for k, v in proxy_types.items() if k in valid_proxies}
+    save_valid_proxies(valid_proxies, valid_types, file_path)
+    return len(proxies) - len(valid_proxies)
+
+# ============检查历史 - Per-proxy check history
+# 分数只是+1/-1累加的结果,区分不了"连续失败10次"和"时好时坏"的代理.
+# 这里为每个代理保留最近 HISTORY_SIZE 次检查的成功标志和响应时间,用于加速扣分和淘汰
+
+def is_check_success(result, timeout=TIMEOUT):
+    """check_proxy/async_check_proxy 的返回值是否算作一次成功检查(超时和异常都算失败)"""
+    return (not isinstance(result, BaseException) and result[1]
+            and result[2] is not None and result[2] <= timeout)
+
+class CheckHistory:
+    """
+    全池检查历史(线程安全)
+
+    所有代理共用几个连续数组: 成功标志按位打包在 array('H') 中(最低位为最近一次),
+    响应时间以毫秒存于 array('H') 环形缓冲区(失败记0). 每个代理 2 + 1 + 1 + 2 * HISTORY_SIZE 字节,
+    HISTORY_SIZE=16 时10万代理约3.6MB(另有代理到槽位的字典)
+
+    :param size: 每个代理保留的检查次数
+    """
+    def __init__(self, size=HISTORY_SIZE):
+        if not 1 <= size <= 16:
+            raise ValueError("HISTORY_SIZE 必须在1到16之间")
+        self.size = size
+        self.mask = (1 << size) - 1
+        self.slots = {}  # proxy -> 槽位
+        self.free_slots = []
+        self.flags = array.array('H')  # 每个槽位的成功标志
+        self.counts = array.array('B')  # 每个槽位已记录的次数(最多size)
+        self.heads = array.array('B')  # 每个槽位环形缓冲区下一次写入的位置
+        self.latencies = array.array('H')  # 槽位slot占用 [slot * size, (slot + 1) * size)
+        self.dirty = set()  # 尚未写入存储的代理
+        self.lock = threading.Lock()
+
+    def _slot(self, proxy):
+        slot = self.slots.get(proxy)
+        if slot is None:
+            if self.free_slots:
+                slot = self.free_slots.pop()
+                self.flags[slot] = self.counts[slot] = self.heads[slot] = 0
+            else:
+                slot = len(self.flags)
+                self.flags.append(0)
+                self.counts.append(0)
+                self.heads.append(0)
+                self.latencies.extend([0] * self.size)
+            self.slots[proxy] = slot
+        return slot
+
+    def record(self, proxy, success, response_time=None):
+        """记录一次检查结果"""
+        with self.lock:
+            slot = self._slot(proxy)
+            self.flags[slot] = ((self.flags[slot] << 1) | bool(success)) & self.mask
+            milliseconds = min(int(response_time * 1000), 65535) if success and response_time is not None else 0
+            self.latencies[slot * self.size + self.heads[slot]] = milliseconds
+            self.heads[slot] = (self.heads[slot] + 1) % self.size
+            if self.counts[slot] < self.size:
+                self.counts[slot] += 1
+            self.dirty.add(proxy)
+
+    def remove(self, proxy):
+        self.remove_many((proxy,))
+
+    def remove_many(self, proxies):
+        """释放代理的槽位(代理从代理池移除时调用, 槽位留给之后的代理复用)"""
+        with self.lock:
+            for proxy in proxies:
+                slot = self.slots.pop(proxy, None)
+                if slot is not None:
+                    self.free_slots.append(slot)
+                self.dirty.discard(proxy)
+
+    def _fail_streak(self, slot):
+        flags, count = self.flags[slot], self.counts[slot]
+        if flags == 0:
+            return count
+        return (flags & -flags).bit_length() - 1  # 最低位的1之前有几个0
+
+    def summary(self, proxy):
+        """
+        :return: 检查次数, 通过次数, 连续失败次数; 没有历史时返回None
+        """
+        with self.lock:
+            slot = self.slots.get(proxy)
+            if slot is None:
+                return None
+            return self.counts[slot], bin(self.flags[slot]).count("1"), self._fail_streak(slot)
+
+    def outcomes(self, proxy):
+        """:return: [(是否成功, 响应时间毫秒)], 最近一次在前"""
+        with self.lock:
+            slot = self.slots.get(proxy)
+            if slot is None:
+                return []
+            flags, count, head = self.flags[slot], self.counts[slot], self.heads[slot]
+            base = slot * self.size
+            return [(bool(flags >> i & 1), self.latencies[base + (head - 1 - i) % self.size]) for i in range(count)]
+
+    def adjust_score(self, proxy, score):
+        """
+        用历史修正按基本规则(+1/-1)算出的已有代理分数:
+        连续失败时第k次失败扣k分; 连续失败 HISTORY_EVICT_STREAK 次,或历史记满且通过率低于 HISTORY_MIN_PASS_RATE 时淘汰(0分)
+
+        :return: 修正后的分数
+        """
+        summary = self.summary(proxy)
+        if summary is None:
+            return score
+        count, passed, fail_streak = summary
+        if fail_streak >= HISTORY_EVICT_STREAK:
+            return 0
+        if count >= self.size and passed < HISTORY_MIN_PASS_RATE * count:
+            return 0
+        if fail_streak > 1:
+            score -= fail_streak - 1  # 基本规则已扣1分
+        return max(score, 0)
+
+    def pop_dirty(self):
+        """:return: 有变化的代理 [(proxy, 成功标志, 检查次数, 响应时间bytes(按时间从旧到新))]"""
+        with self.lock:
+            rows = []
+            for proxy in self.dirty:
+                slot = self.slots.get(proxy)
+                if slot is None:
+                    continue
+                count, head, base = self.counts[slot], self.heads[slot], slot * self.size
+                ordered = array.array('H', (self.latencies[base + (head - count + i) % self.size] for i in range(count)))
+                rows.append((proxy, self.flags[slot], count, ordered.tobytes()))
+            self.dirty.clear()
+            return rows
+
+    def load_rows(self, rows):
+        """从存储加载 [(proxy, 成功标志, 检查次数, 响应时间bytes)]"""
+        with self.lock:
+            for proxy, flags, count, blob in rows:
+                latencies = array.array('H')
+                latencies.frombytes(blob or b"")
+                latencies = latencies[-self.size:]
+                count = min(count, self.size, len(latencies))
+                slot = self._slot(proxy)
+                self.flags[slot] = flags & self.mask
+                self.counts[slot] = count
+                self.heads[slot] = count % self.size
+                base = slot * self.size
+                self.latencies[base:base + count] = latencies[-count:] if count else array.array('H')
+
+    def memory_usage(self):
+        """:return: 数组占用字节数, 代理到槽位字典占用字节数(不含代理字符串本身)"""
+        with self.lock:
+            arrays = sum(len(values) * values.itemsize
+                         for values in (self.flags, self.counts, self.heads, self.latencies))
+            return arrays, sys.getsizeof(self.slots)
+
+# ============列式内存代理池 - Columnar in-memory pool
+# 两个以代理字符串为键的字典(分数,类型)每个代理要占用数百字节. ProxyPool 按列存储,
+# 每个代理一行: IP打包为32位整数,端口,类型枚举,分数,时间戳各占一个连续数组,代理字符串只在输出时生成
+
+PROXY_TYPES = ("http", "socks4", "socks5")  # 代理类型枚举, ProxyPool按下标存储
+
+def pack_proxy(proxy):
+    """:return: ip:port 对应的 (32位整数IP, 端口)"""
+    host, port = proxy.rsplit(':', 1)
+    return struct.unpack("!I", socket.inet_aton(host))[0], int(port)
+
+def unpack_proxy(ip, port):
+    """:return: ip:port"""
+    return f"{socket.inet_ntoa(struct.pack('!I', ip))}:{port}"
+
+class ProxyPool:
+    """
+    列式存储的内存代理池
+
+    列: IP(32位整数), 端口, 类型(PROXY_TYPES下标), 分数, 加入时间, 上次检查时间, 响应时间EWMA(没有记录为NaN).
+    按代理查找行号用开放寻址(线性探测)哈希表, 表本身也是一个 array('i'), 不为每个代理创建Python对象.
+    安装了numpy时筛选和排序直接在列的零拷贝视图上向量化进行, 否则逐行比较.
+    删除时用最后一行填补空位, 因此行号只在两次修改之间有效
+    """
+    def __init__(self):
+        self.ips = array.array('I')
+        self.ports = array.array('H')
+        self.types = array.array('B')
+        self.scores = array.array('B')
+        self.added_at = array.array('d')
+        self.last_checked = array.array('d')
+        self.latencies = array.array('f')
+        self.index_bits = 4
+        self.index = array.array('i', [-1]) * (1 << self.index_bits)  # 槽位 -> 行号, -1为空
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        批量构建(先追加各列, 最后一次性建哈希表)
+
+        :param rows: [(proxy, proxy_type, score, 加入时间, 上次检查时间, 响应时间EWMA或None)], 代理不能重复(如从存储加载)
+        """
+        pool = cls()
+        for proxy, proxy_type, score, added_at, last_checked, latency in rows:
+            ip, port = pack_proxy(proxy)
+            pool.ips.append(ip)
+            pool.ports.append(port)
+            pool.types.append(PROXY_TYPES.index(proxy_type) if proxy_type in PROXY_TYPES else 0)
+            pool.scores.append(min(max(score, 0), 255))
+            pool.added_at.append(added_at)
+            pool.last_checked.append(last_checked)
+            pool.latencies.append(math.nan if latency is None else latency)
+        pool._grow_index(max(4, (len(pool.ips) * 2).bit_length()))
+        return pool
+
+    def _columns(self):
+        return (self.ips, self.ports, self.types, self.scores, self.added_at, self.last_checked, self.latencies)
+
+    def __len__(self):
+        return len(self.ips)
+
+    def __contains__(self, proxy):
+        return self._row(proxy) is not None
+
+    def _home(self, ip, port):
+        """代理在哈希表中的初始槽位(乘法哈希取高位)"""
+        return ((ip << 16 | port) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF) >> (64 - self.index_bits)
+
+    def _slot(self, ip, port):
+        """:return: 代理所在的槽位, 不存在时为应插入的空槽位"""
+        mask = len(self.index) - 1
+        slot = self._home(ip, port)
+        while True:
+            row = self.index[slot]
+            if row < 0 or (self.ips[row] == ip and self.ports[row] == port):
+                return slot
+            slot = (slot + 1) & mask
+
+    def _row(self, proxy):
+        """:return: 代理所在的行号, 不存在时返回None"""
+        ip, port = pack_proxy(proxy)
+        row = self.index[self._slot(ip, port)]
+        return row if row >= 0 else None
+
+    def _grow_index(self, bits=None):
+        """负载超过一半时哈希表扩容一倍并重建"""
+        self.index_bits = self.index_bits + 1 if bits is None else bits
+        self.index = array.array('i', [-1]) * (1 << self.index_bits)
+        for row in range(len(self.ips)):
+            self.index[self._slot(self.ips[row], self.ports[row])] = row
+
+    def _delete_slot(self, slot):
+        """清空槽位, 并把后面同一探测链上的项前移(线性探测的回移删除, 不需要墓碑)"""
+        mask = len(self.index) - 1
+        self.index[slot] = -1
+        probe = (slot + 1) & mask
+        while self.index[probe] >= 0:
+            row = self.index[probe]
+            home = self._home(self.ips[row], self.ports[row])
+            if (probe - home) & mask >= (probe - slot) & mask:
+                self.index[slot] = row
+                self.index[probe] = -1
+                slot = probe
+            probe = (probe + 1) & mask
+
+    def add(self, proxy, proxy_type, score, added_at=0.0, last_checked=0.0, latency=None):
+        """新增代理,已存在时覆盖各列"""
+        ip, port = pack_proxy(proxy)
+        # 类型不在枚举中时按http处理(与代理池其他地方的默认类型一致)
+        values = (ip, port, PROXY_TYPES.index(proxy_type) if proxy_type in PROXY_TYPES else 0,
+                  min(max(score, 0), 255), added_at, last_checked, math.nan if latency is None else latency)
+        slot = self._slot(ip, port)
+        row = self.index[slot]
+        if row < 0:
+            if (len(self.ips) + 1) * 2 > len(self.index):
+                self._grow_index()
+                slot = self._slot(ip, port)
+            self.index[slot] = len(self.ips)
+            for column, value in zip(self._columns(), values):
+                column.append(value)
+        else:
+            for column, value in zip(self._columns(), values):
+                column[row] = value
+
+    def get(self, proxy):
+        """:return: (类型, 分数), 不存在时返回None"""
+        row = self._row(proxy)
+        if row is None:
+            return None
+        return PROXY_TYPES[self.types[row]], self.scores[row]
+
+    def set_score(self, proxy, score):
+        row = self._row(proxy)
+        if row is not None:
+            self.scores[row] = min(max(score, 0), 255)
+
+    def remove(self, proxy):
+        """删除代理(最后一行移到空位)"""
+        ip, port = pack_proxy(proxy)
+        slot = self._slot(ip, port)
+        row = self.index[slot]
+        if row < 0:
+            return
+        self._delete_slot(slot)
+        last = len(self.ips) - 1
+        if row != last:
+            self.index[self._slot(self.ips[last], self.ports[last])] = row
+            for column in self._columns():
+                column[row] = column[last]
+        for column in self._columns():
+            column.pop()
+
+    def proxy_at(self, row):
+        return unpack_proxy(self.ips[row], self.ports[row])
+
+    def columns(self):
+        """:return: 各列的numpy零拷贝视图(需要numpy; 持有视图期间数组无法扩缩, 不要在此期间增删代理)"""
+        return {name: numpy.frombuffer(column, dtype=column.typecode) if len(column) else
+                numpy.zeros(0, dtype=column.typecode)
+                for name, column in zip(("ips", "ports", "types", "scores", "added_at", "last_checked", "latencies"),
+                                        self._columns())}
+
+    def filter(self, proxy_type="all", min_score=1, max_latency=None):
+        """
+        按类型, 最低分数和最大响应时间筛选
+
+        :return: 行号(numpy数组或列表)
+        """
+        type_id = PROXY_TYPES.index(proxy_type) if proxy_type in PROXY_TYPES else None
+        if proxy_type != "all" and type_id is None:
+            return []
+        if numpy is not None:
+            columns = self.columns()
+            mask = columns["scores"] >= min_score
+            if type_id is not None:
+                mask &= columns["types"] == type_id
+            if max_latency is not None:
+                mask &= columns["latencies"] <= max_latency  # NaN比较结果为False, 没有记录的代理被排除
+            return numpy.flatnonzero(mask)
+        return [row for row, (score, type_value, latency) in enumerate(zip(self.scores, self.types, self.latencies))
+                if score >= min_score and (type_id is None or type_value == type_id)
+                and (max_latency is None or latency <= max_latency)]
+
+    def query(self, proxy_type="all", min_score=1, limit=None, max_latency=None):
+        """筛选后按分数降序返回 [(proxy, proxy_type, score)]"""
+        rows = self.filter(proxy_type, min_score, max_latency)
+        if numpy is not None:
+            rows = rows[numpy.argsort(-self.columns()["scores"][rows].astype(numpy.int16), kind="stable")]
+        else:
+            rows = sorted(rows, key=lambda row: -self.scores[row])
+        return [(self.proxy_at(row), PROXY_TYPES[self.types[row]], self.scores[row]) for row in rows[:limit]]
+
+    def memory_usage(self):
+        """:return: 各列占用字节数, 哈希表占用字节数"""
+        columns = sum(len(column) * column.itemsize for column in self._columns())
+        return columns, len(self.index) * self.index.itemsize
+
+# ============代理池存储后端 - Pool storage backends
+# 两个后端接口相同: load / get / upsert_many / update_scores / remove_dead / query / count / import_csv / export_csv
+#                   load_check_state / update_check_state (后台持续验证的检查时间和连续失败次数)
+#                   record_latencies / get_latency_stats (响应时间EWMA 和最近 LATENCY_WINDOW 次的 p50/p95)
+#                   load_history / save_history (检查历史, 见 CheckHistory)
+#                   load_pool (加载为列式的 ProxyPool)
+#                   record_target_results / get_target_results / target_stats (各验证目标最近一次的结果, 见 VALIDATION_TARGETS)
+#                   record_anonymity / get_anonymity / anonymity_counts (最近一次验证判断的匿名级别, 见 classify_anonymity)
+# rows 均为 (proxy, proxy_type, score) 三元组
+
+def update_latency_stats(ewma, window, seconds):
+    """
+    把一次响应时间加入代理的延迟统计
+
+    :param ewma: 原EWMA(秒), 没有记录时为None
+    :param window: 原滚动窗口(array('H')毫秒数的bytes), 没有记录时为None
+    :param seconds: 本次响应时间(秒)
+    :return: 新EWMA, p50, p95(秒), 新窗口bytes
+    """
+    samples = array.array('H')
+    if window:
+        samples.frombytes(window)
+    samples.append(min(int(seconds * 1000), 65535))
+    del samples[:-LATENCY_WINDOW]
+    ewma = seconds if ewma is None else ewma + LATENCY_EWMA_ALPHA * (seconds - ewma)
+    ordered = sorted(samples)
+    p50 = ordered[math.ceil(len(ordered) * 0.5) - 1] / 1000
+    p95 = ordered[math.ceil(len(ordered) * 0.95) - 1] / 1000
+    return ewma, p50, p95, samples.tobytes()
+
+def anonymity_at_least(min_anonymity):
+    """:return: 不低于min_anonymity的匿名级别列表, min_anonymity为None时返回None(不限)"""
+    if min_anonymity is None:
+        return None
+    return list(ANONYMITY_LEVELS[ANONYMITY_LEVELS.index(min_anonymity):])
+
+def proxy_quality(score, latency):
+    """
+    综合质量: 分数按延迟折算, 延迟等于 LATENCY_REFERENCE 时折半, 没有延迟记录时按 TIMEOUT 计
+
+    :param latency: 响应时间EWMA(秒)
+    """
+    latency = TIMEOUT if latency is None else latency
+    return score * LATENCY_REFERENCE / (LATENCY_REFERENCE + latency)
+
+class CsvPoolStore:
+    """
+    CSV代理池存储(兼容旧版本),数据常驻内存,每次修改都会重写整个文件
+
+    :param file_path: 代理池CSV文件
+    """
+    def __init__(self, file_path=OUTPUT_FILE):
+        self.file_path = file_path
+        self.proxies, self.proxy_types = load_proxies_from_file(file_path)
+        self.check_state = {}  # {proxy: (上次检查时间, 连续失败次数)}, CSV格式不保存,只在本进程内有效
+        self.latency_stats = {}  # {proxy: (ewma, p50, p95, window)}, 同样只在本进程内有效
+        self.history_rows = {}  # {proxy: (成功标志, 检查次数, 响应时间bytes)}, 同样只在本进程内有效
+        self.added_at = {}  # {proxy: 加入时间}, 同样只在本进程内有效(从文件加载的代理为0)
+        self.target_results = {}  # {proxy: {目标: (是否通过, 响应时间, 检查时间)}}, 同样只在本进程内有效
+        self.anonymity = {}  # {proxy: 匿名级别}, 同样只在本进程内有效
+        self.check_history = None  # CheckHistory, 由get_check_history加载
+        self.lock = threading.Lock()
+
+    def _save(self):
+        save_valid_proxies(self.proxies, self.proxy_types, self.file_path)
+
+    def load(self):
+        """:return: 分数字典, 类型字典"""
+        return dict(self.proxies), dict(self.proxy_types)
+
+    def get(self, proxy):
+        """:return: (类型, 分数), 不存在时返回None"""
+        if proxy not in self.proxies:
+            return None
+        return self.proxy_types.get(proxy, "http"), self.proxies[proxy]
+
+    def upsert_many(self, rows, keep_higher=False):
+        """
+        批量插入或更新代理
+
+        :param keep_higher: 为True时已有代理只在新分数更高时才更新(合并新代理时使用)
+        """
+        with self.lock:
+            for proxy, proxy_type, score in rows:
+                if keep_higher and self.proxies.get(proxy, -1) >= score:
+                    continue
+                if proxy not in self.proxies:
+                    self.added_at[proxy] = time.time()
+                self.proxies[proxy] = score
+                self.proxy_types[proxy] = proxy_type
+            self._save()
+
+    def update_scores(self, scores):
+        """批量更新已有代理的分数 {proxy: score}"""
+        with self.lock:
+            for proxy, score in scores.items():
+                if proxy in self.proxies:
+                    self.proxies[proxy] = score
+            self._save()
+
+    def remove_dead(self):
+        """移除0分代理(同时释放已加载的检查历史中的槽位),返回移除数量"""
+        with self.lock:
+            dead = [proxy for proxy, score in self.proxies.items() if score <= 0]
+            for proxy in dead:
+                del self.proxies[proxy]
+                self.proxy_types.pop(proxy, None)
+                self.check_state.pop(proxy, None)
+                self.latency_stats.pop(proxy, None)
+                self.history_rows.pop(proxy, None)
+                self.added_at.pop(proxy, None)
+                self.target_results.pop(proxy, None)
+                self.anonymity.pop(proxy, None)
+            self._save()
+        if self.check_history is not None:
+            self.check_history.remove_many(dead)
+        return len(dead)
+
+    def load_check_state(self):
+        """:return: [(proxy, proxy_type, score, 上次检查时间, 连续失败次数)], 从未检查过的代理时间为0"""
+        with self.lock:
+            return [(proxy, self.proxy_types.get(proxy, "http"), score) + self.check_state.get(proxy, (0, 0))
+                    for proxy, score in self.proxies.items()]
+
+    def update_check_state(self, rows):
+        """批量记录检查时间和连续失败次数 rows: [(proxy, 检查时间, 连续失败次数)]"""
+        with self.lock:
+            for proxy, checked_at, fail_streak in rows:
+                if proxy in self.proxies:
+                    self.check_state[proxy] = (checked_at, fail_streak)
+
+    def record_latencies(self, samples):
+        """把一批响应时间加入延迟统计 {proxy: 秒}"""
+        with self.lock:
+            for proxy, seconds in samples.items():
+                if proxy in self.proxies:
+                    ewma, _, _, window = self.latency_stats.get(proxy, (None, None, None, None))
+                    self.latency_stats[proxy] = update_latency_stats(ewma, window, seconds)
+
+    def get_latency_stats(self, proxy):
+        """:return: (ewma, p50, p95) 秒, 没有记录时返回None"""
+        stats = self.latency_stats.get(proxy)
+        return stats[:3] if stats else None
+
+    def record_target_results(self, results):
+        """记录各验证目标最近一次的结果 {proxy: {目标: 响应时间, 未通过为None}}"""
+        now = time.time()
+        with self.lock:
+            for proxy, latencies in results.items():
+                if proxy in self.proxies:
+                    matrix = self.target_results.setdefault(proxy, {})
+                    for target, seconds in latencies.items():
+                        matrix[target] = (seconds is not None, seconds, now)
+
+    def get_target_results(self, proxy):
+        """:return: {目标: (是否通过, 响应时间或None, 检查时间)}"""
+        with self.lock:
+            return dict(self.target_results.get(proxy, {}))
+
+    def target_stats(self):
+        """:return: {目标: {"checked": 有记录的代理数, "passed": 通过数, "avg_latency": 通过代理的平均响应时间}}"""
+        totals = {}
+        with self.lock:
+            for matrix in self.target_results.values():
+                for target, (passed, seconds, _) in matrix.items():
+                    item = totals.setdefault(target, [0, 0, 0.0])
+                    item[0] += 1
+                    if passed:
+                        item[1] += 1
+                        item[2] += seconds
+        return {target: {"checked": checked, "passed": passed,
+                         "avg_latency": round(latency_sum / passed, 3) if passed else None}
+                for target, (checked, passed, latency_sum) in totals.items()}
+
+    def record_anonymity(self, levels):
+        """记录匿名级别 {proxy: 级别}"""
+        with self.lock:
+            for proxy, level in levels.items():
+                if proxy in self.proxies:
+                    self.anonymity[proxy] = level
+
+    def get_anonymity(self, proxy):
+        """:return: 匿名级别, 未知时返回None"""
+        return self.anonymity.get(proxy)
+
+    def anonymity_counts(self):
+        """:return: {匿名级别: 代理数}, 级别未知的计入 unknown"""
+        counts = {}
+        with self.lock:
+            for proxy in self.proxies:
+                level = self.anonymity.get(proxy, "unknown")
+                counts[level] = counts.get(level, 0) + 1
+        return counts
+
+    def load_history(self):
+        """:return: [(proxy, 成功标志, 检查次数, 响应时间bytes)]"""
+        with self.lock:
+            return [(proxy,) + row for proxy, row in self.history_rows.items()]
+
+    def save_history(self, rows):
+        """保存检查历史 rows: [(proxy, 成功标志, 检查次数, 响应时间bytes)]"""
+        with self.lock:
+            for proxy, flags, count, blob in rows:
+                if proxy in self.proxies:
+                    self.history_rows[proxy] = (flags, count, blob)
+
+    def load_pool(self):
+        """:return: ProxyPool"""
+        with self.lock:
+            return ProxyPool.from_rows(
+                (proxy, self.proxy_types.get(proxy, "http"), score, self.added_at.get(proxy, 0.0),
+                 self.check_state.get(proxy, (0.0, 0))[0], (self.latency_stats.get(proxy) or (None,))[0])
+                for proxy, score in self.proxies.items()
+            )
+
+    def query(self, proxy_type="all", min_score=1, limit=None, order="score", max_latency=None, target=None,
+              min_anonymity=None):
+        """
+        按类型和分数查询 [(proxy, proxy_type, score)]
+
+        :param order: "score"分数降序 / "latency"延迟EWMA升序(无记录的排最后) / "quality"综合质量降序
+        :param max_latency: 只返回延迟EWMA不超过该值(秒)的代理
+        :param target: 只返回最近一次检查通过该验证目标的代理, 此时延迟筛选和排序使用该目标的响应时间
+        :param min_anonymity: 只返回匿名级别不低于该级别的代理("anonymous"包括高匿, 级别未知的不返回)
+        """
+        levels = anonymity_at_least(min_anonymity)
+
+        def latency(proxy):
+            if target is not None:
+                result = self.target_results.get(proxy, {}).get(target)
+                return result[1] if result and result[0] else None
+            stats = self.latency_stats.get(proxy)
+            return stats[0] if stats else None
+
+        rows = [(proxy, self.proxy_types.get(proxy, "http"), score)
+                for proxy, score in self.proxies.items()
+                if score >= min_score and (proxy_type == "all" or self.proxy_types.get(proxy) == proxy_type)
+                and (target is None or latency(proxy) is not None)
+                and (levels is None or self.anonymity.get(proxy) in levels)
+                and (max_latency is None or (latency(proxy) is not None and latency(proxy) <= max_latency))]
+        if order == "latency":
+            rows.sort(key=lambda row: (latency(row[0]) is None, latency(row[0]) or 0, -row[2]))
+        elif order == "quality":
+            rows.sort(key=lambda row: proxy_quality(row[2], latency(row[0])), reverse=True)
+        else:
+            rows.sort(key=lambda row: row[2], reverse=True)
+        return rows[:limit] if limit is not None else rows
+
+    def count(self, proxy_type="all"):
+        if proxy_type == "all":
+            return len(self.proxies)
+        return sum(1 for proxy in self.proxies if self.proxy_types.get(proxy) == proxy_type)
+
+    def import_csv(self, file_path):
+        """从CSV导入(覆盖同名代理),返回导入数量"""
+        proxies, proxy_types = load_proxies_from_file(file_path)
+        self.upsert_many((proxy, proxy_types[proxy], score) for proxy, score in proxies.items())
+        return len(proxies)
+
+    def export_csv(self, file_path):
+        """导出为CSV(Type,Proxy:Port,Score),返回导出数量"""
+        save_valid_proxies(self.proxies, self.proxy_types, file_path)
+        return len(self.proxies)
+
+    def close(self):
+        pass
+
+class SqlitePoolStore:
+    """
+    SQLite代理池存储: 按代理单点更新,批量upsert,按类型和分数走索引查询
+
+    :param db_path: 数据库文件
+    """
+    # 在初始表结构之后新增的列,打开旧数据库时自动补上 (列名, 定义)
+    EXTRA_COLUMNS = [
+        ("last_checked", "REAL NOT NULL DEFAULT 0"),  # 上次检查时间戳, 0表示从未检查
+        ("fail_streak", "INTEGER NOT NULL DEFAULT 0"),  # 连续失败次数
+        ("latency_ewma", "REAL"),  # 响应时间EWMA(秒), NULL表示没有成功记录
+        ("latency_p50", "REAL"),  # 最近LATENCY_WINDOW次成功检查响应时间的中位数(秒)
+        ("latency_p95", "REAL"),  # 同上, p95
+        ("latency_window", "BLOB"),  # 最近LATENCY_WINDOW次响应时间, array('H')毫秒数
+        ("history_flags", "INTEGER NOT NULL DEFAULT 0"),  # 最近HISTORY_SIZE次检查的成功标志, 最低位为最近一次
+        ("history_count", "INTEGER NOT NULL DEFAULT 0"),  # 已记录的检查次数
+        ("history_latency", "BLOB"),  # 各次检查的响应时间, array('H')毫秒数(失败为0), 按时间从旧到新
+        ("added_at", "REAL NOT NULL DEFAULT 0"),  # 加入代理池的时间戳, 0表示加入时间未知(此列之前加入的代理)
+        ("anonymity", "TEXT"),  # 匿名级别 transparent/anonymous/elite, NULL表示未知
+    ]
+
+    def __init__(self, db_path=POOL_DB_FILE):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # API服务等场景会在多个线程中使用,由self.lock串行化访问
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.check_history = None  # CheckHistory, 由get_check_history加载
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS proxies (
+                    proxy TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    score INTEGER NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_proxies_type_score ON proxies(type, score)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_proxies_score ON proxies(score)")
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(proxies)")}
+            for name, definition in self.EXTRA_COLUMNS:
+                if name not in columns:
+                    self.conn.execute(f"ALTER TABLE proxies ADD COLUMN {name} {definition}")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_proxies_type_latency ON proxies(type, latency_ewma)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_proxies_anonymity_score ON proxies(anonymity, score)")
+            # 各验证目标最近一次的结果(目标可配置, 不作为列), 按目标+延迟建索引供"通过X且响应时间<1s"查询
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS proxy_targets (
+                    proxy TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    passed INTEGER NOT NULL,
+                    latency REAL,
+                    checked_at REAL NOT NULL,
+                    PRIMARY KEY (proxy, target)
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_proxy_targets_target ON proxy_targets(target, passed, latency)")
+
+    def load(self):
+        """:return: 分数字典, 类型字典"""
+        proxies = {}
+        proxy_types = {}
+        with self.lock:
+            for proxy, proxy_type, score in self.conn.execute("SELECT proxy, type, score FROM proxies"):
+                proxies[proxy] = score
+                proxy_types[proxy] = proxy_type
+        return proxies, proxy_types
+
+    def get(self, proxy):
+        """:return: (类型, 分数), 不存在时返回None"""
+        with self.lock:
+            return self.conn.execute("SELECT type, score FROM proxies WHERE proxy = ?", (proxy,)).fetchone()
+
+    def upsert_many(self, rows, keep_higher=False):
+        """
+        批量插入或更新代理
+
+        :param keep_higher: 为True时已有代理只在新分数更高时才更新(合并新代理时使用)
+        """
+        sql = ("INSERT INTO proxies (proxy, type, score, added_at) VALUES (?, ?, ?, ?) "
+               "ON CONFLICT(proxy) DO UPDATE SET type = excluded.type, score = excluded.score")
+        if keep_higher:
+            sql += " WHERE excluded.score > proxies.score"
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(sql, ((proxy, proxy_type, score, now) for proxy, proxy_type, score in rows))
+
+    def update_scores(self, scores):
+        """批量更新已有代理的分数 {proxy: score}"""
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE proxies SET score = ? WHERE proxy = ?",
+                                  ((score, proxy) for proxy, score in scores.items()))
+
+    def remove_dead(self):
+        """移除0分代理(同时释放已加载的检查历史中的槽位),返回移除数量"""
+        with self.lock, self.conn:
+            dead = []
+            if self.check_history is not None:
+                dead = [row[0] for row in self.conn.execute("SELECT proxy FROM proxies WHERE score <= 0")]
+            removed = self.conn.execute("DELETE FROM proxies WHERE score <= 0").rowcount
+            if removed:
+                self.conn.execute("DELETE FROM proxy_targets WHERE proxy NOT IN (SELECT proxy FROM proxies)")
+        if dead:
+            self.check_history.remove_many(dead)
+        return removed
+
+    def load_check_state(self):
+        """:return: [(proxy, proxy_type, score, 上次检查时间, 连续失败次数)], 从未检查过的代理时间为0"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT proxy, type, score, last_checked, fail_streak FROM proxies").fetchall()
+
+    def update_check_state(self, rows):
+        """批量记录检查时间和连续失败次数 rows: [(proxy, 检查时间, 连续失败次数)]"""
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE proxies SET last_checked = ?, fail_streak = ? WHERE proxy = ?",
+                                  ((checked_at, fail_streak, proxy) for proxy, checked_at, fail_streak in rows))
+
+    def record_latencies(self, samples):
+        """把一批响应时间加入延迟统计 {proxy: 秒}"""
+        with self.lock, self.conn:
+            rows = []
+            for proxy, seconds in samples.items():
+                row = self.conn.execute("SELECT latency_ewma, latency_window FROM proxies WHERE proxy = ?",
+                                        (proxy,)).fetchone()
+                if row is not None:
+                    rows.append(update_latency_stats(row[0], row[1], seconds) + (proxy,))
+            self.conn.executemany("UPDATE proxies SET latency_ewma = ?, latency_p50 = ?, latency_p95 = ?, "
+                                  "latency_window = ? WHERE proxy = ?", rows)
+
+    def get_latency_stats(self, proxy):
+        """:return: (ewma, p50, p95) 秒, 没有记录时返回None"""
+        with self.lock:
+            row = self.conn.execute("SELECT latency_ewma, latency_p50, latency_p95 FROM proxies WHERE proxy = ?",
+                                    (proxy,)).fetchone()
+        return row if row and row[0] is not None else None
+
+    def record_target_results(self, results):
+        """记录各验证目标最近一次的结果 {proxy: {目标: 响应时间, 未通过为None}}"""
+        now = time.time()
+        rows = [(proxy, target, seconds is not None, seconds, now, proxy)
+                for proxy, latencies in results.items() for target, seconds in latencies.items()]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO proxy_targets (proxy, target, passed, latency, checked_at) "
+                "SELECT ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM proxies WHERE proxy = ?) "
+                "ON CONFLICT(proxy, target) DO UPDATE SET passed = excluded.passed, latency = excluded.latency, "
+                "checked_at = excluded.checked_at", rows)
+
+    def get_target_results(self, proxy):
+        """:return: {目标: (是否通过, 响应时间或None, 检查时间)}"""
+        with self.lock:
+            return {target: (bool(passed), latency, checked_at) for target, passed, latency, checked_at in
+                    self.conn.execute("SELECT target, passed, latency, checked_at FROM proxy_targets "
+                                      "WHERE proxy = ?", (proxy,))}
+
+    def target_stats(self):
+        """:return: {目标: {"checked": 有记录的代理数, "passed": 通过数, "avg_latency": 通过代理的平均响应时间}}"""
+        with self.lock:
+            rows = self.conn.execute("SELECT target, COUNT(*), SUM(passed), AVG(latency) FROM proxy_targets "
+                                     "GROUP BY target").fetchall()
+        return {target: {"checked": checked, "passed": passed,
+                         "avg_latency": round(latency, 3) if latency is not None else None}
+                for target, checked, passed, latency in rows}
+
+    def record_anonymity(self, levels):
+        """记录匿名级别 {proxy: 级别}"""
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE proxies SET anonymity = ? WHERE proxy = ?",
+                                  ((level, proxy) for proxy, level in levels.items()))
+
+    def get_anonymity(self, proxy):
+        """:return: 匿名级别, 未知时返回None"""
+        with self.lock:
+            row = self.conn.execute("SELECT anonymity FROM proxies WHERE proxy = ?", (proxy,)).fetchone()
+        return row[0] if row else None
+
+    def anonymity_counts(self):
+        """:return: {匿名级别: 代理数}, 级别未知的计入 unknown"""
+        with self.lock:
+            return {level or "unknown": count for level, count in
+                    self.conn.execute("SELECT anonymity, COUNT(*) FROM proxies GROUP BY anonymity")}
+
+    def load_history(self):
+        """:return: [(proxy, 成功标志, 检查次数, 响应时间bytes)]"""
+        with self.lock:
+            return self.conn.execute("SELECT proxy, history_flags, history_count, history_latency FROM proxies "
+                                     "WHERE history_count > 0").fetchall()
+
+    def save_history(self, rows):
+        """保存检查历史 rows: [(proxy, 成功标志, 检查次数, 响应时间bytes)]"""
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE proxies SET history_flags = ?, history_count = ?, history_latency = ? "
+                                  "WHERE proxy = ?",
+                                  ((flags, count, blob, proxy) for proxy, flags, count, blob in rows))
+
+    def load_pool(self):
+        """:return: ProxyPool"""
+        with self.lock:
+            return ProxyPool.from_rows(self.conn.execute(
+                "SELECT proxy, type, score, added_at, last_checked, latency_ewma FROM proxies"))
+
+    def query(self, proxy_type="all", min_score=1, limit=None, order="score", max_latency=None, target=None,
+              min_anonymity=None):
+        """
+        按类型和分数查询 [(proxy, proxy_type, score)]
+
+        :param order: "score"分数降序 / "latency"延迟EWMA升序(无记录的排最后) / "quality"综合质量降序
+        :param max_latency: 只返回延迟EWMA不超过该值(秒)的代理
+        :param target: 只返回最近一次检查通过该验证目标的代理, 此时延迟筛选和排序使用该目标的响应时间
+        :param min_anonymity: 只返回匿名级别不低于该级别的代理("anonymous"包括高匿, 级别未知的不返回)
+        """
+        sql = "SELECT proxy, type, score FROM proxies"
+        params = []
+        latency = "latency_ewma"
+        if target is not None:
+            sql += " JOIN proxy_targets USING (proxy) WHERE target = ? AND passed = 1 AND score >= ?"
+            params += [target, min_score]
+            latency = "latency"
+        else:
+            sql += " WHERE score >= ?"
+            params.append(min_score)
+        if proxy_type != "all":
+            sql += " AND type = ?"
+            params.append(proxy_type)
+        levels = anonymity_at_least(min_anonymity)
+        if levels is not None:
+            sql += f" AND anonymity IN ({', '.join('?' * len(levels))})"
+            params += levels
+        if max_latency is not None:
+            sql += f" AND {latency} <= ?"
+            params.append(max_latency)
+        if order == "latency":
+            sql += f" ORDER BY {latency} IS NULL, {latency}, score DESC"
+        elif order == "quality":
+            # 与 proxy_quality 相同的公式
+            sql += f" ORDER BY score * ? / (? + COALESCE({latency}, ?)) DESC"
+            params += [LATENCY_REFERENCE, LATENCY_REFERENCE, TIMEOUT]
+        else:
+            sql += " ORDER BY score DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def count(self, proxy_type="all"):
+        with self.lock:
+            if proxy_type == "all":
+                return self.conn.execute("SELECT COUNT(*) FROM proxies").fetchone()[0]
+            return self.conn.execute("SELECT COUNT(*) FROM proxies WHERE type = ?", (proxy_type,)).fetchone()[0]
+
+    def import_csv(self, file_path):
+        """从CSV导入(覆盖同名代理),返回导入数量"""
+        proxies, proxy_types = load_proxies_from_file(file_path)
+        self.upsert_many((proxy, proxy_types[proxy], score) for proxy, score in proxies.items())
+        return len(proxies)
+
+    def export_csv(self, file_path):
+        """导出为CSV(Type,Proxy:Port,Score),返回导出数量"""
+        proxies, proxy_types = self.load()
+        save_valid_proxies(proxies, proxy_types, file_path)
+        return len(proxies)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+_pool_store = None
+
+def get_pool_store():
+    """
+    按 STORE_BACKEND 获取代理池存储(进程内单例)
+    sqlite后端首次创建数据库时自动导入已有的OUTPUT_FILE
+    """
+    global _pool_store
+    if _pool_store is None:
+        if STORE_BACKEND == "sqlite":
+            is_new = not os.path.exists(POOL_DB_FILE)
+            _pool_store = SqlitePoolStore(POOL_DB_FILE)
+            if is_new and os.path.exists(OUTPUT_FILE):
+                imported = _pool_store.import_csv(OUTPUT_FILE)
+                print(f"📦 已从 {OUTPUT_FILE} 导入 {imported} 个代理到 {POOL_DB_FILE}")
         else:
-            continue
+            _pool_store = CsvPoolStore(OUTPUT_FILE)
+    return _pool_store
 
-        for attempt in range(retries):
-            try:
-                start_time = time.time()
-                response = requests.get(
-                    test_url,
-                    proxies=proxies_config,
-                    timeout=timeout,
-                    allow_redirects=False
-                )
-                end_time = time.time()
-                response_time = end_time - start_time
+def get_check_history(store=None):
+    """获取代理池存储对应的检查历史(每个存储一个常驻内存的实例,首次使用时从存储加载)"""
+    store = store or get_pool_store()
+    if store.check_history is None:
+        history = CheckHistory()
+        history.load_rows(store.load_history())
+        store.check_history = history
+    return store.check_history
 
-                if response_time > timeout:
-                    # 超时，继续下一个协议（如果是自动检测）
-                    break
+def save_check_history(store=None):
+    """把检查历史的变化写入存储(须在代理已写入存储之后调用)"""
+    store = store or get_pool_store()
+    if store.check_history is not None:
+        rows = store.check_history.pop_dirty()
+        if rows:
+            store.save_history(rows)
 
-                if response.status_code == 200:
-                    origin_ip = response.json().get('origin', '')
-                    # 验证返回的IP是否与代理一致
-                    proxy_ip = proxy.split(':')[0]
-                    if proxy_ip in origin_ip:
-                        detected_type = current_protocol
-                        return proxy, True, response_time, detected_type
-                    detected_type = current_protocol
-                    return proxy, True, response_time, detected_type
-                    
-            except Exception as e:
-                if attempt < retries - 1:
-                    time.sleep(0.5)
-                    continue
-                # 当前协议失败，如果是自动检测则尝试下一个协议
-                break
-                
-    # 如果是指定类型验证失败，返回指定类型（即使失败）
-    if proxy_type != "auto":
-        detected_type = proxy_type
-    
-    return proxy, False, None, detected_type
+_PROXY_PATTERN = re.compile(r'^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3}):(\d{1,5})$')
+# 已经是规范形式的 ip:port (各段0~255且无前导0,端口1~65535),爬取到的代理绝大多数如此,匹配后直接返回
+_OCTET = r'(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)'
+_CANONICAL_PROXY_PATTERN = re.compile(
+    rf'{_OCTET}\.{_OCTET}\.{_OCTET}\.{_OCTET}:(?:6553[0-5]|655[0-2]\d|65[0-4]\d\d|6[0-4]\d{{3}}|[1-5]\d{{4}}|[1-9]\d{{0,3}})'
+)
 
-def check_proxies_batch(proxies, proxy_types, test_url="http://httpbin.org/ip", 
-                       timeout=TIMEOUT, max_workers=MAX_WORKERS, check_type="existing"):
+def normalize_proxy(proxy):
     """
-    批量检查代理IP列表
-    
-    :param proxy_types: 代理类型字典
+    规范化代理地址: 去除空白和协议前缀,去掉IP各段的前导0,校验IP和端口范围
+
+    :param proxy: 原始代理字符串,如 " http://061.160.213.33:08080 "
+    :return: 规范化后的 ip:port (如 61.160.213.33:8080), 格式无效时返回None
     """
-    global interrupted
-    
-    updated_proxies = {}
-    updated_types = {}
+    if not isinstance(proxy, str):
+        return None
+    if _CANONICAL_PROXY_PATTERN.fullmatch(proxy):
+        return proxy
+    proxy = "".join(proxy.split())
+    if '://' in proxy:
+        proxy = proxy.split('://', 1)[1]
+    match = _PROXY_PATTERN.match(proxy)
+    if not match:
+        return None
+    octets = [int(octet) for octet in match.groups()[:4]]
+    port = int(match.group(5))
+    if max(octets) > 255 or not 0 < port < 65536:
+        return None
+    return f"{octets[0]}.{octets[1]}.{octets[2]}.{octets[3]}:{port}"
 
-    # 新代理验证两次，已有代理验证一次
-    retries = 2 if check_type == "new" else 1
+class BloomFilter:
+    """
+    布隆过滤器(可持久化),用于记录验证过的代理
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_proxy = {}
-        for proxy in proxies:
-            if interrupted:
-                break
-                
-            # 对于已有代理，使用文件中记录的类型；对于新代理，使用自动检测
-            if check_type == "existing" and proxy in proxy_types:
-                proxy_type = proxy_types[proxy]
-            else:
-                proxy_type = proxy_types.get(proxy, "auto")  # 从传入的类型字典获取
-                
-            future = executor.submit(
-                check_proxy,
-                proxy,
-                test_url,
-                timeout,
-                retries,
-                proxy_type
-            )
-            future_to_proxy[future] = proxy
+    :param capacity: 预计元素数量
+    :param error_rate: 误判率
+    """
+    MAGIC = b"PPBF1"
 
-        for future in concurrent.futures.as_completed(future_to_proxy):
-            if interrupted:
-                # 取消所有未完成的任务
-                for f in future_to_proxy:
-                    f.cancel()
-                break
-                
-            proxy = future_to_proxy[future]
-            try:
-                proxy_addr, is_valid, response_time, detected_type = future.result()
+    def __init__(self, capacity=SEEN_FILTER_CAPACITY, error_rate=SEEN_FILTER_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))  # 位数
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
 
-                if is_valid and response_time is not None and response_time <= timeout:
-                    print(f"✅ 有效代理({detected_type}): {proxy} | 响应时间: {response_time:.2f}s")
-                    if check_type == "new":
-                        updated_proxies[proxy] = 98
-                    else:
-                        current_score = proxies.get(proxy, 0)
-                        updated_proxies[proxy] = min(current_score + 1, MAX_SCORE)
-                    updated_types[proxy] = detected_type
-                    
-                elif response_time is not None:
-                    print(f"❎ 超时代理: {proxy} | 响应时间: {response_time:.2f}s")
-                    if check_type == "existing" and proxy in proxies:
-                        updated_proxies[proxy] = proxies[proxy]
-                    else:
-                        updated_proxies[proxy] = 80
-                    # 即使超时，也保留指定的类型
-                    updated_types[proxy] = proxy_types.get(proxy, detected_type)
+    def _positions(self, item):
+        # 双重哈希: 由一次blake2b得到两个64位哈希,组合出hash_count个位置
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
 
-                else:
-                    print(f"❌ 无效代理: {proxy}")
-                    if check_type == "existing" and proxy in proxies:
-                        updated_proxies[proxy] = max(0, proxies[proxy] - 1)
-                        updated_types[proxy] = proxy_types.get(proxy, "http")
-                    else:
-                        updated_proxies[proxy] = 0
-                        updated_types[proxy] = proxy_types.get(proxy, "http")
-                        
-            except Exception as e:
-                if not interrupted:  # 只有不是中断引起的异常才打印
-                    print(f"❌ 错误代理: {proxy} - {str(e)}")
-                if check_type == "existing" and proxy in proxies:
-                    updated_proxies[proxy] = max(0, proxies[proxy] - 1)
-                    updated_types[proxy] = proxy_types.get(proxy, "http")
-                else:
-                    updated_proxies[proxy] = 0
-                    updated_types[proxy] = proxy_types.get(proxy, "http")
-                    
-    return updated_proxies, updated_types
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
 
-def load_proxies_from_file(file_path):
-    """从CSV文件加载代理列表、类型和分数"""
-    proxies = {}
-    proxy_types = {}
-    
-    if not os.path.exists(file_path):
-        return proxies, proxy_types
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
 
-    with open(file_path, 'r', encoding="utf-8") as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if len(row) >= 3:
-                # 新格式：类型,proxy:port,分数
-                proxy_type = row[0].strip().lower()
-                proxy = row[1].strip()
-                try:
-                    score = int(row[2])
-                    proxies[proxy] = score
-                    proxy_types[proxy] = proxy_type
-                except:
-                    # 如果解析失败，使用默认值
-                    proxies[proxy] = 70
-                    proxy_types[proxy] = "http"  # 默认HTTP
-            elif len(row) >= 2:
-                # 旧格式兼容：proxy:port,分数（默认HTTP类型）
-                proxy = row[0].strip()
-                try:
-                    score = int(row[1])
-                    proxies[proxy] = score
-                    proxy_types[proxy] = "http"  # 旧文件默认HTTP
-                except:
-                    proxies[proxy] = 70
-                    proxy_types[proxy] = "http"
-    
-    return proxies, proxy_types
+    def save(self, file_path):
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_path = file_path + ".tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(self.MAGIC + struct.pack("<QIQ", self.size, self.hash_count, self.count))
+            file.write(self.bits)
+        os.replace(temp_path, file_path)  # 先写临时文件再替换,避免写一半被中断导致文件损坏
 
-def save_valid_proxies(proxies, proxy_types, file_path):
-    """保存有效代理到CSV文件（带类型和分数）"""
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    
-    with open(file_path, 'w', encoding="utf-8", newline='') as file:
-        writer = csv.writer(file)
-        for proxy, score in proxies.items():
-            if len(proxy) > 6 and score > 0:  # 基本验证
-                proxy_type = proxy_types.get(proxy, "http")  # 默认HTTP
-                writer.writerow([proxy_type, proxy, score])
+    @classmethod
+    def load(cls, file_path, capacity=SEEN_FILTER_CAPACITY, error_rate=SEEN_FILTER_ERROR_RATE):
+        """从文件加载,文件不存在或损坏时返回新的空过滤器"""
+        bloom = cls(capacity, error_rate)
+        try:
+            with open(file_path, 'rb') as file:
+                header = file.read(len(cls.MAGIC) + struct.calcsize("<QIQ"))
+                if not header.startswith(cls.MAGIC):
+                    return bloom
+                size, hash_count, count = struct.unpack("<QIQ", header[len(cls.MAGIC):])
+                bits = bytearray(file.read())
+            if len(bits) == (size + 7) // 8:
+                bloom.size, bloom.hash_count, bloom.count, bloom.bits = size, hash_count, count, bits
+        except (OSError, struct.error):
+            pass
+        return bloom
 
-def update_proxy_scores(file_path):
-    """更新代理分数文件，移除0分代理"""
-    proxies, proxy_types = load_proxies_from_file(file_path)
-    valid_proxies = {k: v for k, v in proxies.items() if v > 0}
-    valid_types = {k: v for k, v in proxy_types.items() if k in valid_proxies}
-    save_valid_proxies(valid_proxies, valid_types, file_path)
-    return len(proxies) - len(valid_proxies)
+def remember_seen_proxies(proxies):
+    """将验证过的代理记入持久化布隆过滤器(USE_SEEN_FILTER开启时)"""
+    if not USE_SEEN_FILTER or not proxies:
+        return
+    seen_filter = BloomFilter.load(SEEN_FILTER_FILE)
+    for proxy in proxies:
+        seen_filter.add(proxy)
+    seen_filter.save(SEEN_FILTER_FILE)
 
-def filter_proxies(all_proxies):
+class NegativeCache:
+    """
+    失效代理缓存(可持久化): 代理 -> (最后失效时间, 连续失效次数)
+
+    失效期从 NEGATIVE_TTL 开始,每连续失效一次翻倍,最长 NEGATIVE_TTL_MAX;验证有效后移除记录.
+    超过容量时淘汰最久未用(未命中也未再失效)的代理.
+
+    :param capacity: 最多记录的代理数
+    """
+    def __init__(self, capacity=NEGATIVE_CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()  # 按最近使用排序,最久未用的在前
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.saved_at = time.time()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def ttl(failures):
+        """连续失效failures次后的失效期(秒)"""
+        return min(NEGATIVE_TTL * 2 ** min(failures - 1, 32), NEGATIVE_TTL_MAX)
+
+    def is_dead(self, proxy, now=None):
+        """:return: 代理仍在失效期内时为True(命中)"""
+        with self.lock:
+            entry = self.entries.get(proxy)
+            if entry is not None and (now or time.time()) < entry[0] + self.ttl(entry[1]):
+                self.entries.move_to_end(proxy)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def record(self, scores, now=None):
         """
-        从新获取代理中去掉无效的,重复的
-        :all_proxies: 新代理列表
-        :return: 筛选后的代理列表
+        记录一批验证结果: 0分代理连续失效次数加1并刷新失效时间,有效代理移除记录
+
+        :param scores: {代理: 分数}
         """
-        # 进行筛选
-        existing_proxies = []
-        if os.path.exists(OUTPUT_FILE):
-            with open(OUTPUT_FILE,'r') as file:
-                csv_reader  = csv.reader(file)
-                for row in csv_reader:
-                    existing_proxies.append(row[1])
+        now = now or time.time()
+        with self.lock:
+            for proxy, score in scores.items():
+                if score <= 0:
+                    _, failures = self.entries.pop(proxy, (0, 0))
+                    self.entries[proxy] = (now, failures + 1)
+                    self.dirty = True
+                elif self.entries.pop(proxy, None) is not None:
+                    self.dirty = True
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
 
-        new_proxies = []
-        duplicate_count = 0
-        invalid_count = 0
+    def save(self, file_path):
+        """按最近使用顺序写入CSV(代理,最后失效时间,连续失效次数)"""
+        with self.lock:
+            rows = [(proxy, round(failed_at), failures) for proxy, (failed_at, failures) in self.entries.items()]
+            self.dirty = False
+            self.saved_at = time.time()
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_path = file_path + ".tmp"
+        with open(temp_path, 'w', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerows(rows)
+        os.replace(temp_path, file_path)  # 先写临时文件再替换,避免写一半被中断导致文件损坏
 
-        for proxy in all_proxies:
-            try:
-                if (proxy in existing_proxies) or (proxy in new_proxies):
+    @classmethod
+    def load(cls, file_path, capacity=NEGATIVE_CACHE_SIZE):
+        """从文件加载,文件不存在时返回空缓存,跳过损坏的行"""
+        cache = cls(capacity)
+        try:
+            with open(file_path, 'r', newline='', encoding='utf-8') as file:
+                for row in csv.reader(file):
+                    try:
+                        cache.entries[row[0]] = (float(row[1]), int(row[2]))
+                    except (IndexError, ValueError):
+                        continue
+        except OSError:
+            pass
+        while len(cache.entries) > capacity:
+            cache.entries.popitem(last=False)
+        return cache
+
+_negative_cache = None
+
+def get_negative_cache():
+    """进程内共享的失效代理缓存(首次使用时从文件加载,进程退出时写回)"""
+    global _negative_cache
+    if _negative_cache is None:
+        _negative_cache = NegativeCache.load(NEGATIVE_CACHE_FILE)
+        atexit.register(save_negative_cache, True)
+    return _negative_cache
+
+def save_negative_cache(force=False):
+    """有变化时写入失效代理缓存文件,非强制写入时距上次写入不足 NEGATIVE_CACHE_SAVE_INTERVAL 秒则跳过"""
+    cache = _negative_cache
+    if cache is None or not cache.dirty:
+        return
+    if force or time.time() - cache.saved_at >= NEGATIVE_CACHE_SAVE_INTERVAL:
+        cache.save(NEGATIVE_CACHE_FILE)
+
+def remember_dead_proxies(scores):
+    """将验证结果记入失效代理缓存(USE_NEGATIVE_CACHE开启时), scores: {代理: 分数}"""
+    if not USE_NEGATIVE_CACHE or not scores:
+        return
+    get_negative_cache().record(scores)
+    save_negative_cache()
+
+class ProxyDeduplicator:
+    """
+    增量去重器: 可对多批代理多次调用filter,跨批次保持已见集合(并发爬取时边爬边去重)
+
+    :param verbose: 是否逐个打印重复/无效代理
+    """
+    def __init__(self, verbose=True):
+        existing_proxies, _ = get_pool_store().load()
+        self.existing_proxies = {normalize_proxy(proxy) or proxy for proxy in existing_proxies}
+        self.seen_filter = BloomFilter.load(SEEN_FILTER_FILE) if USE_SEEN_FILTER else None
+        self.negative_cache = get_negative_cache() if USE_NEGATIVE_CACHE else None
+        self.new_proxies_set = set()
+        self.verbose = verbose
+        self.new_count = 0
+        self.duplicate_count = 0
+        self.invalid_count = 0
+        self.seen_count = 0
+        self.dead_count = 0  # 失效代理缓存命中数
+        self.alive_count = 0  # 失效代理缓存未命中数
+
+    def filter(self, proxies):
+        """:return: 本批中的新代理列表(已规范化)"""
+        new_proxies = []
+        for raw_proxy in proxies:
+            proxy = normalize_proxy(raw_proxy)
+            if proxy is None:
+                if self.verbose:
+                    print(f'❌ 格式无效: {raw_proxy}')
+                self.invalid_count += 1
+            elif (proxy in self.existing_proxies) or (proxy in self.new_proxies_set):
+                if self.verbose:
                     print(f'⭕️ 已有代理: {proxy}')
-                    duplicate_count += 1
-                elif (':' in proxy) and (proxy not in new_proxies):
-                    new_proxies.append(proxy)
-                    
-                else:
-                    print(f'❌ 格式无效: {proxy}')
-                    invalid_count += 1
-            except:
-                invalid_count += 1
+                self.duplicate_count += 1
+            elif self.seen_filter is not None and proxy in self.seen_filter:
+                if self.verbose:
+                    print(f'⛔ 已验证过(失效): {proxy}')
+                self.seen_count += 1
+            elif self.negative_cache is not None and self.negative_cache.is_dead(proxy):
+                if self.verbose:
+                    print(f'💤 近期失效: {proxy}')
+                self.dead_count += 1
+            else:
+                if self.negative_cache is not None:
+                    self.alive_count += 1
+                new_proxies.append(proxy)
+                self.new_proxies_set.add(proxy)
+        self.new_count += len(new_proxies)
+        return new_proxies
 
-        print(f'新代理:{len(new_proxies)},已有(重复):{duplicate_count},无效:{invalid_count}')
+    def summary(self):
+        parts = [f'新代理:{self.new_count}', f'已有(重复):{self.duplicate_count}']
+        if self.seen_filter is not None:
+            parts.append(f'已验证过:{self.seen_count}')
+        if self.negative_cache is not None:
+            parts.append(f'近期失效:{self.dead_count}')
+        parts.append(f'无效:{self.invalid_count}')
+        summary = ','.join(parts)
+        if self.negative_cache is not None:
+            summary += (f'\n失效代理缓存: 命中 {self.dead_count}, 未命中 {self.alive_count}, '
+                        f'共记录 {len(self.negative_cache)} 个')
+        return summary
+
+def filter_proxies(all_proxies):
+        """
+        从新获取代理中去掉无效的,重复的,失效代理缓存中仍在失效期内的(以及布隆过滤器中记录的已验证过的代理)
+        :all_proxies: 新代理列表
+        :return: 筛选后的代理列表(已规范化)
+        """
+        # 进行筛选,使用集合去重,每次判断O(1)
+        deduplicator = ProxyDeduplicator()
+        new_proxies = deduplicator.filter(all_proxies)
+        print(deduplicator.summary())
         return new_proxies
 
+def pool_location():
+    """当前存储后端对应的代理池文件"""
+    return POOL_DB_FILE if STORE_BACKEND == "sqlite" else OUTPUT_FILE
+
+def merge_new_proxies(updated_proxies, updated_types, latencies=None, target_results=None, anonymity=None):
+    """
+    将新代理验证结果合并到代理池: 不存在或新分数更高时写入,0分代理不写入
+
+    :param latencies: 有效代理的响应时间 {proxy: 秒},写入代理池的延迟统计
+    :param target_results: 有效代理各验证目标的响应时间 {proxy: {目标: 秒或None}}
+    :param anonymity: 有效代理的匿名级别 {proxy: 级别}
+    """
+    rows = [(proxy, updated_types[proxy], score) for proxy, score in updated_proxies.items()
+            if len(proxy) > 6 and score > 0]
+    store = get_pool_store()
+    store.upsert_many(rows, keep_higher=True)
+    if latencies:
+        store.record_latencies(latencies)
+    if target_results:
+        store.record_target_results(target_results)
+    if anonymity:
+        store.record_anonymity(anonymity)
+    save_check_history(store)
+    notify_score_updates(rows, keep_higher=True)
+    remember_seen_proxies(updated_proxies)
+    remember_dead_proxies(updated_proxies)
+
 def validate_new_proxies_with_interrupt(new_proxies, proxy_type="auto", from_interrupt=False, source="crawl"):
-    """验证新代理（支持中断恢复）"""
+    """
+    验证新代理（支持中断恢复）
+
+    :param proxy_type: 验证类型, 或 {代理: 类型}(从并发爬取的中断记录继续时)
+    """
     global interrupted
     
     if not new_proxies:
@@ -408,7 +2863,7 @@ def validate_new_proxies_with_interrupt(new_proxies, proxy_type="auto", from_int
     interrupt_file = INTERRUPT_FILE if source == "crawl" else INTERRUPT_FILE_LOAD
     
     original_count = len(new_proxies)
-    print(f"共加载 {original_count} 个新代理，使用{proxy_type}类型开始测试...")
+    print(f"共加载 {original_count} 个新代理，使用{describe_proxy_type(proxy_type)}类型开始测试...")
     
     # 保存初始状态到中断文件（如果不是从中断恢复的）
     if not from_interrupt:
@@ -420,13 +2875,21 @@ def validate_new_proxies_with_interrupt(new_proxies, proxy_type="auto", from_int
     
     # 新代理初始分数为0
     new_proxies_dict = {proxy: 0 for proxy in new_proxies}
-    new_types_dict = {proxy: proxy_type for proxy in new_proxies}
+    if isinstance(proxy_type, dict):
+        new_types_dict = {proxy: proxy_type.get(proxy, "auto") for proxy in new_proxies}
+    else:
+        new_types_dict = {proxy: proxy_type for proxy in new_proxies}
+    latencies = {}
+    target_results = {}
+    anonymity = {}
     
     try:
-        updated_proxies, updated_types = check_proxies_batch(
-            new_proxies_dict, new_types_dict, TEST_URL, TIMEOUT, 
-            MAX_WORKERS, check_type="new"
-        )
+        # 每个结果计分后先写入验证日志,进程意外退出时下次可从日志恢复
+        with ValidationJournal(journal_path(interrupt_file)) as journal:
+            updated_proxies, updated_types = run_validation_batch(
+                new_proxies_dict, new_types_dict, check_type="new", latencies=latencies, history=get_check_history(),
+                journal=journal, target_results=target_results, anonymity=anonymity
+            )
         
         if interrupted:
             # 计算剩余未验证的代理
@@ -434,13 +2897,7 @@ def validate_new_proxies_with_interrupt(new_proxies, proxy_type="auto", from_int
             remaining_proxies = [proxy for proxy in new_proxies if proxy not in verified_proxies]
             
             # 保存已验证的代理到代理池
-            existing_proxies, existing_types = load_proxies_from_file(OUTPUT_FILE)
-            for proxy, score in updated_proxies.items():
-                if proxy not in existing_proxies or existing_proxies[proxy] < score:
-                    existing_proxies[proxy] = score
-                    existing_types[proxy] = updated_types[proxy]
-
-            save_valid_proxies(existing_proxies, existing_types, OUTPUT_FILE)
+            merge_new_proxies(updated_proxies, updated_types, latencies, target_results, anonymity)
             
             # 更新中断文件
             if remaining_proxies:
@@ -456,13 +2913,7 @@ def validate_new_proxies_with_interrupt(new_proxies, proxy_type="auto", from_int
         
         # 正常完成验证
         # 合并到现有代理池
-        existing_proxies, existing_types = load_proxies_from_file(OUTPUT_FILE)
-        for proxy, score in updated_proxies.items():
-            if proxy not in existing_proxies or existing_proxies[proxy] < score:
-                existing_proxies[proxy] = score
-                existing_types[proxy] = updated_types[proxy]
-
-        save_valid_proxies(existing_proxies, existing_types, OUTPUT_FILE)
+        merge_new_proxies(updated_proxies, updated_types, latencies, target_results, anonymity)
         
         # 删除中断文件
         delete_interrupt_file(interrupt_file)
@@ -474,23 +2925,26 @@ def validate_new_proxies_with_interrupt(new_proxies, proxy_type="auto", from_int
         print(f"\n✅ 验证完成!")
         print(f"成功: {success_count}/{original_count}")
         print(f"超时: {timeout_count}/{original_count}")
-        print(f"代理池已更新至: {OUTPUT_FILE}")
+        print(f"代理池已更新至: {pool_location()}")
         
     except Exception as e:
         if not interrupted:
             print(f"验证过程中发生错误: {str(e)}")
+    finally:
+        restore_interrupt_handler()
 
 def validate_existing_proxies_with_interrupt():
     """验证已有代理池中的代理（支持中断恢复）"""
     global interrupted
     
-    print(f"开始验证已有代理池，文件：{OUTPUT_FILE}...")
+    print(f"开始验证已有代理池，文件：{pool_location()}...")
     
     # 首先检查是否有中断记录
-    remaining_proxies, _, original_count = load_interrupted_proxies(INTERRUPT_FILE_EXISTING)
+    remaining_proxies, _, original_count = load_interrupted_proxies(INTERRUPT_FILE_EXISTING, recover=False)
     if remaining_proxies:
         print(f"🔍 发现上次验证中断记录!")
         print(f"   剩余代理: {len(remaining_proxies)}/{original_count} 个")
+        print_journal_pending(INTERRUPT_FILE_EXISTING)
         print("\n请选择:")
         print("  y: 继续上次验证")
         print("  n: 删除记录并重新验证")
@@ -500,7 +2954,11 @@ def validate_existing_proxies_with_interrupt():
         
         if choice == 'y':
             print("继续上次验证...")
-            proxies_to_validate = remaining_proxies
+            # 确认继续后才把验证日志中的结果写入代理池
+            proxies_to_validate, _, original_count = load_interrupted_proxies(INTERRUPT_FILE_EXISTING)
+            if not proxies_to_validate:
+                print("✅ 上次的代理已全部验证完成")
+                return
         elif choice == 'n':
             delete_interrupt_file(INTERRUPT_FILE_EXISTING)
             proxies_to_validate = None  # 重新加载所有代理
@@ -511,7 +2969,8 @@ def validate_existing_proxies_with_interrupt():
         proxies_to_validate = None
     
     # 加载代理池
-    all_proxies, proxy_types = load_proxies_from_file(OUTPUT_FILE)
+    store = get_pool_store()
+    all_proxies, proxy_types = store.load()
     
     if proxies_to_validate is None:
         # 重新验证所有代理
@@ -535,69 +2994,485 @@ def validate_existing_proxies_with_interrupt():
         # 从代理池中获取当前分数和类型
         proxies_dict = {proxy: all_proxies[proxy] for proxy in proxies_to_validate}
         types_dict = {proxy: proxy_types[proxy] for proxy in proxies_to_validate}
+        latencies = {}
+        target_results = {}
+        anonymity = {}
         
-        updated_proxies, updated_types = check_proxies_batch(
-            proxies_dict, types_dict, TEST_URL, TIMEOUT, MAX_WORKERS, "existing"
-        )
+        with ValidationJournal(journal_path(INTERRUPT_FILE_EXISTING)) as journal:
+            updated_proxies, updated_types = run_validation_batch(
+                proxies_dict, types_dict, "existing", latencies, get_check_history(store), journal, target_results,
+                anonymity
+            )
         
         if interrupted:
             # 计算剩余未验证的代理
             verified_proxies = set(updated_proxies.keys())
             remaining_proxies = [proxy for proxy in proxies_to_validate if proxy not in verified_proxies]
             
-            # 更新已验证的代理分数
-            for proxy, score in updated_proxies.items():
-                all_proxies[proxy] = score
-            
-            # 保存更新后的代理池
-            save_valid_proxies(all_proxies, proxy_types, OUTPUT_FILE)
+            # 更新已验证的代理分数(0分代理同时移除)
+            store.update_scores(updated_proxies)
+            store.record_latencies(latencies)
+            store.record_target_results(target_results)
+            store.record_anonymity(anonymity)
+            save_check_history(store)
+            notify_score_updates((proxy, proxy_types[proxy], score) for proxy, score in updated_proxies.items())
+            remember_seen_proxies([proxy for proxy, score in updated_proxies.items() if score <= 0])
+            remember_dead_proxies(updated_proxies)
+            store.remove_dead()
             
             # 更新中断文件
             if remaining_proxies:
-                save_interrupted_proxies(remaining_proxies, "already_have", original_count, INTERRUPT_FILE_EXISTING)
-                print(f"\n⏸️ 验证已中断！已更新 {len(verified_proxies)} 个代理分数，剩余 {len(remaining_proxies)} 个代理待验证")
-                print(f"📁 中断文件已更新: {INTERRUPT_FILE_EXISTING}")
-            else:
-                delete_interrupt_file(INTERRUPT_FILE_EXISTING)
-                print(f"\n✅ 验证完成！所有代理已更新")
-                
-            interrupted = False
+                save_interrupted_proxies(remaining_proxies, "already_have", original_count, INTERRUPT_FILE_EXISTING)
+                print(f"\n⏸️ 验证已中断！已更新 {len(verified_proxies)} 个代理分数，剩余 {len(remaining_proxies)} 个代理待验证")
+                print(f"📁 中断文件已更新: {INTERRUPT_FILE_EXISTING}")
+            else:
+                delete_interrupt_file(INTERRUPT_FILE_EXISTING)
+                print(f"\n✅ 验证完成！所有代理已更新")
+                
+            interrupted = False
+            return
+        
+        # 正常完成验证
+        # 更新所有代理分数
+        store.update_scores(updated_proxies)
+        store.record_latencies(latencies)
+        store.record_target_results(target_results)
+        store.record_anonymity(anonymity)
+        save_check_history(store)
+        notify_score_updates((proxy, proxy_types[proxy], score) for proxy, score in updated_proxies.items())
+        
+        # 清理0分代理
+        remember_seen_proxies([proxy for proxy, score in updated_proxies.items() if score <= 0])
+        remember_dead_proxies(updated_proxies)
+        removed_count = store.remove_dead()
+        
+        # 删除中断文件
+        delete_interrupt_file(INTERRUPT_FILE_EXISTING)
+        
+        # 最终统计
+        final_count = store.count()
+
+        print(f"\n验证完成! 剩余有效代理: {final_count}/{original_count}")
+        print(f"已移除 {original_count - final_count} 个无效代理")
+        
+    except Exception as e:
+        if not interrupted:
+            print(f"验证过程中发生错误: {str(e)}")
+    finally:
+        restore_interrupt_handler()
+
+
+# ============代理来源登记 - Declarative source registry
+# 每个来源声明: 名称, 页面URL(含{page}时按页码展开), 默认页码范围, 解析式, 默认验证类型(空字符串为自动检测),
+# 每秒最多请求数, 同时请求的线程数, 是否使用爬取缓存(条件请求,只取新增代理);菜单单独爬取和并发爬取都由 crawl_sources_concurrently 执行
+# (共享Session、令牌桶限速、统一超时和错误计数),新增来源只需在这里加一项
+
+GITHUB_LIST_URL = "https://raw.githubusercontent.com/databay-labs/free-proxy-list/refs/heads/master/{}.txt"
+
+SOURCE_REGISTRY = [
+    {"name": "proxy5.net", "url": "https://proxy5.net/cn/free-proxy/china", "pattern": STRONG_TABLE_PATTERN,
+     "type": "", "rate": 1, "note": "被封了,成功率 40%"},
+    {"name": "89ip.cn", "url": "https://www.89ip.cn/index_{page}.html", "first_url": "https://www.89ip.cn/",
+     "pages": (1, 6), "pattern": TABLE_PATTERN, "type": "", "rate": 1, "note": "240个,成功率 10%"},
+    {"name": "freevpnnode.com", "url": "https://cn.freevpnnode.com/", "pattern": TABLE_PATTERN,
+     "type": "", "rate": 1, "note": "30个,成功率 3%"},
+    {"name": "kuaidaili.com", "url": "https://www.kuaidaili.com/free/inha/{page}/", "pages": (1, 10), "max_page": 7000,
+     "pattern": KUAIDAILI_PATTERN, "type": "", "rate": 0.5, "note": "7600多页,成功率 5%"},
+    {"name": "ip3366.net", "url": "http://www.ip3366.net/?stype=1&page={page}", "pages": (1, 7),
+     "pattern": TABLE_PATTERN, "type": "", "rate": 1, "note": "100个,成功率 1%"},
+    # 每次请求返回一个随机代理,菜单爬取时询问请求次数,不参与并发爬取
+    {"name": "proxypool.scrape.center", "url": "https://proxypool.scrape.center/random", "repeat": True,
+     "pattern": TEXT_LIST_PATTERN, "type": "http", "rate": 20, "workers": 20, "concurrent": False,
+     "note": "随机的,成功率 40%"},
+    {"name": "proxy.scdn.io", "url": "https://proxy.scdn.io/text.php", "headers": {"Referer": "https://proxy.scdn.io/"},
+     "pattern": TEXT_LIST_PATTERN, "type": "", "rate": 1, "cache": True, "note": "12000多个,成功率 30%"},
+    {"name": "proxyhub.me", "url": "https://proxyhub.me/zh/cn-http-proxy-list.html", "pattern": TABLE_PATTERN,
+     "type": "", "rate": 1, "note": "20个,成功率 0%"},
+    {"name": "github-http", "url": GITHUB_LIST_URL.format("http"), "pattern": TEXT_LIST_PATTERN,
+     "type": "http", "rate": 1, "cache": True, "note": "大约3000个,成功率 15%"},
+    {"name": "github-socks5", "url": GITHUB_LIST_URL.format("socks5"), "pattern": TEXT_LIST_PATTERN,
+     "type": "socks5", "rate": 1, "cache": True, "note": "大约2000个,成功率 10%"},
+    {"name": "github-https", "url": GITHUB_LIST_URL.format("https"), "pattern": TEXT_LIST_PATTERN,
+     "type": "http", "rate": 1, "cache": True, "note": "大约3000个,成功率 10%"},
+    # TODO https://github.com/zloi-user/hideip.me/raw/refs/heads/master/{http,https,socks4,socks5}.txt
+    # TODO https://raw.githubusercontent.com/r00tee/Proxy-List/main/{Https,Socks4,Socks5}.txt
+]
+
+# 参与并发爬取的来源
+CRAWL_SOURCES = [source for source in SOURCE_REGISTRY if source.get("concurrent", True)]
+
+def source_urls(source, first_page=None, last_page=None, count=1):
+    """
+    展开来源的页面URL
+
+    :param first_page: 起始页,默认为来源声明的页码范围
+    :param last_page: 结束页
+    :param count: 每次请求返回随机代理的来源的请求次数
+    :return: URL列表
+    """
+    if source.get("repeat"):
+        return [source["url"]] * count
+    if "{page}" not in source["url"]:
+        return [source["url"]]
+    default_first, default_last = source["pages"]
+    return [source["first_url"] if page == 1 and "first_url" in source else source["url"].format(page=page)
+            for page in range(first_page or default_first, (last_page or default_last) + 1)]
+
+def source_home(source):
+    """菜单中显示的来源地址"""
+    return source.get("first_url", source["url"])
+
+def load_source_stats(path=SOURCE_STATS_FILE):
+    """
+    读取各来源产出统计
+
+    :return: {来源名称: {"runs", "requests", "errors", "crawled", "new", "valid", "last_crawled"}}
+    """
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def update_source_stats(run_stats, path=SOURCE_STATS_FILE):
+    """
+    合并一次并发爬取的各来源统计: 旧值乘以 SOURCE_STATS_DECAY 后加上本次的值
+
+    :param run_stats: {来源名称: {"requests", "errors", "crawled", "new", "valid"}}
+    :return: 合并后的产出统计
+    """
+    source_stats = load_source_stats(path)
+    now = time.time()
+    for name, counts in run_stats.items():
+        entry = source_stats.setdefault(name, {"runs": 0})
+        for key, value in counts.items():
+            entry[key] = round(entry.get(key, 0) * SOURCE_STATS_DECAY + value, 3)
+        entry["runs"] += 1
+        entry["last_crawled"] = now
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as file:
+        json.dump(source_stats, file, ensure_ascii=False, indent=1)
+    os.replace(tmp_file, path)
+    return source_stats
+
+def source_yield(entry):
+    """每次请求平均得到的有效新代理数,没有统计时返回None"""
+    if not entry or not entry.get("requests"):
+        return None
+    return entry["valid"] / entry["requests"]
+
+def select_sources(sources, source_stats):
+    """
+    跳过产出过低的来源: 至少被爬取 SOURCE_MIN_RUNS 次后才判断,距上次爬取超过 SOURCE_RETRY_AFTER 秒时重新爬取一次
+
+    :return: 参与爬取的来源列表, 跳过的 [(来源, 产出)]
+    """
+    selected, skipped = [], []
+    now = time.time()
+    for source in sources:
+        entry = source_stats.get(source["name"])
+        yield_rate = source_yield(entry)
+        if (yield_rate is not None and yield_rate < SOURCE_MIN_YIELD and entry["runs"] >= SOURCE_MIN_RUNS
+                and now - entry["last_crawled"] < SOURCE_RETRY_AFTER):
+            skipped.append((source, yield_rate))
+        else:
+            selected.append(source)
+    return selected, skipped
+
+# ============并发爬取 - Concurrent multi-source crawl
+# 每个来源由自己的线程(默认1个)顺序爬取页面,同域名的来源共享一个令牌桶限速(代替固定sleep),
+# 不同来源同时进行;每爬完一页就交给去重和验证,不必等待全部来源爬完
+
+class TokenBucket:
+    """
+    令牌桶限速(线程安全)
+
+    :param rate: 每秒生成的令牌数,即每秒最多请求数
+    :param capacity: 桶容量,即允许的突发请求数
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌,没有令牌时等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def crawl_sources_concurrently(sources=None, max_pending_pages=PIPELINE_QUEUE_SIZE, urls=None, cache=None):
+    """
+    同时爬取多个来源,每爬完一页产出一次结果
+
+    :param sources: 来源列表,默认CRAWL_SOURCES
+    :param max_pending_pages: 已爬取但尚未被取走的页面数上限,达到上限时爬取线程等待(背压)
+    :param urls: {来源名称: URL列表},未指定的来源使用 source_urls 的默认页码范围
+    :param cache: FetchCache,启用缓存的来源使用;调用方取走下一页(或迭代结束)时上一页的结果才算已取走,
+                  调用方在新代理写入代理池或中断文件后调用 cache.commit()。不指定时不使用缓存
+    :return: 生成器,产出 (来源, 代理列表或错误信息字符串)
+    """
+    import queue
+
+    sources = CRAWL_SOURCES if sources is None else sources
+    urls = urls or {}
+    source_url_lists = [(source, urls.get(source["name"]) or source_urls(source)) for source in sources]
+    buckets = {}  # 域名 -> 令牌桶,同域名的来源共享限速
+    for source, url_list in source_url_lists:
+        for url in url_list:
+            domain = urllib.parse.urlsplit(url).hostname
+            if domain not in buckets:
+                buckets[domain] = TokenBucket(source.get("rate", 1))
+    page_queue = queue.Queue(maxsize=max_pending_pages)
+
+    def crawl_source(source, url_iter, lock):
+        try:
+            while not interrupted:
+                with lock:
+                    url = next(url_iter, None)
+                if url is None:
+                    break
+                buckets[urllib.parse.urlsplit(url).hostname].acquire()
+                page_queue.put((source, url, ProxyScraper(url, source["pattern"], ["ip", "port"], source.get("headers"),
+                                                          cache if source.get("cache") else None).scrape_proxies()))
+        finally:
+            page_queue.put((source, None, None))  # 该线程结束
+
+    threads = []
+    for source, url_list in source_url_lists:
+        url_iter, lock = iter(url_list), threading.Lock()  # 同一来源的线程共享页面迭代器
+        threads += [threading.Thread(target=crawl_source, args=(source, url_iter, lock), daemon=True)
+                    for _ in range(source.get("workers", 1))]
+    for thread in threads:
+        thread.start()
+    running = len(threads)
+    while running:
+        source, url, result = page_queue.get()
+        if result is None:
+            running -= 1
+        else:
+            yield source, result
+            if cache is not None:
+                cache.release(url)  # 生成器继续运行说明调用方已处理完这一页
+
+# ============流式验证流水线 - Streaming scrape-to-validate pipeline
+# 爬取 -> 规范化/去重 -> TCP预筛 -> 协议验证 -> 写入代理池
+# 各阶段之间是有界队列,下游处理不过来时上游自动等待(背压);每个代理验证完就进入写入阶段,
+# 第一批有效代理在爬取开始几秒内即可写入代理池
+
+async def _stream_pipeline(batches, stats):
+    loop = asyncio.get_running_loop()
+    prefilter_queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+    validate_queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+    result_queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+    deduplicator = ProxyDeduplicator(verbose=False)
+    history = get_check_history()
+    proxy_types = {}  # 已通过去重但尚未写入代理池的代理 -> 验证类型
+    proxy_sources = {}  # 同上 -> 来源名称
+    start_time = time.time()
+
+    async def ingest():
+        """阶段1: 从爬取线程取页面(阻塞操作放到线程池),规范化并去重"""
+        batch_iter = iter(batches)
+        while True:
+            item = await loop.run_in_executor(None, next, batch_iter, None)
+            if item is None:
+                break
+            label, result, proxy_type = item
+            source_stats = stats["sources"].setdefault(
+                label, {"requests": 0, "errors": 0, "crawled": 0, "new": 0, "valid": 0}
+            )
+            stats["pages"] += 1
+            source_stats["requests"] += 1
+            if not isinstance(result, list):
+                stats["errors"] += 1
+                source_stats["errors"] += 1
+                continue
+            new_proxies = deduplicator.filter(result)
+            stats["crawled"] += len(result)
+            stats["new"] += len(new_proxies)
+            source_stats["crawled"] += len(result)
+            source_stats["new"] += len(new_proxies)
+            print(f"📄 {label}: 爬取 {len(result)} 个, 新代理 {len(new_proxies)} 个 "
+                  f"(已爬 {stats['pages']} 页, 错误 {stats['errors']})")
+            for proxy in new_proxies:
+                proxy_types[proxy] = proxy_type
+                proxy_sources[proxy] = label
+                await (prefilter_queue if TCP_PREFILTER else validate_queue).put(proxy)
+
+    async def prefilter_worker():
+        """阶段2: TCP预筛"""
+        while True:
+            proxy = await prefilter_queue.get()
+            try:
+                if await _tcp_connect_ok(proxy, CONNECT_TIMEOUT):
+                    await validate_queue.put(proxy)
+                else:
+                    stats["unreachable"] += 1
+                    await result_queue.put((proxy, (proxy, False, None, proxy_types[proxy]), {}))
+            finally:
+                prefilter_queue.task_done()
+
+    async def validate_worker():
+        """阶段3: 协议验证"""
+        while True:
+            proxy = await validate_queue.get()
+            try:
+                try:
+                    result, target_latencies = await _async_check_proxy_and_targets(
+                        proxy, TEST_URL, TIMEOUT, 2, proxy_types[proxy], VALIDATION_TARGETS
+                    )
+                except Exception as e:
+                    result, target_latencies = e, {}
+                await result_queue.put((proxy, result, target_latencies))
+            finally:
+                validate_queue.task_done()
+
+    updated_proxies = {}
+    updated_types = {}
+    latencies = {}
+    target_results = {}
+    anonymity = {}
+
+    def flush():
+        merge_new_proxies(updated_proxies, updated_types, latencies, target_results, anonymity)
+        for proxy in updated_proxies:
+            proxy_types.pop(proxy, None)
+            proxy_sources.pop(proxy, None)
+        updated_proxies.clear()
+        updated_types.clear()
+        latencies.clear()
+        target_results.clear()
+        anonymity.clear()
+
+    async def writer():
+        """阶段4: 计分并批量写入代理池(攒够一批或超过PIPELINE_FLUSH_INTERVAL秒就写入)"""
+        last_flush = time.time()
+        while True:
+            try:
+                proxy, result, target_latencies = await asyncio.wait_for(result_queue.get(), PIPELINE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                proxy = None
+            if proxy is not None:
+                updated_proxies[proxy], updated_types[proxy] = score_check_result(
+                    proxy, result, {}, proxy_types, TIMEOUT, "new", latencies=latencies, history=history,
+                    anonymity=anonymity
+                )
+                if target_latencies:
+                    target_results[proxy] = target_latencies
+                stats["validated"] += 1
+                if updated_proxies[proxy] == 98:
+                    stats["valid"] += 1
+                    stats["sources"][proxy_sources[proxy]]["valid"] += 1
+                    if stats["first_valid"] is None:
+                        stats["first_valid"] = time.time() - start_time
+                result_queue.task_done()
+            if updated_proxies and (len(updated_proxies) >= 200 or time.time() - last_flush >= PIPELINE_FLUSH_INTERVAL):
+                flush()
+                last_flush = time.time()
+
+    workers = [asyncio.create_task(writer())]
+    workers += [asyncio.create_task(validate_worker()) for _ in range(ASYNC_CONCURRENCY)]
+    if TCP_PREFILTER:
+        workers += [asyncio.create_task(prefilter_worker()) for _ in range(PREFILTER_CONCURRENCY)]
+
+    async def drain():
+        await ingest()
+        await prefilter_queue.join()
+        await validate_queue.join()
+        await result_queue.join()
+
+    drain_task = asyncio.create_task(drain())
+    while not drain_task.done():
+        if interrupted:
+            drain_task.cancel()
+            break
+        await asyncio.wait([drain_task], timeout=0.2)
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(drain_task, *workers, return_exceptions=True)
+    flush()
+    stats["summary"] = deduplicator.summary()
+    return proxy_types  # 未完成验证的代理 -> 验证类型
+
+def stream_validate(batches):
+    """
+    流式验证: 边接收代理批次边去重、预筛、验证并写入代理池
+
+    :param batches: 可迭代对象,产出 (名称, 代理列表或错误信息字符串, 验证类型)
+    :return: 统计信息字典(sources 为按批次名称分组的统计), 未完成验证的代理及其验证类型 {代理: 类型}(中断时非空)
+    """
+    stats = {"pages": 0, "errors": 0, "crawled": 0, "new": 0, "unreachable": 0,
+             "validated": 0, "valid": 0, "first_valid": None, "sources": {}}
+    _raise_nofile_limit(ASYNC_CONCURRENCY + PREFILTER_CONCURRENCY)
+    get_public_ip()
+    remaining_proxies = asyncio.run(_stream_pipeline(batches, stats))
+    return stats, remaining_proxies
+
+def crawl_all_sources():
+    """
+    并发爬取全部来源,经流式流水线边爬取边验证,验证结果实时写入代理池(支持中断恢复);
+    完成后更新各来源产出统计,产出过低的来源下次自动跳过
+    """
+    sources, skipped = select_sources(CRAWL_SOURCES, load_source_stats())
+    for source, yield_rate in skipped:
+        print(f"⏭️ 跳过低产出来源 {source['name']}: 平均每次请求 {yield_rate:.2f} 个有效代理")
+    setup_interrupt_handler()
+    start_time = time.time()
+    print(f"开始并发爬取 {len(sources)} 个来源,边爬取边验证...")
+    cache = FetchCache() if any(source.get("cache") for source in sources) else None
+    batches = ((source["name"], result, source["type"] or "auto")
+               for source, result in crawl_sources_concurrently(sources, cache=cache))
+    try:
+        stats, remaining_proxies = stream_validate(batches)
+        if interrupted:
+            # 未完成验证的代理连同各自来源的验证类型写入中断文件,下次从菜单1->1继续
+            if remaining_proxies:
+                types = set(remaining_proxies.values())
+                proxy_type = types.pop() if len(types) == 1 else remaining_proxies
+                save_interrupted_proxies(list(remaining_proxies), proxy_type, len(remaining_proxies), INTERRUPT_FILE)
+                print(f"\n⏸️ 爬取已中断！剩余 {len(remaining_proxies)} 个代理待验证")
+                print(f"📁 中断文件已更新: {INTERRUPT_FILE}")
+        # 已取走页面中的代理都已写入代理池或中断文件,此时才更新爬取缓存
+        if cache is not None:
+            cache.commit()
+        if interrupted:
             return
-        
-        # 正常完成验证
-        # 更新所有代理分数
-        for proxy, score in updated_proxies.items():
-            all_proxies[proxy] = score
-        
-        # 保存更新后的代理池
-        save_valid_proxies(all_proxies, proxy_types, OUTPUT_FILE)
-        
-        # 清理0分代理
-        removed_count = update_proxy_scores(OUTPUT_FILE)
-        
-        # 删除中断文件
-        delete_interrupt_file(INTERRUPT_FILE_EXISTING)
-        
-        # 最终统计
-        final_proxies, _ = load_proxies_from_file(OUTPUT_FILE)
-        final_count = len(final_proxies)
-
-        print(f"\n验证完成! 剩余有效代理: {final_count}/{original_count}")
-        print(f"已移除 {original_count - final_count} 个无效代理")
-        
-    except Exception as e:
-        if not interrupted:
-            print(f"验证过程中发生错误: {str(e)}")
+    finally:
+        restore_interrupt_handler()
 
+    print(f"\n✅ 并发爬取完成! 耗时 {time.time() - start_time:.1f}s, 页面 {stats['pages']}, 错误 {stats['errors']}")
+    print(stats["summary"])
+    if TCP_PREFILTER:
+        print(f"TCP预筛丢弃: {stats['unreachable']}")
+    print(f"验证成功: {stats['valid']}/{stats['new']}")
+    if stats["first_valid"] is not None:
+        print(f"首个有效代理写入代理池用时: {stats['first_valid']:.1f}s")
+    print("各来源产出:")
+    for name, counts in stats["sources"].items():
+        print(f"  {name}: 请求 {counts['requests']}, 错误 {counts['errors']}, 新代理 {counts['new']}, "
+              f"有效 {counts['valid']} (每次请求 {counts['valid'] / counts['requests']:.2f} 个)")
+    update_source_stats(stats["sources"])
+    print(f"代理池已更新至: {pool_location()}")
 
 def crawl_proxies():
     """爬取免费代理（添加中断恢复检查）"""
     # 首先检查是否有中断记录
-    remaining_proxies, proxy_type, original_count = load_interrupted_proxies(INTERRUPT_FILE)
+    remaining_proxies, proxy_type, original_count = load_interrupted_proxies(INTERRUPT_FILE, recover=False)
     if remaining_proxies:
         print(f"🔍 发现上次中断记录!")
         print(f"   剩余代理: {len(remaining_proxies)}/{original_count} 个")
-        print(f"   验证类型: {proxy_type}")
+        print(f"   验证类型: {describe_proxy_type(proxy_type)}")
+        print_journal_pending(INTERRUPT_FILE)
         print("\n请选择:")
         print("  y: 继续上次验证")
         print("  n: 删除记录并重新爬取")
@@ -607,6 +3482,9 @@ def crawl_proxies():
         
         if choice == 'y':
             print("继续上次验证...")
+            remaining_proxies, proxy_type, _ = load_interrupted_proxies(INTERRUPT_FILE)
+            if not remaining_proxies:
+                print("✅ 上次的代理已全部验证完成")
             return remaining_proxies, proxy_type
         elif choice == 'n':
             delete_interrupt_file(INTERRUPT_FILE)
@@ -615,428 +3493,328 @@ def crawl_proxies():
             print("返回上级菜单")
             return None, None
 
-    print("""已创建的可爬网站
-    1 ：https://proxy5.net/cn/free-proxy/china
-          备注:被封了,成功率 40%
-    2 ：https://www.89ip.cn/
-          备注:240个,成功率 10%
-    3 ：https://cn.freevpnnode.com/
-          备注:30个,成功率 3%
-    4 ：https://www.kuaidaili.com/free/inha/ 
-          备注:7600多页,成功率 5%
-    5 ：http://www.ip3366.net/
-          备注:100个,成功率 1%
-    6 ：https://proxypool.scrape.center/random
-          备注:随机的,成功率 40%
-    7 ：https://proxy.scdn.io/text.php
-          备注:12000多个,成功率 30%
-    8 ：https://proxyhub.me/zh/cn-http-proxy-list.html
-          备注:20个,成功率 0%
-    9 : https://github.com/databay-labs/free-proxy-list/raw/refs/heads/master/http.txt
-          备注:大约3000个,成功率 15%
-    10: https://github.com/databay-labs/free-proxy-list/raw/refs/heads/master/socks5.txt
-          备注:大约2000个,成功率 10%
-    11: https://github.com/databay-labs/free-proxy-list/raw/refs/heads/master/https.txt
-          备注:大约3000个,成功率 10%
-          
-    输入其他：退出
-    """)
+    print("已创建的可爬网站")
+    source_stats = load_source_stats()
+    for index, source in enumerate(SOURCE_REGISTRY, 1):
+        yield_rate = source_yield(source_stats.get(source["name"]))
+        print(f"    {index:<2}: {source_home(source)}")
+        print(f"          备注:{source['note']}" + ("" if yield_rate is None else f", 近期每次请求 {yield_rate:.2f} 个有效代理"))
+    excluded = [str(index) for index, source in enumerate(SOURCE_REGISTRY, 1) if not source.get("concurrent", True)]
+    print(f"    {len(SOURCE_REGISTRY) + 1}: 全部来源并发爬取(除{','.join(excluded)}外),边爬取边验证")
+    print("          备注:快代理只爬前10页,产出过低的来源自动跳过")
+    print("\n    输入其他：退出")
     scraper_choice = input("选择：").strip()
-    all_proxies = []  # 存储所有爬取的代理
-    by_type = ''  # 通过指定类型验证,默认为否
-
-    if scraper_choice == "1":
-        print('开始爬取:https://proxy5.net/cn/free-proxy/china')
-        error_count = 0
-        '''
-        <tr>.*?<td><strong>(?P<ip>.*?)</strong></td>.*?<td>(?P<port>.*?)</td>.*?</tr>
-        '''
-        proxy_list = ProxyScraper('https://proxy5.net/cn/free-proxy/china',
-                        "<tr>.*?<td><strong>(?P<ip>.*?)</strong></td>.*?<td>(?P<port>.*?)</td>.*?</tr>",
-                        ["ip", "port"]).scrape_proxies()
-        
-        if isinstance(proxy_list, list):
-            all_proxies.extend(proxy_list)
-        else:
-            error_count += 1
-        print(f'100%|██████████████████████████████████████████████████| 1/1  错误数:{error_count}')
-
-    elif scraper_choice == "2":
-        print('开始爬取:https://www.89ip.cn/')
-        error_count = 0
-        total_pages = 6
-        for page in range(1, total_pages+1):
-            if page == 1:
-                url = 'https://www.89ip.cn/'
-            else:
-                url = f'https://www.89ip.cn/index_{page}.html'
-
-            proxy_list = ProxyScraper(url,"<tr>.*?<td>(?P<ip>.*?)</td>.*?<td>(?P<port>.*?)</td>.*?</tr>",
-                            ["ip", "port"]).scrape_proxies()
-            if isinstance(proxy_list, list):
-                all_proxies.extend(proxy_list)
-            else:
-                error_count += 1
-
-            time.sleep(1)
-
-            # 计算进度百分比
-            percent = page * 100 // total_pages
-            # 计算进度条长度
-            completed = page * 50 // total_pages
-            remaining = 50 - completed
-            # 处理百分比显示的对齐
-            if percent < 10:
-                padding = "  "
-            elif percent < 100:
-                padding = " "
-            else:
-                padding = ""
-            # 更新进度条
-            print(f"\r{percent}%{padding}|{'█' * completed}{'-' * remaining}| {page}/{total_pages}  错误数:{error_count}", end="")
-            sys.stdout.flush()
-        print('\n')
-        
-    elif scraper_choice == "3":
-        print('\n开始爬取:https://cn.freevpnnode.com/')
-        error_count = 0
-        proxy_list = ProxyScraper("https://cn.freevpnnode.com/",
-                        '<tr>.*?<td>(?P<ip>.*?)</td>.*?<td>(?P<port>.*?)</td>.*?<td><span>.*?</span> <img src=".*?" width="20" height="20" .*? class="js_openeyes"></td>.*?</td>',
-                        ["ip", "port"]).scrape_proxies()
-        if isinstance(proxy_list, list):
-            all_proxies.extend(proxy_list)
-        else:
-            error_count += 1
-        print(f'100%|██████████████████████████████████████████████████| 1/1  错误数:{error_count}')
-
-    elif scraper_choice == "4":
-        error_count = 0
-        try:
-            print('信息:共约7000页,建议一次爬取数量不大于500页,防止被封')
-            start_page = int(input('爬取起始页（整数）：').strip())
-            end_page = int(input("爬取结束页（整数）:").strip())
-            if end_page < 1 or start_page < 1 or end_page > 7000 or start_page > 7000 or start_page > end_page:
-                print("不能小于1或大于7000,起始页不能大于结束页")
-                return
 
-            print('开始爬取:https://www.kuaidaili.com/free/inha/')
-            
-            for page in range(start_page, end_page + 1):
+    if scraper_choice == str(len(SOURCE_REGISTRY) + 1):
+        crawl_all_sources()
+        return None, None
+    if not scraper_choice.isdigit() or not 1 <= int(scraper_choice) <= len(SOURCE_REGISTRY):   # 退出
+        print("退出")
+        return None, None
 
-                proxy_list = ProxyScraper(f"https://www.kuaidaili.com/free/inha/{page}/",
-                                '{"ip": "(?P<ip>.*?)", "last_check_time": ".*?", "port": "(?P<port>.*?)", "speed": .*?, "location": ".*?"}',
-                                ["ip", "port"]).scrape_proxies()
-                if isinstance(proxy_list, list):
-                    all_proxies.extend(proxy_list)
-                else:
-                    error_count += 1
-
-                time.sleep(2)
-
-                # 计算进度百分比
-                current_page = page - start_page + 1
-                total_pages = end_page - start_page + 1
-                percent = current_page * 100 // total_pages
-                # 计算进度条长度
-                completed = current_page * 50 // total_pages
-                remaining = 50 - completed
-                # 处理百分比显示的对齐
-                if percent < 10:
-                    padding = "  "
-                elif percent < 100:
-                    padding = " "
-                else:
-                    padding = ""
-                # 更新进度条
-                print(f"\r{percent}%{padding}|{'█' * completed}{'-' * remaining}| {current_page}/{total_pages}  错误数:{error_count}", end="")
-                sys.stdout.flush()
-            print('\n')
-        except:
-            print("输入错误，请输入整数")
-
-    elif scraper_choice == "5":
-
-        print('\n开始爬取:http://www.ip3366.net/?stype=1')
-        total_pages = 7
-        error_count = 0
-        for page in range(1, total_pages + 1):
-            proxy_list = ProxyScraper(f'http://www.ip3366.net/?stype=1&page={page}',
-                            '<tr>.*?<td>(?P<ip>.*?)</td>.*?<td>(?P<port>.*?)</td>.*?</tr>', ['ip', 'port']).scrape_proxies()
-            if isinstance(proxy_list, list):
-                all_proxies.extend(proxy_list)
-            else:
-                error_count += 1
-
-            time.sleep(1)
-
-            # 计算进度百分比
-            percent = page * 100 // total_pages
-            # 计算进度条长度
-            completed = page * 50 // total_pages
-            remaining = 50 - completed
-            # 处理百分比显示的对齐
-            if percent < 10:
-                padding = "  "
-            elif percent < 100:
-                padding = " "
-            else:
-                padding = ""
-            # 更新进度条
-            print(f"\r{percent}%{padding}|{'█' * completed}{'-' * remaining}| {page}/{total_pages}  错误数:{error_count}", end="")
-            sys.stdout.flush()
-        print('\n')
+    source = SOURCE_REGISTRY[int(scraper_choice) - 1]
+    urls = ask_source_urls(source)
+    if not urls:
+        return None, None
+    cache = FetchCache() if source.get("cache") else None
+    all_proxies = crawl_single_source(source, urls, cache)
+    by_type = source["type"]   # 指定类型,空字符串为自动检测
+    new_proxies = filter_proxies(all_proxies)
+    if cache is not None:
+        # 先把新代理写入中断文件再更新爬取缓存,之后进程意外退出时这些代理仍可从中断文件继续验证
+        if new_proxies:
+            save_interrupted_proxies(new_proxies, by_type or "auto", len(new_proxies), INTERRUPT_FILE)
+            print(f"📁 已创建中断恢复文件: {INTERRUPT_FILE}")
+        cache.commit()
+    return new_proxies, by_type   # 返回筛选后的代理列表,是否指定类型和指定的类型
 
-    elif scraper_choice == "6":
-        try:
-            by_type = 'http'   # 默认用http
+def ask_source_urls(source):
+    """菜单单独爬取时询问页码范围或请求次数,返回URL列表,输入无效时返回None"""
+    try:
+        if source.get("repeat"):
             count = int(input("爬取个数(整数)：").strip())
             if count < 1:
                 print("数量必须大于0")
-                return None,None
-
-            print(f"\n开始爬取 {count} 个代理...")
-        #     try:
-        #         import aiohttp   # 协程
-        #         import asyncio
-        #         semaphore = asyncio.Semaphore(20)  # 最大并发
-        #         timeout = aiohttp.ClientTimeout(total=50)  # 超时(给服务器足够响应时间)
-        #         async def fetch_proxy(url):
-                    
-        #             async with aiohttp.ClientSession(timeout=timeout) as session:
-        #                 async with session.get(url=url) as response:
-        #                     if response.status == 200:
-        #                         proxy = await response.text()
-        #                         print(proxy)
-        #                         return proxy
-                
-        #         async def fetch_proxies_main():
-        #             url = 'https://proxypool.scrape.center/random'
-        #             async with semaphore:
-        #                 tasks = [asyncio.create_task(fetch_proxy(url=url)) for _ in range(count)]
-        #                 results  = await asyncio.gather(*tasks, return_exceptions=True)
-                    
-        #             return results
-        #         # proxy = requests.get('https://proxypool.scrape.center/random', timeout=timeout).text.strip()
-        #         proxies = asyncio.run(fetch_proxies_main())
-        #         if len(proxies) > 0:
-        #             all_proxies = proxies
-        #             # print(all_proxies)
-        #     except:
-        #         pass
-
-        #     print("\n爬取完成！")
-        # except:
-        #     print("输入错误")
-            try:
-                # 适合用协程
-                import aiohttp
-                import asyncio
-                
-                async def fetch_proxy(session, url, semaphore):
-                    async with semaphore:
-                        try:
-                            async with session.get(url) as response:
-                                if response.status == 200:
-                                    proxy = await response.text()
-                                    print(proxy)
-                                    return proxy.strip()
-                        except:
-                            return None
-                
-                async def fetch_proxies_main():
-                    semaphore = asyncio.Semaphore(20)   # 最大并发
-                    timeout = aiohttp.ClientTimeout(total=50)   # 超时(给服务器足够响应时间)
-                    
-                    async with aiohttp.ClientSession(timeout=timeout) as session:
-                        tasks = []
-                        for _ in range(count):
-                            url = 'https://proxypool.scrape.center/random'
-                            task = fetch_proxy(session, url, semaphore)
-                            tasks.append(task)
-                        
-                        results = await asyncio.gather(*tasks, return_exceptions=True)
-                        return [r for r in results if r and isinstance(r, str) and ':' in r]
-                
-                proxies = asyncio.run(fetch_proxies_main())
-                if proxies:
-                    all_proxies.extend(proxies)
-                    
-            except ImportError:
-                print("aiohttp 未安装，使用同步请求...")
-                # 同步备选方案
-                for _ in range(count):
-                    try:
-                        proxy = requests.get('https://proxypool.scrape.center/random', timeout=30).text.strip()
-                        if proxy and ':' in proxy:
-                            all_proxies.append(proxy)
-                    except:
-                        continue
+                return None
+            return source_urls(source, count=count)
+        if "max_page" in source:
+            max_page = source["max_page"]
+            print(f'信息:共约{max_page}页,建议一次爬取数量不大于500页,防止被封')
+            start_page = int(input('爬取起始页（整数）：').strip())
+            end_page = int(input("爬取结束页（整数）:").strip())
+            if not 1 <= start_page <= end_page <= max_page:
+                print(f"不能小于1或大于{max_page},起始页不能大于结束页")
+                return None
+            return source_urls(source, start_page, end_page)
+    except ValueError:
+        print("输入错误，请输入整数")
+        return None
+    return source_urls(source)
 
-            print(f"\n爬取完成！")
-        except ValueError:
-            print("输入错误")
-            return None, None
+def print_progress(done, total, error_count):
+    """在同一行刷新进度条"""
+    completed = done * 50 // total
+    print(f"\r{f'{done * 100 // total}%':<4}|{'█' * completed}{'-' * (50 - completed)}| {done}/{total}  错误数:{error_count}",
+          end="")
+    sys.stdout.flush()
 
-    elif scraper_choice == '7':
-        print("\n开始爬取:https://proxy.scdn.io/text.php")
-        error_count = 0
-        url = 'https://proxy.scdn.io/text.php'
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3",
-            'Referer':'https://proxy.scdn.io/'
-        }
-        try:
-            response = requests.get(url,headers=headers)
-            result = response.text.split("\n")
-            proxy_list = []
-            for proxy in result:
-                if len(result) == 0:
-                    print('没有代理可以爬取')
-                else:
-                    proxy_list.append(proxy.strip())
-            if isinstance(proxy_list, list):
-                all_proxies.extend(proxy_list)
-            else:
-                error_count += 1
-            print(f'100%|██████████████████████████████████████████████████| 1/1  错误数:{error_count}')
-        except Exception as e:
-            print(f'爬取失败: {str(e)}')
-    
-    elif scraper_choice == '8':
-        print('\n开始爬取:https://proxyhub.me/zh/cn-http-proxy-list.html')
-        error_count = 0
-        proxy_list = ProxyScraper("https://proxyhub.me/zh/cn-http-proxy-list.html",
-                        r'<tr>\s*<td>(?P<ip>\d+\.\d+\.\d+\.\d+)</td>\s*<td>(?P<port>\d+)</td>',
-                        ["ip", "port"]).scrape_proxies()
-        if isinstance(proxy_list, list):
-            all_proxies.extend(proxy_list)
+def crawl_single_source(source, urls, cache=None):
+    """
+    菜单单独爬取一个来源(同样由 crawl_sources_concurrently 执行),显示进度条
+
+    :param cache: FetchCache, 见 crawl_sources_concurrently
+    :return: 爬取到的代理列表
+    """
+    print(f"\n开始爬取:{source_home(source)}")
+    all_proxies = []
+    error_count = 0
+    for done, (_, result) in enumerate(crawl_sources_concurrently([source], urls={source["name"]: urls}, cache=cache), 1):
+        if isinstance(result, list):
+            all_proxies.extend(result)
         else:
             error_count += 1
-        print(f'100%|██████████████████████████████████████████████████| 1/1  错误数:{error_count}')
-
-
-    # https://github.com/databay-labs/free-proxy-list/raw/refs/heads/master/http.txt -> https://raw.githubusercontent.com/databay-labs/free-proxy-list/refs/heads/master/http.txt
-    # https://github.com/databay-labs/free-proxy-list/raw/refs/heads/master/socks5.txt -> https://raw.githubusercontent.com/databay-labs/free-proxy-list/refs/heads/master/socks5.txt
-    # https://github.com/databay-labs/free-proxy-list/raw/refs/heads/master/https.txt -> https://raw.githubusercontent.com/databay-labs/free-proxy-list/refs/heads/master/https.txt
-    elif scraper_choice == '9':
-        by_type = 'http'   # 默认用http
-        print('\n开始爬取:https://raw.githubusercontent.com/databay-labs/free-proxy-list/refs/heads/master/http.txt')
-        error_count = 0
-        url = 'https://raw.githubusercontent.com/databay-labs/free-proxy-list/refs/heads/master/http.txt'
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
-        }
-        try:
-            response = requests.get(url,headers=headers)
-            result = response.text.split("\n")
-            proxy_list = []
-            for proxy in result:
-                if len(result) == 0:
-                    print('没有代理可以爬取')
-                else:
-                    proxy_list.append(proxy.strip())
-            if isinstance(proxy_list, list):
-                all_proxies.extend(proxy_list)
-            else:
-                error_count += 1
-            print(f'100%|██████████████████████████████████████████████████| 1/1  错误数:{error_count}')
-        except Exception as e:
-            print(f'爬取失败: {str(e)}')
-
-    elif scraper_choice == '10':
-        by_type = 'socks5'   # 默认用socks5
-        print('\n开始爬取:https://raw.githubusercontent.com/databay-labs/free-proxy-list/refs/heads/master/socks5.txt')
-        error_count = 0
-        url = 'https://raw.githubusercontent.com/databay-labs/free-proxy-list/refs/heads/master/socks5.txt'
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
-        }
-        try:
-            response = requests.get(url,headers=headers)
-            result = response.text.split("\n")
-            proxy_list = []
-            for proxy in result:
-                if len(result) == 0:
-                    print('没有代理可以爬取')
-                else:
-                    proxy_list.append(proxy.strip())
-            if isinstance(proxy_list, list):
-                all_proxies.extend(proxy_list)
-            else:
-                error_count += 1
-            print(f'100%|██████████████████████████████████████████████████| 1/1  错误数:{error_count}')
-        except Exception as e:
-            print(f'爬取失败: {str(e)}')
-
-    elif scraper_choice == '11':
-        by_type = 'http'   # 默认用http
-        print('\n开始爬取:https://raw.githubusercontent.com/databay-labs/free-proxy-list/refs/heads/master/https.txt')
-        error_count = 0
-        url = 'https://raw.githubusercontent.com/databay-labs/free-proxy-list/refs/heads/master/https.txt'
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
-        }
-        try:
-            response = requests.get(url,headers=headers)
-            result = response.text.split("\n")
-            proxy_list = []
-            for proxy in result:
-                if len(proxy) == 0:
-                    print('没有代理可以爬取')
-                else:
-                    proxy_list.append(proxy.strip())
-            if isinstance(proxy_list, list):
-                all_proxies.extend(proxy_list)
+        print_progress(done, len(urls), error_count)
+    print('\n')
+    return all_proxies
+
+# ============加权随机抽取 - Score-weighted random selection
+# 每种类型一棵树状数组(Fenwick tree)保存各代理的权重(分数),抽取和更新权重都是O(log n),
+# 常驻内存,不必每次提取都重新读取代理池;高分代理被抽中的概率更高,但不会所有使用者都拿到同一批代理
+
+class FenwickTree:
+    """
+    树状数组: 单点更新、前缀和、按前缀和定位均为O(log n)
+
+    :param size: 元素个数(下标0 ~ size-1)
+    """
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    @classmethod
+    def from_weights(cls, weights):
+        """O(n)建树"""
+        fenwick = cls(len(weights))
+        tree = fenwick.tree
+        for i, weight in enumerate(weights, 1):
+            tree[i] += weight
+            parent = i + (i & -i)
+            if parent <= fenwick.size:
+                tree[parent] += tree[i]
+        return fenwick
+
+    def add(self, index, delta):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index):
+        """下标0 ~ index-1 的权重和"""
+        total = 0
+        i = index
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, target):
+        """找到前缀和第一次超过target的下标(0 <= target < 总权重)"""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+class _WeightedIndex:
+    """
+    单一类型的加权索引: 代理列表 + 权重列表 + 树状数组,空间不足时容量翻倍重建
+
+    移除的代理权重置0但保留下标(抽取时临时置0也依赖这一点), 由 compact 重建时才真正删除
+    """
+    def __init__(self, items=()):
+        self.rebuild(items)
+
+    def rebuild(self, items):
+        """用 [(proxy, 权重)] 重建索引, 权重<=0的丢弃"""
+        items = [(proxy, weight) for proxy, weight in items if weight > 0]
+        self.proxies = [proxy for proxy, _ in items]
+        self.weights = [weight for _, weight in items]
+        self.positions = {proxy: pos for pos, proxy in enumerate(self.proxies)}  # proxy -> 下标
+        self.tree = FenwickTree.from_weights(self.weights)
+        self.total = sum(self.weights)
+        self.zeros = 0  # 权重为0的下标数
+
+    def set_weight(self, proxy, weight):
+        pos = self.positions.get(proxy)
+        if pos is None:
+            if weight <= 0:
+                return
+            pos = self.positions[proxy] = len(self.proxies)
+            self.proxies.append(proxy)
+            self.weights.append(0)
+            self.zeros += 1
+            if pos >= self.tree.size:
+                self.tree = FenwickTree.from_weights(self.weights + [0] * max(16, len(self.weights)))
+        old = self.weights[pos]
+        delta = weight - old
+        if delta:
+            self.weights[pos] = weight
+            self.tree.add(pos, delta)
+            self.total += delta
+            self.zeros += (weight == 0) - (old == 0)
+
+    def compact(self):
+        """
+        删除权重为0的代理并重建树状数组, O(n)
+
+        :return: 被删除的代理
+        """
+        removed = [proxy for proxy, weight in zip(self.proxies, self.weights) if weight <= 0]
+        self.rebuild(zip(self.proxies, self.weights))
+        return removed
+
+    def draw(self, rng):
+        """按权重随机抽一个下标"""
+        return self.tree.find(rng.random() * self.total)
+
+class ProxySelector:
+    """
+    按分数加权随机抽取代理(线程安全)
+
+    :param rows: 初始代理 [(proxy, proxy_type, score)]
+    :param seed: 随机种子(测试时可固定)
+    """
+    def __init__(self, rows=(), seed=None):
+        self.indexes = {}  # 类型 -> _WeightedIndex
+        self.proxy_types = {}
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        grouped = {}
+        for proxy, proxy_type, score in rows:
+            if score > 0:
+                grouped.setdefault(proxy_type, []).append((proxy, score))
+                self.proxy_types[proxy] = proxy_type
+        for proxy_type, items in grouped.items():
+            self.indexes[proxy_type] = _WeightedIndex(items)
+
+    def update(self, proxy, proxy_type, score, keep_higher=False):
+        """
+        更新代理权重(新增/修改/分数<=0时移除),O(log n)
+
+        :param keep_higher: 为True时已有代理只在新分数更高时才更新(与合并新代理的规则一致)
+        """
+        with self.lock:
+            old_type = self.proxy_types.get(proxy)
+            pos = None
+            if old_type is not None:
+                old_index = self.indexes[old_type]
+                pos = old_index.positions.get(proxy)
+                if pos is not None:
+                    if keep_higher and old_index.weights[pos] >= score:
+                        return
+                    if old_type != proxy_type:
+                        old_index.set_weight(proxy, 0)
+                        self._compact_if_sparse(old_type)
+            index = self.indexes.setdefault(proxy_type, _WeightedIndex())
+            index.set_weight(proxy, max(0, score))
+            # 分数<=0的新代理不占下标, 只记录占有下标的代理的类型
+            if proxy in index.positions:
+                self.proxy_types[proxy] = proxy_type
+            elif pos is None:
+                self.proxy_types.pop(proxy, None)
+            self._compact_if_sparse(proxy_type)
+
+    def _compact_if_sparse(self, proxy_type):
+        """已移除的代理超过 SELECTOR_COMPACT_RATIO 时重建该类型的索引, 均摊O(1), 长期运行时索引不再只增不减"""
+        index = self.indexes[proxy_type]
+        if index.zeros <= SELECTOR_COMPACT_RATIO * len(index.proxies):
+            return
+        for proxy in index.compact():
+            if self.proxy_types.get(proxy) == proxy_type:
+                del self.proxy_types[proxy]
+
+    def sample(self, proxy_type="all", n=1):
+        """
+        按分数加权随机抽取最多n个不重复的代理
+
+        :return: [(proxy, proxy_type)]
+        """
+        with self.lock:
+            if proxy_type == "all":
+                candidates = [index for index in self.indexes.values() if index.total > 0]
+                type_names = [name for name, index in self.indexes.items() if index.total > 0]
             else:
-                error_count += 1
-            print(f'100%|██████████████████████████████████████████████████| 1/1  错误数:{error_count}')
-        except Exception as e:
-            print(f'爬取失败: {str(e)}')
+                index = self.indexes.get(proxy_type)
+                candidates = [index] if index is not None and index.total > 0 else []
+                type_names = [proxy_type]
+
+            result = []
+            drawn = []  # 抽中的代理暂时将权重置0实现不重复抽取,结束后恢复
+            try:
+                while len(result) < n:
+                    totals = [index.total for index in candidates]
+                    grand_total = sum(totals)
+                    if grand_total <= 0:
+                        break
+                    # 先按各类型总权重选类型,再在类型内抽取
+                    target = self.rng.random() * grand_total
+                    k = 0
+                    while k < len(totals) - 1 and target >= totals[k]:
+                        target -= totals[k]
+                        k += 1
+                    index = candidates[k]
+                    pos = index.draw(self.rng)
+                    drawn.append((index, pos, index.weights[pos]))
+                    index.set_weight(index.proxies[pos], 0)
+                    result.append((index.proxies[pos], type_names[k]))
+            finally:
+                for index, pos, weight in drawn:
+                    index.set_weight(index.proxies[pos], weight)
+            return result
 
-    # TODO https://github.com/zloi-user/hideip.me/raw/refs/heads/master/http.txt
-    # TODO https://github.com/zloi-user/hideip.me/raw/refs/heads/master/https.txt
-    # TODO https://github.com/zloi-user/hideip.me/raw/refs/heads/master/socks4.txt
-    # TODO https://github.com/zloi-user/hideip.me/raw/refs/heads/master/socks5.txt
+_proxy_selector = None
 
+def get_proxy_selector():
+    """获取常驻内存的加权抽取器(进程内单例,首次使用时从代理池加载)"""
+    global _proxy_selector
+    if _proxy_selector is None:
+        _proxy_selector = ProxySelector(get_pool_store().query("all", min_score=1))
+    return _proxy_selector
 
-    # TODO https://raw.githubusercontent.com/r00tee/Proxy-List/main/Https.txt
-    # TODO https://raw.githubusercontent.com/r00tee/Proxy-List/main/Socks4.txt
-    # TODO https://raw.githubusercontent.com/r00tee/Proxy-List/main/Socks5.txt
+def notify_score_updates(rows, keep_higher=False):
+    """代理池分数变化时同步到已加载的加权抽取器 rows: [(proxy, proxy_type, score)]"""
+    if _proxy_selector is not None:
+        for proxy, proxy_type, score in rows:
+            _proxy_selector.update(proxy, proxy_type, score, keep_higher)
 
-    else:   # 退出
-        print("退出")
-        return None, None
-    
-    return filter_proxies(all_proxies), by_type   # 返回筛选后的代理列表,是否指定类型和指定的类型
+EXTRACT_STRATEGIES = {"top": "score", "fastest": "latency", "quality": "quality"}  # 提取方式 -> query的排序方式
 
-def extract_proxies_by_type(num, proxy_type="all"):
+def extract_proxies_by_type(num, proxy_type="all", strategy="top", max_latency=None, target=None, min_anonymity=None):
     """
     按类型提取指定数量的代理，优先提取分高的
     
     :param num: 数量
     :param proxy_type: 代理类型 - "http", "socks4", "socks5", "all"
+    :param strategy: "top"(分数最高的num个), "fastest"(响应时间EWMA最低的num个),
+                     "quality"(分数按延迟折算后最高的num个, 见proxy_quality) 或 "weighted"(按分数加权随机抽取,分散各使用者的负载)
+    :param max_latency: 只提取响应时间EWMA不超过该值(秒)的代理(没有延迟记录的代理不会被提取), weighted方式不支持
+    :param target: 只提取最近一次检查通过该验证目标(VALIDATION_TARGETS)的代理, 此时max_latency和"fastest"
+                   使用该目标的响应时间, weighted方式不支持
+    :param min_anonymity: 最低匿名级别 "anonymous"(普匿及高匿) 或 "elite"(只要高匿), 见 ANONYMITY_LEVELS, weighted方式不支持
     :return: 代理列表
     """
-    proxies, proxy_types = load_proxies_from_file(OUTPUT_FILE)
-    
-    # 按类型筛选
-    if proxy_type != "all":
-        filtered_proxies = {k: v for k, v in proxies.items() 
-                          if proxy_types.get(k) == proxy_type}
-    else:
-        filtered_proxies = proxies
-
-    # 按分数降序排序
-    sorted_proxies = sorted(filtered_proxies.items(), key=lambda x: x[1], reverse=True)
-
-    result = []
-    for proxy, score in sorted_proxies:
-        if len(result) >= num:
-            break
-        actual_type = proxy_types.get(proxy, "http")
-        result.append(f"{actual_type}://{proxy}")
+    if strategy == "weighted":
+        return [f"{actual_type}://{proxy}" for proxy, actual_type in get_proxy_selector().sample(proxy_type, num)]
 
-    return result
+    # 按类型筛选并排序(sqlite后端走索引,只取前num个)
+    rows = get_pool_store().query(proxy_type, min_score=1, limit=num, order=EXTRACT_STRATEGIES.get(strategy, "score"),
+                                  max_latency=max_latency, target=target, min_anonymity=min_anonymity)
+    return [f"{actual_type}://{proxy}" for proxy, actual_type, score in rows]
 
 def extract_proxies_menu():
     """提取代理菜单（支持按类型筛选）"""
@@ -1062,8 +3840,32 @@ def extract_proxies_menu():
         }
         
         proxy_type = type_map.get(type_choice, "all")
+
+        print("\n选择提取方式:")
+        print("1. 分数最高优先")
+        print("2. 按分数加权随机")
+        print("3. 响应最快优先")
+        print("4. 综合质量(分数按响应时间折算)优先")
+        strategy = {"2": "weighted", "3": "fastest", "4": "quality"}.get(input("请选择(1-4): ").strip(), "top")
+
+        max_latency = None
+        target = None
+        min_anonymity = None
+        if strategy != "weighted":
+            print("\n最低匿名级别:")
+            print("1. 不限")
+            print("2. 普匿及以上")
+            print("3. 高匿")
+            min_anonymity = {"2": "anonymous", "3": "elite"}.get(input("请选择(1-3): ").strip())
+            if VALIDATION_TARGETS:
+                target = input(f"只提取通过该验证目标的代理({'/'.join(VALIDATION_TARGETS)},直接回车不限制): ").strip() or None
+                if target is not None and target not in VALIDATION_TARGETS:
+                    print(f"未配置验证目标: {target}")
+                    return
+            max_latency_input = input("最大响应时间(秒,直接回车不限制): ").strip()
+            max_latency = float(max_latency_input) if max_latency_input else None
         
-        proxies = extract_proxies_by_type(count, proxy_type)
+        proxies = extract_proxies_by_type(count, proxy_type, strategy, max_latency, target, min_anonymity)
         if not proxies:
             print("代理池中没有可用代理")
             return
@@ -1085,52 +3887,651 @@ def extract_proxies_menu():
     except ValueError:
         print("请输入有效的数字")
 
+# ============代理池统计 - Pool statistics
+# 在 ProxyPool 的列上一次性算出类型数量、分数分布、响应时间分位数和加入/检查时间分布,结果可直接输出为JSON
+
+STATS_PERCENTILES = (50, 90, 95, 99)  # 统计的响应时间分位数
+STATS_AGE_EDGES = (3600, 86400, 7 * 86400, 30 * 86400)  # 时间分布的分界(秒)
+STATS_AGE_LABELS = ("lt_1h", "1h_1d", "1d_7d", "7d_30d", "gt_30d")  # 各区间在JSON中的键, 另有 unknown(时间未记录)
+STATS_AGE_NAMES = {"lt_1h": "1小时内", "1h_1d": "1小时~1天", "1d_7d": "1~7天", "7d_30d": "7~30天",
+                   "gt_30d": "30天以上", "unknown": "未记录"}
+
+LATENCY_BINS = 65536  # 响应时间按毫秒分桶(与检查历史相同的精度), 超过65.535秒的计入最后一桶
+
+def _latency_summary(histogram):
+    """
+    由毫秒直方图计算响应时间分位数(最近秩: 第 ceil(q% * n) 小的值)
+
+    :param histogram: 长度 LATENCY_BINS 的各毫秒数量(numpy数组或列表)
+    """
+    if numpy is not None and isinstance(histogram, numpy.ndarray):
+        cumulative = numpy.cumsum(histogram)
+        total = int(cumulative[-1])
+        if total == 0:
+            return {"samples": 0}
+        ranks = [max(1, math.ceil(q * total / 100)) for q in STATS_PERCENTILES]
+        points = numpy.searchsorted(cumulative, ranks)
+    else:
+        total = sum(histogram)
+        if total == 0:
+            return {"samples": 0}
+        ranks = iter([max(1, math.ceil(q * total / 100)) for q in STATS_PERCENTILES])
+        points = []
+        rank = next(ranks)
+        seen = 0
+        for milliseconds, count in enumerate(histogram):
+            seen += count
+            while rank is not None and seen >= rank:
+                points.append(milliseconds)
+                rank = next(ranks, None)
+            if rank is None:
+                break
+    summary = {"samples": total}
+    summary.update({f"p{q}": int(point) / 1000 for q, point in zip(STATS_PERCENTILES, points)})
+    return summary
+
+def _age_distribution(counts):
+    """:param counts: 各区间的数量, 最后一个为 unknown"""
+    return dict(zip(STATS_AGE_LABELS + ("unknown",), (int(count) for count in counts)))
+
+def _pool_stats_numpy(pool, now):
+    columns = pool.columns()
+    types = columns["types"].astype(numpy.intp)
+    # 类型和分数合成一个下标,一次bincount同时得到各类型数量和分数分布
+    histogram = numpy.bincount(types * 256 + columns["scores"], minlength=len(PROXY_TYPES) * 256)
+    histogram = histogram.reshape(len(PROXY_TYPES), 256)
+    counts = histogram.sum(axis=1)
+    score_sums = histogram @ numpy.arange(256)
+    # 响应时间同样按 类型 x 毫秒 一次bincount, 分位数由累计数量直接查出, 不需要排序
+    latencies = columns["latencies"]
+    has_latency = ~numpy.isnan(latencies)
+    milliseconds = numpy.minimum(latencies[has_latency].astype(numpy.float64) * 1000, LATENCY_BINS - 1)
+    latency_histogram = numpy.bincount(types[has_latency] * LATENCY_BINS + milliseconds.astype(numpy.intp),
+                                       minlength=len(PROXY_TYPES) * LATENCY_BINS)
+    latency_histogram = latency_histogram.reshape(len(PROXY_TYPES), LATENCY_BINS)
+
+    def ages(timestamps):
+        known = timestamps > 0
+        elapsed = now - timestamps[known]
+        at_least = [int(known.sum())] + [int((elapsed >= edge).sum()) for edge in STATS_AGE_EDGES]
+        return _age_distribution([at_least[i] - at_least[i + 1] for i in range(len(STATS_AGE_EDGES))]
+                                 + [at_least[-1], len(timestamps) - at_least[0]])
+
+    stats_types = {}
+    for type_id, proxy_type in enumerate(PROXY_TYPES):
+        if counts[type_id] == 0:
+            continue
+        scores = numpy.flatnonzero(histogram[type_id])[::-1]
+        stats_types[proxy_type] = {
+            "count": int(counts[type_id]),
+            "avg_score": round(float(score_sums[type_id]) / counts[type_id], 2),
+            "scores": {int(score): int(histogram[type_id, score]) for score in scores},
+            "latency": _latency_summary(latency_histogram[type_id]),
+        }
+    return {
+        "total": len(pool),
+        "types": stats_types,
+        "latency": _latency_summary(latency_histogram.sum(axis=0)),
+        "added": ages(columns["added_at"]),
+        "last_checked": ages(columns["last_checked"]),
+    }
+
+def _pool_stats_python(pool, now):
+    histograms = [[0] * 256 for _ in PROXY_TYPES]
+    latency_histograms = [[0] * LATENCY_BINS for _ in PROXY_TYPES]
+    added = [0] * (len(STATS_AGE_LABELS) + 1)
+    checked = [0] * (len(STATS_AGE_LABELS) + 1)
+    for type_id, score, latency, added_at, last_checked in zip(
+            pool.types, pool.scores, pool.latencies, pool.added_at, pool.last_checked):
+        histograms[type_id][score] += 1
+        if not math.isnan(latency):
+            latency_histograms[type_id][int(min(latency * 1000, LATENCY_BINS - 1))] += 1
+        added[bisect.bisect_right(STATS_AGE_EDGES, now - added_at) if added_at > 0 else -1] += 1
+        checked[bisect.bisect_right(STATS_AGE_EDGES, now - last_checked) if last_checked > 0 else -1] += 1
+
+    stats_types = {}
+    for type_id, proxy_type in enumerate(PROXY_TYPES):
+        count = sum(histograms[type_id])
+        if count == 0:
+            continue
+        stats_types[proxy_type] = {
+            "count": count,
+            "avg_score": round(sum(score * n for score, n in enumerate(histograms[type_id])) / count, 2),
+            "scores": {score: histograms[type_id][score] for score in range(255, -1, -1) if histograms[type_id][score]},
+            "latency": _latency_summary(latency_histograms[type_id]),
+        }
+    return {
+        "total": len(pool),
+        "types": stats_types,
+        "latency": _latency_summary([sum(counts) for counts in zip(*latency_histograms)]),
+        "added": _age_distribution(added),
+        "last_checked": _age_distribution(checked),
+    }
+
+def pool_stats(pool=None, now=None):
+    """
+    代理池统计(安装numpy时在列上向量化计算, 否则逐行遍历一次)
+
+    :param pool: ProxyPool, 默认从代理池存储加载
+    :param now: 计算时间分布的当前时间
+    :return: 可直接序列化为JSON的字典:
+             total, types{类型: count/avg_score/scores{分数: 数量}/latency}, latency{samples, p50, p90, p95, p99},
+             added / last_checked {区间: 数量}, 从存储加载时另有 targets{验证目标: checked/passed/avg_latency}
+             和 anonymity{匿名级别: 数量}
+    """
+    store = get_pool_store() if pool is None else None
+    pool = store.load_pool() if store is not None else pool
+    now = time.time() if now is None else now
+    stats = _pool_stats_numpy(pool, now) if numpy is not None else _pool_stats_python(pool, now)
+    if store is not None:
+        stats["targets"] = store.target_stats()
+        stats["anonymity"] = store.anonymity_counts()
+    stats["generated_at"] = round(now, 3)
+    return stats
+
 def show_proxy_pool_status():
-    """显示代理池状态（按类型和分数统计）"""
-    proxies, proxy_types = load_proxies_from_file(OUTPUT_FILE)
-    total = len(proxies)
+    """显示代理池状态（按类型和分数统计,响应时间分位数,加入和检查时间分布）"""
+    stats = pool_stats()
+    total = stats["total"]
     
     if total == 0:
         print("代理池为空")
         return
 
-    # 按类型分组
-    type_groups = {}
-    for proxy, score in proxies.items():
-        proxy_type = proxy_types.get(proxy, "http")
-        if proxy_type not in type_groups:
-            type_groups[proxy_type] = []
-        type_groups[proxy_type].append((proxy, score))
-
-    print(f"\n代理池状态 ({OUTPUT_FILE}):")
+    print(f"\n代理池状态 ({pool_location()}):")
     print(f"总代理数量: {total}")
     
     # 按类型显示统计
-    for proxy_type, proxy_list in type_groups.items():
-        type_count = len(proxy_list)
-        print(f"\n{proxy_type.upper()} 代理: {type_count}个")
-        
-        # 统计分数分布
-        score_count = {}
-        for _, score in proxy_list:
-            score_count[score] = score_count.get(score, 0) + 1
+    for proxy_type, item in stats["types"].items():
+        print(f"\n{proxy_type.upper()} 代理: {item['count']}个 (平均 {item['avg_score']}分)")
         
-        # 按分数排序显示
-        sorted_scores = sorted(score_count.items(), key=lambda x: x[0], reverse=True)
-        for score, count in sorted_scores:
+        # 按分数从高到低显示分布
+        for score, count in item["scores"].items():
             print(f"  {score}分: {count}个")
+        if item["latency"]["samples"]:
+            print(f"  响应时间: p50 {item['latency']['p50']}s | p95 {item['latency']['p95']}s "
+                  f"({item['latency']['samples']}个有记录)")
+
+    latency = stats["latency"]
+    if latency["samples"]:
+        print(f"\n响应时间: " + " | ".join(f"p{q} {latency[f'p{q}']}s" for q in STATS_PERCENTILES)
+              + f" ({latency['samples']}个有记录)")
+    for key, title in (("added", "加入时间"), ("last_checked", "上次检查")):
+        print(f"{title}: " + ", ".join(f"{STATS_AGE_NAMES[label]} {count}个"
+                                        for label, count in stats[key].items() if count))
+    anonymity = stats["anonymity"]
+    print("匿名级别: " + ", ".join(f"{ANONYMITY_NAMES.get(level, '未知')} {anonymity[level]}个"
+                                   for level in (*reversed(ANONYMITY_LEVELS), "unknown") if anonymity.get(level)))
+    for target, item in stats["targets"].items():
+        average = f", 平均响应时间 {item['avg_latency']}s" if item["avg_latency"] is not None else ""
+        print(f"验证目标 {target}: 通过 {item['passed']}/{item['checked']}{average}")
         
     print('='*40)
     print(f'总计: {total} 个代理')
+
+def csv_import_export_menu():
+    """代理池与CSV互相导入导出(兼容旧版本的CSV代理池文件)"""
+    store = get_pool_store()
+    print(f"""当前代理池: {pool_location()}
+        1: 导出代理池到CSV
+        2: 从CSV导入代理池(Type,Proxy:Port,Score)
+
+        输入其他: 返回上级菜单
+        """)
+    choice = input("选择：").strip()
+    if choice == "1":
+        file_path = input(f"导出文件(直接回车使用 {OUTPUT_FILE}): ").strip() or OUTPUT_FILE
+        print(f"已导出 {store.export_csv(file_path)} 个代理到 {file_path}")
+    elif choice == "2":
+        file_path = input(f"导入文件(直接回车使用 {OUTPUT_FILE}): ").strip() or OUTPUT_FILE
+        if not os.path.exists(file_path):
+            print("文件不存在")
+            return
+        print(f"已从 {file_path} 导入 {store.import_csv(file_path)} 个代理")
+    else:
+        print("返回上级菜单")
+
+# ============后台持续验证 - Continuous background revalidation
+# 以"下次检查时间"为键的优先队列(heapq): 分数越高检查间隔越长,连续失败越多间隔越短.
+# 固定数量的worker按到期顺序逐个取出代理检查,结果定期批量写回代理池,代理池保持新鲜而不再整池突发验证
+
+def recheck_interval(score, fail_streak=0):
+    """
+    计算代理的下次检查间隔
+
+    按分数在 RECHECK_MIN_INTERVAL 和 RECHECK_MAX_INTERVAL 之间几何插值(以分数比例的平方插值,只有接近满分的代理才很少检查),
+    每连续失败一次间隔减半,最多减到1/16
+
+    :param score: 当前分数
+    :param fail_streak: 连续失败次数
+    :return: 间隔(秒)
+    """
+    ratio = min(max(score, 0), MAX_SCORE) / MAX_SCORE
+    interval = RECHECK_MIN_INTERVAL * (RECHECK_MAX_INTERVAL / RECHECK_MIN_INTERVAL) ** (ratio * ratio)
+    return max(RECHECK_MIN_INTERVAL, interval / 2 ** min(fail_streak, 4))
+
+class RevalidationScheduler:
+    """
+    后台持续验证调度器
+
+    :param store: 代理池存储,默认get_pool_store()
+    :param concurrency: 同时在途的最大检查数
+    :param apply_result: 应用检查结果的回调 (proxy, proxy_type, result) -> 新分数;
+                         默认按验证已有代理的规则计分并批量写入store, API服务中使用 PoolService.apply_check_result
+    :param verbose: 是否每分钟打印一次统计
+    """
+    def __init__(self, store=None, concurrency=RECHECK_CONCURRENCY, apply_result=None, verbose=True):
+        self.store = store or get_pool_store()
+        self.history = get_check_history(self.store)
+        self.concurrency = concurrency
+        self.apply_result = apply_result or self._score_result
+        self.verbose = verbose
+        self.entries = {}  # proxy -> [proxy_type, score, fail_streak, next_check], 检查中的代理next_check为None
+        self.heap = []  # (next_check, proxy), 与entries不一致的过期项在出队时跳过
+        self.pending_scores = {}  # proxy -> (proxy_type, score), 尚未写入存储
+        self.pending_checks = {}  # proxy -> (检查时间, 连续失败次数), 尚未写入存储
+        self.pending_latencies = {}  # proxy -> 响应时间, 尚未写入存储
+        self.pending_targets = {}  # proxy -> {验证目标: 响应时间或None}, 尚未写入存储
+        self.pending_anonymity = {}  # proxy -> 匿名级别, 尚未写入存储
+        self.counters = {"checked": 0, "valid": 0, "failed": 0, "removed": 0}
+        self.stop_event = threading.Event()
+        self.sync()
+
+    def _schedule(self, proxy, proxy_type, score, fail_streak, next_check):
+        self.entries[proxy] = [proxy_type, score, fail_streak, next_check]
+        heapq.heappush(self.heap, (next_check, proxy))
+
+    def sync(self):
+        """把代理池中尚未调度的代理加入队列,返回新增数量"""
+        now = time.time()
+        added = 0
+        for proxy, proxy_type, score, last_checked, fail_streak in self.store.load_check_state():
+            if proxy in self.entries or score <= 0:
+                continue
+            interval = recheck_interval(score, fail_streak)
+            if last_checked:
+                next_check = max(now, last_checked + interval)
+            else:
+                # 从未检查过的代理在一个间隔内均匀打散,避免启动时整池同时到期
+                next_check = now + random.random() * interval
+            self._schedule(proxy, proxy_type, score, fail_streak, next_check)
+            added += 1
+        return added
+
+    def _pop_due(self):
+        """
+        取出一个已到期的代理
+
+        :return: 代理, 0; 没有到期代理时返回 None, 距下一个到期的秒数
+        """
+        while self.heap:
+            next_check, proxy = self.heap[0]
+            entry = self.entries.get(proxy)
+            if entry is None or entry[3] != next_check:
+                heapq.heappop(self.heap)  # 已移除或已重新调度
+                continue
+            wait = next_check - time.time()
+            if wait > 0:
+                return None, wait
+            heapq.heappop(self.heap)
+            entry[3] = None
+            return proxy, 0
+        return None, 1.0
+
+    def _score_result(self, proxy, proxy_type, result):
+        """默认的结果处理: 按验证已有代理的规则计分,等待批量写入"""
+        score, _ = score_check_result(proxy, result, {proxy: self.entries[proxy][1]}, {proxy: proxy_type},
+                                      TIMEOUT, "existing", verbose=False, history=self.history)
+        self.pending_scores[proxy] = (proxy_type, score)
+        return score
+
+    async def _check(self, proxy):
+        proxy_type, _, fail_streak, _ = self.entries[proxy]
+        try:
+            result, target_latencies = await _async_check_proxy_and_targets(
+                proxy, TEST_URL, TIMEOUT, 1, proxy_type, VALIDATION_TARGETS
+            )
+        except Exception as e:
+            result, target_latencies = e, {}
+        score = self.apply_result(proxy, proxy_type, result)
+        # 超时也算失败: 会更快地再次检查
+        success = is_check_success(result)
+        fail_streak = 0 if success else fail_streak + 1
+        if success:
+            self.pending_latencies[proxy] = result[2]
+            if result[4] is not None:  # _async_check_proxy_and_targets 返回 async_check_proxy_detailed 的结果
+                self.pending_anonymity[proxy] = result[4]
+        if target_latencies:
+            self.pending_targets[proxy] = target_latencies
+        now = time.time()
+        self.pending_checks[proxy] = (now, fail_streak)
+        self.counters["checked"] += 1
+        self.counters["valid" if success else "failed"] += 1
+        if score <= 0:
+            del self.entries[proxy]
+            self.counters["removed"] += 1
+        else:
+            self._schedule(proxy, proxy_type, score, fail_streak, now + recheck_interval(score, fail_streak))
+
+    def _stopping(self):
+        return self.stop_event.is_set() or interrupted
+
+    async def _worker(self):
+        while not self._stopping():
+            proxy, wait = self._pop_due()
+            if proxy is None:
+                await asyncio.sleep(min(wait, 1))
+                continue
+            await self._check(proxy)
+
+    def flush(self):
+        """将检查结果批量写入代理池存储,移除0分代理,返回写入数量"""
+        scores, self.pending_scores = self.pending_scores, {}
+        checks, self.pending_checks = self.pending_checks, {}
+        latencies, self.pending_latencies = self.pending_latencies, {}
+        targets, self.pending_targets = self.pending_targets, {}
+        anonymity, self.pending_anonymity = self.pending_anonymity, {}
+        if checks:
+            self.store.update_check_state((proxy, checked_at, fail_streak)
+                                          for proxy, (checked_at, fail_streak) in checks.items())
+        if latencies:
+            self.store.record_latencies(latencies)
+        if targets:
+            self.store.record_target_results(targets)
+        if anonymity:
+            self.store.record_anonymity(anonymity)
+        save_check_history(self.store)
+        if scores:
+            self.store.update_scores({proxy: score for proxy, (_, score) in scores.items()})
+            notify_score_updates((proxy, proxy_type, score) for proxy, (proxy_type, score) in scores.items())
+            if any(score <= 0 for _, score in scores.values()):
+                remember_dead_proxies({proxy: score for proxy, (_, score) in scores.items() if score <= 0})
+                self.store.remove_dead()
+        return len(checks)
+
+    def status(self):
+        """:return: 统计字典"""
+        return dict(self.counters, scheduled=len(self.entries))
+
+    def status_line(self):
+        due = [next_check for _, _, _, next_check in list(self.entries.values()) if next_check is not None]
+        next_due = max(0, min(due) - time.time()) if due else 0
+        return (f"🔄 持续验证: 已检查 {self.counters['checked']} (有效 {self.counters['valid']}, "
+                f"失败 {self.counters['failed']}, 移除 {self.counters['removed']}) | "
+                f"调度中 {len(self.entries)} | 下一个到期 {next_due:.0f}s")
+
+    async def _run(self, duration):
+        workers = [asyncio.create_task(self._worker()) for _ in range(max(1, self.concurrency))]
+        deadline = time.time() + duration if duration else None
+        last_flush = last_sync = last_report = time.time()
+        try:
+            while not self._stopping() and (deadline is None or time.time() < deadline):
+                await asyncio.sleep(0.2)
+                now = time.time()
+                if now - last_flush >= RECHECK_FLUSH_INTERVAL:
+                    self.flush()
+                    last_flush = now
+                if now - last_sync >= RECHECK_SYNC_INTERVAL:
+                    self.sync()
+                    last_sync = now
+                if self.verbose and now - last_report >= 60:
+                    print(self.status_line())
+                    last_report = now
+        finally:
+            # 停止时取消在途检查,不必等待超时
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.flush()
+
+    def run(self, duration=None):
+        """
+        阻塞运行调度器,直到stop()、Ctrl+C中断或运行满duration秒
+
+        :param duration: 运行时长(秒), None表示一直运行
+        """
+        _raise_nofile_limit(self.concurrency)
+        asyncio.run(self._run(duration))
+
+    def stop(self):
+        self.stop_event.set()
+
+def run_revalidation_scheduler():
+    """持续验证代理池(阻塞运行,Ctrl+C停止,停止前写入未保存的检查结果)"""
+    setup_interrupt_handler()
+    scheduler = RevalidationScheduler()
+    print(f"🔄 持续验证已启动 ({pool_location()}): 调度 {len(scheduler.entries)} 个代理, "
+          f"并发 {scheduler.concurrency}, 检查间隔 {RECHECK_MIN_INTERVAL}s~{RECHECK_MAX_INTERVAL}s, Ctrl+C 停止")
+    try:
+        scheduler.run()
+    finally:
+        restore_interrupt_handler()
+    print(scheduler.status_line())
+    print("持续验证已停止")
+
+# ============代理池API服务 - HTTP API server
+# 常驻内存的代理池,供大量爬虫进程通过HTTP获取代理并反馈使用结果:
+#   GET  /proxy?type=socks5&n=10&strategy=weighted   获取代理(strategy: weighted加权随机 / top分数最高 / fastest最快 / quality综合质量)
+#   POST /report  {"proxy": "ip:port", "success": true}   反馈使用结果,按验证相同的规则加减分(也可传列表)
+#   GET  /stats   代理池、请求和后台持续验证统计
+# 分数变化先更新内存,每隔API_FLUSH_INTERVAL秒批量写入代理池存储
+
+class PoolService:
+    """
+    API服务使用的常驻内存代理池
+
+    :param store: 代理池存储,默认get_pool_store()
+    """
+    def __init__(self, store=None):
+        self.store = store or get_pool_store()
+        self.proxies, self.proxy_types = self.store.load()
+        self.selector = ProxySelector((proxy, self.proxy_types[proxy], score)
+                                      for proxy, score in self.proxies.items())
+        self.lock = threading.Lock()
+        self.dirty = {}  # 尚未写入存储的分数变化
+        self.counters = {"get": 0, "served": 0, "report": 0, "success": 0, "failure": 0, "unknown": 0}
+        self.started = time.time()
+        self.scheduler = None  # RevalidationScheduler, 由run_api_server设置
+
+    def get(self, proxy_type="all", n=1, strategy="weighted", target=None, max_latency=None, min_anonymity=None):
+        """
+        :param target: 只返回最近一次检查通过该验证目标的代理(weighted方式不支持)
+        :param max_latency: 只返回响应时间不超过该值(秒)的代理(weighted方式不支持)
+        :param min_anonymity: 最低匿名级别(weighted方式不支持)
+        :return: ["type://ip:port"]
+        """
+        if strategy in ("fastest", "quality") or (strategy == "top" and (target or max_latency is not None
+                                                                          or min_anonymity)):
+            # 延迟统计、验证目标结果和匿名级别只保存在存储中
+            rows = [(proxy, actual_type) for proxy, actual_type, _ in
+                    self.store.query(proxy_type, min_score=1, limit=n, order=EXTRACT_STRATEGIES[strategy],
+                                     max_latency=max_latency, target=target, min_anonymity=min_anonymity)]
+        elif strategy == "top":
+            with self.lock:
+                candidates = [(score, proxy) for proxy, score in self.proxies.items()
+                              if score > 0 and (proxy_type == "all" or self.proxy_types[proxy] == proxy_type)]
+            rows = [(proxy, self.proxy_types[proxy]) for score, proxy in heapq.nlargest(n, candidates)]
+        else:
+            rows = self.selector.sample(proxy_type, n)
+        with self.lock:
+            self.counters["get"] += 1
+            self.counters["served"] += len(rows)
+        return [f"{actual_type}://{proxy}" for proxy, actual_type in rows]
+
+    def report(self, proxy, success):
+        """
+        反馈代理使用结果: 成功+1分,失败-1分(与验证已有代理的规则相同),降到0分的代理不再被分配
+
+        :return: 新分数, 代理不在池中时返回None
+        """
+        proxy = normalize_proxy(proxy) or proxy
+        with self.lock:
+            self.counters["report"] += 1
+            if proxy not in self.proxies:
+                self.counters["unknown"] += 1
+                return None
+            self.counters["success" if success else "failure"] += 1
+            proxy_type = self.proxy_types[proxy]
+            result = (proxy, True, 0.0, proxy_type) if success else (proxy, False, None, proxy_type)
+            return self._apply_result(proxy, result)
+
+    def apply_check_result(self, proxy, proxy_type, result):
+        """
+        应用后台持续验证的检查结果(与使用反馈共用同一份内存分数,两者不会互相覆盖),检查结果计入检查历史
+
+        :return: 新分数, 代理已不在池中时返回0
+        """
+        with self.lock:
+            if proxy not in self.proxies:
+                return 0
+            return self._apply_result(proxy, result, get_check_history(self.store))
+
+    def _apply_result(self, proxy, result, history=None):
+        """按验证已有代理的规则更新内存分数(调用方持有self.lock)"""
+        proxy_type = self.proxy_types[proxy]
+        score, _ = score_check_result(proxy, result, self.proxies, self.proxy_types,
+                                      TIMEOUT, "existing", verbose=False, history=history)
+        self.proxies[proxy] = score
+        self.dirty[proxy] = score
+        if score <= 0:
+            del self.proxies[proxy]
+            del self.proxy_types[proxy]
+        self.selector.update(proxy, proxy_type, score)
+        return score
+
+    def flush(self):
+        """将内存中的分数变化写入存储,移除0分代理"""
+        with self.lock:
+            dirty, self.dirty = self.dirty, {}
+        if dirty:
+            self.store.update_scores(dirty)
+            if any(score <= 0 for score in dirty.values()):
+                remember_dead_proxies({proxy: score for proxy, score in dirty.items() if score <= 0})
+                self.store.remove_dead()
+        return len(dirty)
+
+    def stats(self):
+        with self.lock:
+            types = {}
+            for proxy, score in self.proxies.items():
+                item = types.setdefault(self.proxy_types[proxy], {"count": 0, "score_sum": 0})
+                item["count"] += 1
+                item["score_sum"] += score
+            return {
+                "total": len(self.proxies),
+                "types": {name: {"count": item["count"], "avg_score": round(item["score_sum"] / item["count"], 2)}
+                          for name, item in types.items()},
+                "requests": dict(self.counters),
+                "pending_writes": len(self.dirty),
+                "revalidation": self.scheduler.status() if self.scheduler is not None else None,
+                "uptime": round(time.time() - self.started, 1),
+            }
+
+class PoolRequestHandler(http.server.BaseHTTPRequestHandler):
+    """API请求处理(HTTP/1.1 keep-alive, JSON响应)"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    service = None  # PoolService, 由run_api_server设置
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        if url.path == "/proxy":
+            try:
+                n = min(max(int(params.get("n", ["1"])[0]), 1), 1000)
+            except ValueError:
+                return self._send_json({"error": "n 必须是整数"}, 400)
+            proxy_type = params.get("type", ["all"])[0].lower()
+            strategy = params.get("strategy", ["weighted"])[0]
+            target = params.get("target", [None])[0]
+            try:
+                max_latency = float(params["max_latency"][0]) if "max_latency" in params else None
+            except ValueError:
+                return self._send_json({"error": "max_latency 必须是数字"}, 400)
+            min_anonymity = params.get("anonymity", [None])[0]
+            if min_anonymity is not None and min_anonymity not in ANONYMITY_LEVELS:
+                return self._send_json({"error": f"anonymity 应为 {'/'.join(ANONYMITY_LEVELS)}"}, 400)
+            if (target or max_latency is not None or min_anonymity) and strategy not in EXTRACT_STRATEGIES:
+                return self._send_json({"error": "target/max_latency/anonymity 需要 strategy=top/fastest/quality"}, 400)
+            self._send_json({"proxies": self.service.get(proxy_type, n, strategy, target, max_latency, min_anonymity)})
+        elif url.path == "/stats":
+            self._send_json(self.service.stats())
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if urllib.parse.urlsplit(self.path).path != "/report":
+            return self._send_json({"error": "not found"}, 404)
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+            reports = data if isinstance(data, list) else [data]
+            scores = {report["proxy"]: self.service.report(report["proxy"], bool(report["success"]))
+                      for report in reports}
+        except (ValueError, TypeError, KeyError):
+            return self._send_json({"error": '请求体应为 {"proxy": "ip:port", "success": true} 或其列表'}, 400)
+        self._send_json({"scores": scores})
+
+    def log_message(self, *args):
+        pass
+
+def run_api_server(host=API_HOST, port=API_PORT, service=None, ready=None, revalidate=API_REVALIDATE):
+    """
+    启动代理池API服务(阻塞运行,Ctrl+C或SIGTERM停止,停止前写入未保存的分数)
+
+    :param service: PoolService,默认从代理池加载
+    :param ready: threading.Event,服务开始监听后set(测试/压测用)
+    :param revalidate: 是否在后台持续验证代理池,检查结果与使用反馈写入同一份内存分数
+    """
+    service = service or PoolService()
+    scheduler = None
+    if revalidate:
+        scheduler = RevalidationScheduler(service.store, apply_result=service.apply_check_result, verbose=False)
+        service.scheduler = scheduler
+        threading.Thread(target=scheduler.run, daemon=True).start()
+    handler = type("BoundPoolRequestHandler", (PoolRequestHandler,), {"service": service})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    stop = threading.Event()
+
+    def flush_loop():
+        while not stop.wait(API_FLUSH_INTERVAL):
+            service.flush()
+
+    flusher = threading.Thread(target=flush_loop, daemon=True)
+    flusher.start()
+    print(f"🌐 代理池API服务已启动: http://{host}:{server.server_address[1]} (代理 {len(service.proxies)} 个)")
+    if ready is not None:
+        ready.server = server
+        ready.set()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        if scheduler is not None:
+            scheduler.stop()
+        server.server_close()
+        print(f"已写入 {service.flush()} 个分数变化, API服务已停止")
+
 def load_from_csv_with_type():
     """从CSV文件加载并验证代理（支持类型选择，添加中断恢复）"""
     try:
         # 首先检查是否有中断记录
-        remaining_proxies, proxy_type, original_count = load_interrupted_proxies(INTERRUPT_FILE_LOAD)
+        remaining_proxies, proxy_type, original_count = load_interrupted_proxies(INTERRUPT_FILE_LOAD, recover=False)
         if remaining_proxies:
             print(f"🔍 发现上次文件加载中断记录!")
             print(f"   剩余代理: {len(remaining_proxies)}/{original_count} 个")
-            print(f"   验证类型: {proxy_type}")
+            print(f"   验证类型: {describe_proxy_type(proxy_type)}")
+            print_journal_pending(INTERRUPT_FILE_LOAD)
             print("\n请选择:")
             print("  y: 继续上次验证")
             print("  n: 删除记录并重新选择文件")
@@ -1140,6 +4541,10 @@ def load_from_csv_with_type():
             
             if choice == 'y':
                 print("继续上次验证...")
+                remaining_proxies, proxy_type, _ = load_interrupted_proxies(INTERRUPT_FILE_LOAD)
+                if not remaining_proxies:
+                    print("✅ 上次的代理已全部验证完成")
+                    return
                 validate_new_proxies_with_interrupt(remaining_proxies, proxy_type, from_interrupt=True, source="load")
                 return
             elif choice == 'n':
@@ -1214,12 +4619,31 @@ if __name__ == '__main__':
     # 创建中断目录
     create_interrupt_dir()
 
+    # 守护模式: python proxies_pool.py serve [端口]
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+        run_api_server(API_HOST, int(sys.argv[2]) if len(sys.argv) > 2 else API_PORT)
+        sys.exit(0)
+
+    # 统计模式(JSON,供监控面板使用): python proxies_pool.py stats
+    if len(sys.argv) > 1 and sys.argv[1] == "stats":
+        print(json.dumps(pool_stats(), ensure_ascii=False, indent=2))
+        sys.exit(0)
+
+    # 持续验证模式: python proxies_pool.py revalidate
+    if len(sys.argv) > 1 and sys.argv[1] == "revalidate":
+        run_revalidation_scheduler()
+        sys.exit(0)
+
     while True:
         print(f"""功能：
         1: 加载并验证新代理 (成功后添加到代理池)
         2: 检验并更新已有代理
         3: 提取代理(可指定数量,类型)
         4: 查看代理池状态
+        5: 代理池导入/导出CSV
+        6: 启动代理池API服务
+        7: 后台持续验证代理池(按分数安排检查间隔)
 
 
         输入其他: 退出
@@ -1263,6 +4687,15 @@ if __name__ == '__main__':
         elif choice == "4":
             show_proxy_pool_status()
 
+        elif choice == "5":
+            csv_import_export_menu()
+
+        elif choice == "6":
+            run_api_server()
+
+        elif choice == "7":
+            run_revalidation_scheduler()
+
         else:
             print('退出')
             break